@@ -18,7 +18,8 @@ from app.database import Base
 # Импортируем все модели, чтобы Alembic их видел
 from app.models import user, case, person, case_person, document, case_event
 from app.models import legal_act, case_legal_act, document_template, audit_log
-from app.models import document_embedding, system_setting
+from app.models import document_embedding, system_setting, ocr_job
+from app.models import storage_blob
 
 # this is the Alembic Config object
 config = context.config
@@ -0,0 +1,37 @@
+"""Content-addressed document storage with reference counting
+
+Revision ID: 003
+Revises: 002
+Create Date: 2025-12-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Полный SHA-256 файла документа
+    op.add_column('documents', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_documents_content_hash'), 'documents', ['content_hash'], unique=False)
+
+    # Учёт ссылок на файлы хранилища
+    op.create_table(
+        'storage_blobs',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('file_size', sa.BigInteger(), nullable=False),
+        sa.Column('ref_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('sha256')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('storage_blobs')
+    op.drop_index(op.f('ix_documents_content_hash'), table_name='documents')
+    op.drop_column('documents', 'content_hash')
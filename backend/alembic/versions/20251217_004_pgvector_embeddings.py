@@ -0,0 +1,48 @@
+"""Convert document_embeddings to pgvector with HNSW index
+
+Revision ID: 004
+Revises: 003
+Create Date: 2025-12-17
+
+"""
+from alembic import op
+from app.config import settings
+
+# revision identifiers
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    dimensions = settings.EMBEDDING_DIMENSIONS
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+
+    # Векторы другой размерности в vector(N) не конвертируются - обнуляем,
+    # индексатор пересчитает их
+    op.execute(
+        f"UPDATE document_embeddings SET embedding_vector = NULL "
+        f"WHERE array_length(embedding_vector, 1) IS DISTINCT FROM {dimensions}"
+    )
+    op.execute(
+        f"ALTER TABLE document_embeddings "
+        f"ALTER COLUMN embedding_vector TYPE vector({dimensions}) "
+        f"USING embedding_vector::vector({dimensions})"
+    )
+
+    # HNSW индекс для косинусного расстояния
+    op.execute(
+        "CREATE INDEX ix_document_embeddings_vector_hnsw ON document_embeddings "
+        "USING hnsw (embedding_vector vector_cosine_ops)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_document_embeddings_vector_hnsw")
+    op.execute(
+        "ALTER TABLE document_embeddings "
+        "ALTER COLUMN embedding_vector TYPE double precision[] "
+        "USING embedding_vector::real[]::double precision[]"
+    )
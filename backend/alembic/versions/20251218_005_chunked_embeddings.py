@@ -0,0 +1,71 @@
+"""Chunked embeddings for documents and legal acts with text hashes
+
+Revision ID: 005
+Revises: 004
+Create Date: 2025-12-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Хеши текста для инкрементальной индексации (пересчитываются PostgreSQL)
+    op.add_column(
+        'documents',
+        sa.Column('ocr_text_hash', sa.String(length=32),
+                  sa.Computed("md5(COALESCE(ocr_text, ''))", persisted=True), nullable=True)
+    )
+    op.add_column(
+        'legal_acts',
+        sa.Column('full_text_hash', sa.String(length=32),
+                  sa.Computed("md5(COALESCE(full_text, ''))", persisted=True), nullable=True)
+    )
+
+    # Один документ - несколько фрагментов
+    op.drop_constraint('document_embeddings_document_id_key', 'document_embeddings', type_='unique')
+    op.alter_column('document_embeddings', 'document_id', existing_type=sa.Integer(), nullable=True)
+    op.add_column('document_embeddings', sa.Column('legal_act_id', sa.Integer(), nullable=True))
+    op.add_column('document_embeddings', sa.Column('chunk_index', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('document_embeddings', sa.Column('chunk_text', sa.Text(), nullable=True))
+    op.add_column('document_embeddings', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_foreign_key(
+        'document_embeddings_legal_act_id_fkey', 'document_embeddings', 'legal_acts',
+        ['legal_act_id'], ['id'], ondelete='CASCADE'
+    )
+    op.create_unique_constraint(
+        'unique_document_embedding_chunk', 'document_embeddings', ['document_id', 'chunk_index']
+    )
+    op.create_unique_constraint(
+        'unique_legal_act_embedding_chunk', 'document_embeddings', ['legal_act_id', 'chunk_index']
+    )
+    op.create_check_constraint(
+        'document_embedding_single_source', 'document_embeddings',
+        '(document_id IS NULL) <> (legal_act_id IS NULL)'
+    )
+    op.create_index(op.f('ix_document_embeddings_document_id'), 'document_embeddings', ['document_id'], unique=False)
+    op.create_index(op.f('ix_document_embeddings_legal_act_id'), 'document_embeddings', ['legal_act_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM document_embeddings WHERE document_id IS NULL OR chunk_index > 0")
+    op.drop_index(op.f('ix_document_embeddings_legal_act_id'), table_name='document_embeddings')
+    op.drop_index(op.f('ix_document_embeddings_document_id'), table_name='document_embeddings')
+    op.drop_constraint('document_embedding_single_source', 'document_embeddings', type_='check')
+    op.drop_constraint('unique_legal_act_embedding_chunk', 'document_embeddings', type_='unique')
+    op.drop_constraint('unique_document_embedding_chunk', 'document_embeddings', type_='unique')
+    op.drop_constraint('document_embeddings_legal_act_id_fkey', 'document_embeddings', type_='foreignkey')
+    op.drop_column('document_embeddings', 'content_hash')
+    op.drop_column('document_embeddings', 'chunk_text')
+    op.drop_column('document_embeddings', 'chunk_index')
+    op.drop_column('document_embeddings', 'legal_act_id')
+    op.alter_column('document_embeddings', 'document_id', existing_type=sa.Integer(), nullable=False)
+    op.create_unique_constraint('document_embeddings_document_id_key', 'document_embeddings', ['document_id'])
+    op.drop_column('legal_acts', 'full_text_hash')
+    op.drop_column('documents', 'ocr_text_hash')
@@ -0,0 +1,74 @@
+"""Stored tsvector columns with GIN indexes for full-text search
+
+Revision ID: 006
+Revises: 005
+Create Date: 2025-12-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+
+# Выбор конфигурации FTS для строки: русская, если кириллических букв
+# больше, чем латинских (проверяется начало текста), иначе румынская
+TS_CONFIG_FUNCTION = """
+CREATE OR REPLACE FUNCTION ts_config_for(doc text) RETURNS regconfig
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT CASE
+        WHEN length(regexp_replace(left(COALESCE(doc, ''), 4000), '[^А-Яа-яЁё]', '', 'g'))
+           > length(regexp_replace(left(COALESCE(doc, ''), 4000), '[^A-Za-zĂÂÎȘȚŞŢăâîșțşţ]', '', 'g'))
+        THEN 'russian'::regconfig
+        ELSE 'romanian'::regconfig
+    END
+$$
+"""
+
+SEARCH_VECTORS = {
+    'documents': (
+        "setweight(to_tsvector(ts_config_for(COALESCE(ocr_text, description, original_file_name)), "
+        "COALESCE(original_file_name, '') || ' ' || COALESCE(description, '')), 'A') || "
+        "setweight(to_tsvector(ts_config_for(COALESCE(ocr_text, description, original_file_name)), "
+        "COALESCE(ocr_text, '')), 'B')"
+    ),
+    'legal_acts': (
+        "setweight(to_tsvector(ts_config_for(COALESCE(full_text, title)), "
+        "COALESCE(act_number, '') || ' ' || COALESCE(title, '')), 'A') || "
+        "setweight(to_tsvector(ts_config_for(COALESCE(full_text, title)), COALESCE(full_text, '')), 'B')"
+    ),
+    'cases': (
+        "setweight(to_tsvector(ts_config_for(COALESCE(title, '') || ' ' || COALESCE(description, '')), "
+        "COALESCE(case_number, '') || ' ' || COALESCE(title, '')), 'A') || "
+        "setweight(to_tsvector(ts_config_for(COALESCE(title, '') || ' ' || COALESCE(description, '')), "
+        "COALESCE(plaintiff, '') || ' ' || COALESCE(defendant, '') || ' ' || COALESCE(description, '')), 'B')"
+    ),
+}
+
+
+def upgrade() -> None:
+    op.execute(TS_CONFIG_FUNCTION)
+
+    for table, expression in SEARCH_VECTORS.items():
+        op.add_column(
+            table,
+            sa.Column('search_vector', postgresql.TSVECTOR(),
+                      sa.Computed(expression, persisted=True), nullable=True)
+        )
+        op.create_index(
+            f'ix_{table}_search_vector', table, ['search_vector'],
+            unique=False, postgresql_using='gin'
+        )
+
+
+def downgrade() -> None:
+    for table in SEARCH_VECTORS:
+        op.drop_index(f'ix_{table}_search_vector', table_name=table)
+        op.drop_column(table, 'search_vector')
+
+    op.execute("DROP FUNCTION IF EXISTS ts_config_for(text)")
@@ -0,0 +1,39 @@
+"""Trigram indexes for global search
+
+Revision ID: 007
+Revises: 006
+Create Date: 2025-12-20
+
+"""
+from alembic import op
+
+# revision identifiers
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+# Выражения должны совпадать с SEARCH_TEXT в моделях, иначе планировщик
+# не использует индекс
+SEARCH_TEXTS = {
+    'cases': "COALESCE(case_number, '') || ' ' || COALESCE(title, '') || ' ' || COALESCE(plaintiff, '') || ' ' || COALESCE(defendant, '') || ' ' || COALESCE(description, '')",
+    'persons': "COALESCE(full_name, '') || ' ' || COALESCE(idnp, '') || ' ' || COALESCE(phone, '') || ' ' || COALESCE(email, '') || ' ' || COALESCE(organization, '')",
+    'documents': "COALESCE(file_name, '') || ' ' || COALESCE(original_file_name, '') || ' ' || COALESCE(description, '')",
+    'legal_acts': "COALESCE(title, '') || ' ' || COALESCE(act_number, '')",
+}
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    for table, expression in SEARCH_TEXTS.items():
+        op.execute(
+            f"CREATE INDEX ix_{table}_search_text_trgm ON {table} "
+            f"USING gin (({expression}) gin_trgm_ops)"
+        )
+
+
+def downgrade() -> None:
+    for table in SEARCH_TEXTS:
+        op.drop_index(f'ix_{table}_search_text_trgm', table_name=table)
@@ -0,0 +1,44 @@
+"""Composite indexes for keyset pagination of list endpoints
+
+Revision ID: 008
+Revises: 007
+Create Date: 2025-12-21
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+# (таблица, ключ сортировки списка)
+KEYSET_INDEXES = [
+    ('cases', 'open_date'),
+    ('persons', 'full_name'),
+    ('documents', 'upload_date'),
+    ('case_events', 'event_date'),
+    ('legal_acts', 'created_at'),
+]
+
+
+def upgrade() -> None:
+    # Сравнение кортежей (ключ, id) не работает с NULL - ключи сортировки обязательны
+    op.execute("UPDATE documents SET upload_date = COALESCE(created_at, now()) WHERE upload_date IS NULL")
+    op.alter_column('documents', 'upload_date', existing_type=sa.DateTime(timezone=True), nullable=False)
+    op.execute("UPDATE legal_acts SET created_at = now() WHERE created_at IS NULL")
+    op.alter_column('legal_acts', 'created_at', existing_type=sa.DateTime(timezone=True), nullable=False)
+
+    for table, column in KEYSET_INDEXES:
+        op.create_index(f'ix_{table}_{column}_id', table, [column, 'id'], unique=False)
+
+
+def downgrade() -> None:
+    for table, column in KEYSET_INDEXES:
+        op.drop_index(f'ix_{table}_{column}_id', table_name=table)
+
+    op.alter_column('legal_acts', 'created_at', existing_type=sa.DateTime(timezone=True), nullable=True)
+    op.alter_column('documents', 'upload_date', existing_type=sa.DateTime(timezone=True), nullable=True)
@@ -0,0 +1,149 @@
+"""Daily statistics rollup tables maintained by triggers
+
+Revision ID: 009
+Revises: 008
+Create Date: 2025-12-22
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+
+# День считается в часовом поясе офиса, а не в часовом поясе сессии БД:
+# иначе вставка и удаление одной строки из разных сессий попадали бы в разные дни
+STATS_DAY_FUNCTION = """
+CREATE FUNCTION stats_day(ts timestamptz) RETURNS date
+LANGUAGE sql STABLE PARALLEL SAFE AS $$
+    SELECT (ts AT TIME ZONE 'Europe/Chisinau')::date
+$$
+"""
+
+CASE_STATS_FUNCTION = """
+CREATE FUNCTION case_stats_daily_trigger() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO case_stats_daily AS s (day, case_status, case_type, cases_count)
+        VALUES (stats_day(OLD.created_at), OLD.case_status, OLD.case_type, -1)
+        ON CONFLICT (day, case_status, case_type)
+        DO UPDATE SET cases_count = s.cases_count + EXCLUDED.cases_count;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO case_stats_daily AS s (day, case_status, case_type, cases_count)
+        VALUES (stats_day(NEW.created_at), NEW.case_status, NEW.case_type, 1)
+        ON CONFLICT (day, case_status, case_type)
+        DO UPDATE SET cases_count = s.cases_count + EXCLUDED.cases_count;
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+DOCUMENT_STATS_FUNCTION = """
+CREATE FUNCTION document_stats_daily_trigger() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO document_stats_daily AS s (day, documents_count)
+        VALUES (stats_day(OLD.upload_date), -1)
+        ON CONFLICT (day)
+        DO UPDATE SET documents_count = s.documents_count + EXCLUDED.documents_count;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO document_stats_daily AS s (day, documents_count)
+        VALUES (stats_day(NEW.upload_date), 1)
+        ON CONFLICT (day)
+        DO UPDATE SET documents_count = s.documents_count + EXCLUDED.documents_count;
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+
+def upgrade() -> None:
+    # День создания дела - ключ статистики, он обязателен
+    op.execute("UPDATE cases SET created_at = now() WHERE created_at IS NULL")
+    op.alter_column('cases', 'created_at', existing_type=sa.DateTime(timezone=True), nullable=False)
+
+    op.create_table(
+        'case_stats_daily',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('case_status', sa.String(length=30), nullable=False),
+        sa.Column('case_type', sa.String(length=50), nullable=False),
+        sa.Column('cases_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('day', 'case_status', 'case_type')
+    )
+    op.create_table(
+        'document_stats_daily',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('documents_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('day')
+    )
+
+    op.execute(STATS_DAY_FUNCTION)
+    op.execute(CASE_STATS_FUNCTION)
+    op.execute(DOCUMENT_STATS_FUNCTION)
+
+    # Начальное заполнение по существующим данным
+    op.execute("""
+        INSERT INTO case_stats_daily (day, case_status, case_type, cases_count)
+        SELECT stats_day(created_at), case_status, case_type, count(*)
+        FROM cases
+        GROUP BY 1, 2, 3
+    """)
+    op.execute("""
+        INSERT INTO document_stats_daily (day, documents_count)
+        SELECT stats_day(upload_date), count(*)
+        FROM documents
+        GROUP BY 1
+    """)
+
+    # Дальше счётчики меняются в той же транзакции, что и исходные строки
+    op.execute("""
+        CREATE TRIGGER cases_stats_daily_insert_delete
+        AFTER INSERT OR DELETE ON cases
+        FOR EACH ROW EXECUTE FUNCTION case_stats_daily_trigger()
+    """)
+    op.execute("""
+        CREATE TRIGGER cases_stats_daily_update
+        AFTER UPDATE OF created_at, case_status, case_type ON cases
+        FOR EACH ROW
+        WHEN ((OLD.created_at, OLD.case_status, OLD.case_type)
+              IS DISTINCT FROM (NEW.created_at, NEW.case_status, NEW.case_type))
+        EXECUTE FUNCTION case_stats_daily_trigger()
+    """)
+    op.execute("""
+        CREATE TRIGGER documents_stats_daily_insert_delete
+        AFTER INSERT OR DELETE ON documents
+        FOR EACH ROW EXECUTE FUNCTION document_stats_daily_trigger()
+    """)
+    op.execute("""
+        CREATE TRIGGER documents_stats_daily_update
+        AFTER UPDATE OF upload_date ON documents
+        FOR EACH ROW
+        WHEN (OLD.upload_date IS DISTINCT FROM NEW.upload_date)
+        EXECUTE FUNCTION document_stats_daily_trigger()
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS documents_stats_daily_update ON documents")
+    op.execute("DROP TRIGGER IF EXISTS documents_stats_daily_insert_delete ON documents")
+    op.execute("DROP TRIGGER IF EXISTS cases_stats_daily_update ON cases")
+    op.execute("DROP TRIGGER IF EXISTS cases_stats_daily_insert_delete ON cases")
+
+    op.execute("DROP FUNCTION IF EXISTS document_stats_daily_trigger()")
+    op.execute("DROP FUNCTION IF EXISTS case_stats_daily_trigger()")
+    op.execute("DROP FUNCTION IF EXISTS stats_day(timestamptz)")
+
+    op.drop_table('document_stats_daily')
+    op.drop_table('case_stats_daily')
+
+    op.alter_column('cases', 'created_at', existing_type=sa.DateTime(timezone=True), nullable=True)
@@ -0,0 +1,32 @@
+"""Indexes for the unified case timeline
+
+Revision ID: 010
+Revises: 009
+Create Date: 2025-12-23
+
+"""
+from alembic import op
+
+# revision identifiers
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+
+# Каждая ветка запроса временной шкалы читает строки одного дела в порядке даты
+TIMELINE_INDEXES = [
+    ('ix_case_events_case_id_event_date', 'case_events', ['case_id', 'event_date']),
+    ('ix_documents_case_id_upload_date', 'documents', ['case_id', 'upload_date']),
+    ('ix_audit_log_entity_created_at', 'audit_log', ['entity_type', 'entity_id', 'created_at']),
+]
+
+
+def upgrade() -> None:
+    for name, table, columns in TIMELINE_INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade() -> None:
+    for name, table, _ in TIMELINE_INDEXES:
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,98 @@
+"""Monthly range partitioning of audit_log
+
+Revision ID: 011
+Revises: 010
+Create Date: 2025-12-24
+
+"""
+from datetime import date, datetime, timezone
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+
+# Сколько месяцев вперёд создаются разделы (дальше - задача в приложении)
+PARTITIONS_AHEAD = 3
+
+# Индексы секционированной таблицы (создаются и на всех разделах)
+PARTITIONED_INDEXES = [
+    ('ix_audit_log_entity_created_at', ['entity_type', 'entity_id', 'created_at']),
+    ('ix_audit_log_created_at', ['created_at']),
+    ('ix_audit_log_user_id_created_at', ['user_id', 'created_at']),
+]
+
+# Индексы обычной таблицы до секционирования
+PLAIN_INDEXES = [
+    ('ix_audit_log_action', ['action']),
+    ('ix_audit_log_entity_type', ['entity_type']),
+    ('ix_audit_log_entity_created_at', ['entity_type', 'entity_id', 'created_at']),
+]
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+
+    # Ключ секционирования обязателен
+    op.execute("UPDATE audit_log SET created_at = now() WHERE created_at IS NULL")
+
+    # Новая таблица с теми же колонками и значениями по умолчанию (id - та же последовательность)
+    op.execute("""
+        CREATE TABLE audit_log_partitioned (LIKE audit_log INCLUDING DEFAULTS)
+        PARTITION BY RANGE (created_at)
+    """)
+    op.execute("ALTER TABLE audit_log_partitioned ALTER COLUMN created_at SET NOT NULL")
+    op.execute("ALTER TABLE audit_log_partitioned ALTER COLUMN id TYPE bigint")
+    op.execute("ALTER SEQUENCE audit_log_id_seq AS bigint OWNED BY audit_log_partitioned.id")
+
+    # Разделы по месяцам: от самой старой записи до PARTITIONS_AHEAD месяцев вперёд
+    oldest = bind.execute(sa.text("SELECT min(created_at) FROM audit_log")).scalar()
+    current = datetime.now(timezone.utc).date().replace(day=1)
+    month = oldest.astimezone(timezone.utc).date().replace(day=1) if oldest else current
+    month = min(month, current)
+    while month <= add_months(current, PARTITIONS_AHEAD):
+        next_month = add_months(month, 1)
+        # Границы разделов - в UTC, как и в app.utils.audit.maintain_partitions
+        op.execute(
+            f"CREATE TABLE audit_log_p{month:%Y%m} PARTITION OF audit_log_partitioned "
+            f"FOR VALUES FROM ('{month.isoformat()} 00:00+00') TO ('{next_month.isoformat()} 00:00+00')"
+        )
+        month = next_month
+
+    op.execute("INSERT INTO audit_log_partitioned SELECT * FROM audit_log")
+
+    op.drop_table('audit_log')
+    op.rename_table('audit_log_partitioned', 'audit_log')
+
+    # Первичный ключ секционированной таблицы должен включать ключ секционирования
+    op.create_primary_key('audit_log_pkey', 'audit_log', ['id', 'created_at'])
+    op.create_foreign_key('audit_log_user_id_fkey', 'audit_log', 'users', ['user_id'], ['id'])
+    for name, columns in PARTITIONED_INDEXES:
+        op.create_index(name, 'audit_log', columns, unique=False)
+
+
+def downgrade() -> None:
+    op.execute("CREATE TABLE audit_log_plain (LIKE audit_log INCLUDING DEFAULTS)")
+    op.execute("ALTER TABLE audit_log_plain ALTER COLUMN created_at DROP NOT NULL")
+    op.execute("ALTER SEQUENCE audit_log_id_seq OWNED BY audit_log_plain.id")
+    op.execute("INSERT INTO audit_log_plain SELECT * FROM audit_log")
+
+    # Удаление секционированной таблицы удаляет и все разделы
+    op.drop_table('audit_log')
+    op.rename_table('audit_log_plain', 'audit_log')
+
+    op.execute("ALTER TABLE audit_log ALTER COLUMN id TYPE integer")
+    op.execute("ALTER SEQUENCE audit_log_id_seq AS integer")
+    op.create_primary_key('audit_log_pkey', 'audit_log', ['id'])
+    op.create_foreign_key('audit_log_user_id_fkey', 'audit_log', 'users', ['user_id'], ['id'])
+    for name, columns in PLAIN_INDEXES:
+        op.create_index(name, 'audit_log', columns, unique=False)
@@ -0,0 +1,65 @@
+"""Stored reminder due time for case events
+
+Revision ID: 012
+Revises: 011
+Create Date: 2025-12-25
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '012'
+down_revision = '011'
+branch_labels = None
+depends_on = None
+
+
+# Вычитание интервала из timestamptz не IMMUTABLE, поэтому вместо
+# генерируемой колонки remind_at заполняется триггером
+REMIND_AT_FUNCTION = """
+CREATE FUNCTION case_events_set_remind_at() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.remind_at := NEW.event_date - make_interval(days => COALESCE(NEW.reminder_days_before, 1));
+    RETURN NEW;
+END
+$$
+"""
+
+
+def upgrade() -> None:
+    op.add_column('case_events', sa.Column('remind_at', sa.DateTime(timezone=True), nullable=True))
+
+    op.execute("UPDATE case_events SET reminder_sent = false WHERE reminder_sent IS NULL")
+    op.alter_column('case_events', 'reminder_sent', existing_type=sa.Boolean(),
+                    nullable=False, server_default=sa.text('false'))
+
+    op.execute(REMIND_AT_FUNCTION)
+    op.execute("""
+        CREATE TRIGGER case_events_remind_at
+        BEFORE INSERT OR UPDATE OF event_date, reminder_days_before ON case_events
+        FOR EACH ROW EXECUTE FUNCTION case_events_set_remind_at()
+    """)
+
+    # Напоминания, которые уже не нужны (прошедшие события), сразу считаются отправленными
+    op.execute("UPDATE case_events SET reminder_sent = true WHERE reminder_sent = false AND event_date <= now()")
+    op.execute("""
+        UPDATE case_events
+        SET remind_at = event_date - make_interval(days => COALESCE(reminder_days_before, 1))
+    """)
+
+    # В индексе только неотправленные напоминания - он остаётся маленьким
+    op.create_index(
+        'ix_case_events_remind_at_pending', 'case_events', ['remind_at'],
+        postgresql_where=sa.text('reminder_sent = false')
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_case_events_remind_at_pending', table_name='case_events')
+    op.execute("DROP TRIGGER IF EXISTS case_events_remind_at ON case_events")
+    op.execute("DROP FUNCTION IF EXISTS case_events_set_remind_at()")
+    op.alter_column('case_events', 'reminder_sent', existing_type=sa.Boolean(),
+                    nullable=True, server_default=None)
+    op.drop_column('case_events', 'remind_at')
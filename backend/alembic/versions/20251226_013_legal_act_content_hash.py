@@ -0,0 +1,25 @@
+"""Content hash of legal act files
+
+Revision ID: 013
+Revises: 012
+Create Date: 2025-12-26
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '013'
+down_revision = '012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # SHA-256 файла акта - строгий ETag при скачивании (у старых актов NULL,
+    # для них ETag строится по размеру и времени изменения файла)
+    op.add_column('legal_acts', sa.Column('content_hash', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('legal_acts', 'content_hash')
@@ -0,0 +1,26 @@
+"""Heartbeat of running OCR jobs
+
+Revision ID: 015
+Revises: 014
+Create Date: 2025-12-28
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '015'
+down_revision = '014'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Воркер обновляет heartbeat_at, пока выполняет задание; задание без
+    # обновлений дольше OCR_JOB_LEASE_TIMEOUT возвращается в очередь
+    op.add_column('ocr_jobs', sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True))
+    op.execute("UPDATE ocr_jobs SET heartbeat_at = started_at WHERE status = 'running'")
+
+
+def downgrade() -> None:
+    op.drop_column('ocr_jobs', 'heartbeat_at')
@@ -2,7 +2,7 @@
 Dependencies для FastAPI endpoints
 Аутентификация, проверка прав, получение текущего пользователя
 """
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
@@ -10,6 +10,8 @@ from typing import Optional
 from app.database import get_db
 from app.models.user import User
 from app.utils.security import verify_token
+from app.utils.user_cache import user_cache
+from app.utils.audit import AuditContext
 from app.schemas.user import UserRole
 
 # HTTP Bearer для JWT токенов
@@ -42,9 +44,13 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    # Получение пользователя из БД
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
+    # Получение пользователя из кеша или из БД
+    user = user_cache.get(user_id)
+    if user is None:
+        result = await db.execute(select(User).where(User.id == user_id))
+        user = result.scalar_one_or_none()
+        if user is not None:
+            user_cache.put(user)
 
     if user is None:
         raise HTTPException(
@@ -90,6 +96,27 @@ async def get_current_admin_user(
     return current_user
 
 
+async def get_audit(
+    request: Request,
+    current_user: User = Depends(get_current_user)
+) -> AuditContext:
+    """
+    Сборщик записей аудита текущего запроса
+
+    Записи, добавленные через audit.record(), передаются в фоновую
+    запись после завершения эндпоинта
+    """
+    audit = AuditContext(
+        user_id=current_user.id,
+        ip_address=request.client.host if request.client else None,
+        user_agent=request.headers.get("user-agent")
+    )
+    try:
+        yield audit
+    finally:
+        audit.commit()
+
+
 def check_permission(required_role: UserRole):
     """
     Фабрика dependency для проверки роли пользователя
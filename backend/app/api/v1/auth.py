@@ -9,8 +9,13 @@ from datetime import datetime
 from app.database import get_db
 from app.models.user import User
 from app.schemas.user import Token, UserResponse, UserCreate
-from app.utils.security import verify_password, get_password_hash, create_access_token, create_refresh_token, verify_token
+from app.utils.security import verify_password_async, get_password_hash_async, create_access_token, create_refresh_token, verify_token
 from app.api.deps import get_current_user
+from app.utils.user_cache import user_cache
+from app.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -32,8 +37,14 @@ async def login(
     )
     user = result.scalar_one_or_none()
 
-    # Проверка существования пользователя и пароля
-    if not user or not verify_password(form_data.password, user.password_hash):
+    # Проверка существования пользователя и пароля (bcrypt выполняется вне event loop)
+    password_valid, new_password_hash = False, None
+    if user:
+        password_valid, new_password_hash = await verify_password_async(
+            form_data.password, user.password_hash
+        )
+
+    if not password_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неверное имя пользователя или пароль",
@@ -51,13 +62,19 @@ async def login(
     access_token = create_access_token(data={"sub": user.id, "username": user.username})
     refresh_token = create_refresh_token(data={"sub": user.id, "username": user.username})
 
-    # Обновление времени последнего входа
+    # Обновление времени последнего входа и устаревшего хеша пароля
+    login_values = {"last_login": datetime.utcnow()}
+    if new_password_hash:
+        login_values["password_hash"] = new_password_hash
+        logger.info(f"Хеш пароля пользователя {user.username} пересчитан (BCRYPT_ROUNDS={settings.BCRYPT_ROUNDS})")
+
     await db.execute(
         update(User)
         .where(User.id == user.id)
-        .values(last_login=datetime.utcnow())
+        .values(**login_values)
     )
     await db.commit()
+    user_cache.invalidate(user.id)
 
     return {
         "access_token": access_token,
@@ -172,7 +189,7 @@ async def register(
     new_user = User(
         username=user_data.username,
         email=user_data.email,
-        password_hash=get_password_hash(user_data.password),
+        password_hash=await get_password_hash_async(user_data.password),
         full_name=user_data.full_name,
         role=user_data.role.value,
         is_active=True
@@ -3,46 +3,37 @@ API endpoints для управления делами
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete, func, or_
+from sqlalchemy.sql import Select
+from sqlalchemy import select, update, delete, func, or_, text, column, DateTime, String, Integer
 from typing import List, Optional
 from datetime import datetime
 from app.database import get_db
 from app.models.user import User
 from app.models.case import Case
+from app.models.document import Document
 from app.schemas.case import (
     CaseCreate, CaseUpdate, CaseResponse, CaseListResponse, CaseStatus, CaseType
 )
-from app.api.deps import get_current_user
-import math
+from app.utils.pagination import paginate, encode_cursor, decode_cursor
+from app.api.deps import get_current_user, get_audit
+from app.utils.audit import AuditContext, changed_values
+from app.utils.storage import blob_store
 
 router = APIRouter()
 
 
-@router.get("/", response_model=CaseListResponse)
-async def get_cases(
-    page: int = Query(1, ge=1),
-    size: int = Query(50, ge=1, le=100),
+def filter_cases(
+    query: Select,
     case_type: Optional[CaseType] = None,
     case_status: Optional[CaseStatus] = None,
     search: Optional[str] = None,
-    tags: Optional[List[str]] = Query(None),
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
+    tags: Optional[List[str]] = None
+) -> Select:
     """
-    Получение списка дел с фильтрацией и пагинацией
+    Фильтры списка дел
 
-    - **page**: номер страницы (начиная с 1)
-    - **size**: количество элементов на странице
-    - **case_type**: фильтр по типу дела
-    - **case_status**: фильтр по статусу
-    - **search**: поиск по номеру дела, названию, истцу, ответчику
-    - **tags**: фильтр по тегам
+    Общие для списка (get_cases) и экспорта (reports.export_cases)
     """
-    # Базовый запрос
-    query = select(Case)
-
-    # Фильтры
     if case_type:
         query = query.where(Case.case_type == case_type.value)
 
@@ -63,39 +54,51 @@ async def get_cases(
         for tag in tags:
             query = query.where(Case.tags.contains([tag]))
 
-    # Подсчёт общего количества
-    count_query = select(func.count()).select_from(query.subquery())
-    total_result = await db.execute(count_query)
-    total = total_result.scalar()
+    return query
 
-    # Пагинация
-    offset = (page - 1) * size
-    query = query.offset(offset).limit(size)
 
-    # Сортировка (по дате открытия, новые первые)
-    query = query.order_by(Case.open_date.desc())
-
-    # Выполнение запроса
-    result = await db.execute(query)
-    cases = result.scalars().all()
+@router.get("/", response_model=CaseListResponse)
+async def get_cases(
+    page: int = Query(1, ge=1),
+    size: int = Query(50, ge=1, le=100),
+    after: Optional[str] = Query(None, description="Курсор следующей страницы (next_cursor)"),
+    include_total: bool = Query(True, description="Считать общее количество"),
+    case_type: Optional[CaseType] = None,
+    case_status: Optional[CaseStatus] = None,
+    search: Optional[str] = None,
+    tags: Optional[List[str]] = Query(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Получение списка дел с фильтрацией и пагинацией
 
-    # Расчёт количества страниц
-    pages = math.ceil(total / size) if total > 0 else 1
+    - **page**: номер страницы (начиная с 1)
+    - **size**: количество элементов на странице
+    - **after**: курсор из next_cursor предыдущего ответа (вместо page)
+    - **include_total**: false - не считать total (для списков без фильтров оценивается)
+    - **case_type**: фильтр по типу дела
+    - **case_status**: фильтр по статусу
+    - **search**: поиск по номеру дела, названию, истцу, ответчику
+    - **tags**: фильтр по тегам
+    """
+    query = filter_cases(select(Case), case_type, case_status, search, tags)
 
-    return CaseListResponse(
-        items=cases,
-        total=total,
-        page=page,
-        size=size,
-        pages=pages
+    # Сортировка (по дате открытия, новые первые), пагинация по странице или курсору
+    page_data = await paginate(
+        db, query, Case, Case.open_date, descending=True,
+        page=page, size=size, after=after, include_total=include_total
     )
 
+    return CaseListResponse(**page_data)
+
 
 @router.post("/", response_model=CaseResponse, status_code=status.HTTP_201_CREATED)
 async def create_case(
     case_data: CaseCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    audit: AuditContext = Depends(get_audit)
 ):
     """
     Создание нового дела
@@ -149,6 +152,12 @@ async def create_case(
     await db.commit()
     await db.refresh(new_case)
 
+    audit.record("create", "case", new_case.id, new_value={
+        "case_number": new_case.case_number,
+        "title": new_case.title,
+        "case_status": new_case.case_status
+    })
+
     return new_case
 
 
@@ -178,7 +187,8 @@ async def update_case(
     case_id: int,
     case_data: CaseUpdate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    audit: AuditContext = Depends(get_audit)
 ):
     """
     Обновление дела
@@ -203,6 +213,9 @@ async def update_case(
         update_data['case_status'] = update_data['case_status'].value
 
     if update_data:
+        # Изменённые поля (смена case_status попадает и во временную шкалу дела)
+        old_value, new_value = changed_values(case, update_data)
+
         await db.execute(
             update(Case)
             .where(Case.id == case_id)
@@ -211,6 +224,9 @@ async def update_case(
         await db.commit()
         await db.refresh(case)
 
+        if new_value:
+            audit.record("update", "case", case_id, old_value=old_value, new_value=new_value)
+
     return case
 
 
@@ -218,7 +234,8 @@ async def update_case(
 async def delete_case(
     case_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    audit: AuditContext = Depends(get_audit)
 ):
     """
     Удаление дела
@@ -243,16 +260,100 @@ async def delete_case(
             detail=f"Дело с ID {case_id} не найдено"
         )
 
+    # Освобождение файлов документов дела в хранилище
+    blob_refs = await db.execute(
+        select(Document.content_hash, func.count(Document.id))
+        .where(Document.case_id == case_id, Document.content_hash.isnot(None))
+        .group_by(Document.content_hash)
+    )
+    for content_hash, count in blob_refs.all():
+        await blob_store.release(db, content_hash, count)
+
     # Удаление дела (cascade удалит связанные записи)
     await db.execute(delete(Case).where(Case.id == case_id))
     await db.commit()
 
+    audit.record("delete", "case", case_id, old_value={
+        "case_number": case.case_number,
+        "title": case.title
+    })
+
     return None
 
 
+# Временная шкала дела одним запросом: каждая ветка UNION ALL даёт
+# (occurred_at, kind, entity_id, description, user_id, details) из своей
+# таблицы, фильтр по делу стоит внутри веток (индексы по case_id и дате).
+# (occurred_at, kind, entity_id) однозначно задаёт позицию записи - ключ курсора
+CASE_TIMELINE_QUERY = """
+SELECT occurred_at, kind, entity_id, description, user_id, details
+FROM (
+    SELECT c.created_at AS occurred_at, 'case_created' AS kind, c.id AS entity_id,
+           'Дело создано: ' || c.title AS description, c.created_by AS user_id,
+           json_build_object('case_status', c.case_status) AS details
+    FROM cases c
+    WHERE c.id = :case_id
+
+    UNION ALL
+    SELECT e.event_date, 'case_event', e.id,
+           e.description, e.created_by,
+           json_build_object('event_type', e.event_type, 'event_status', e.event_status,
+                             'location', e.location)
+    FROM case_events e
+    WHERE e.case_id = :case_id
+
+    UNION ALL
+    SELECT d.upload_date, 'document_uploaded', d.id,
+           'Загружен документ: ' || d.original_file_name, d.created_by,
+           json_build_object('document_type', d.document_type, 'file_size', d.file_size)
+    FROM documents d
+    WHERE d.case_id = :case_id
+
+    UNION ALL
+    SELECT a.created_at, 'status_changed', a.id,
+           'Статус изменён: ' || COALESCE(a.old_value->>'case_status', '-') || ' → ' || (a.new_value->>'case_status'),
+           a.user_id,
+           json_build_object('old_status', a.old_value->>'case_status',
+                             'new_status', a.new_value->>'case_status')
+    FROM audit_log a
+    WHERE a.entity_type = 'case' AND a.entity_id = :case_id
+      AND a.new_value->>'case_status' IS NOT NULL
+      AND a.new_value->>'case_status' IS DISTINCT FROM a.old_value->>'case_status'
+
+    UNION ALL
+    SELECT cp.created_at, 'person_linked', cp.id,
+           'Добавлен участник: ' || p.full_name || ' (' || cp.role_in_case || ')', NULL,
+           json_build_object('person_id', p.id, 'role_in_case', cp.role_in_case)
+    FROM case_persons cp
+    JOIN persons p ON p.id = cp.person_id
+    WHERE cp.case_id = :case_id
+
+    UNION ALL
+    SELECT cla.created_at, 'legal_act_linked', cla.id,
+           'Добавлен акт: ' || COALESCE(la.act_number || ' ', '') || la.title, NULL,
+           json_build_object('legal_act_id', la.id, 'relevance_note', cla.relevance_note)
+    FROM case_legal_acts cla
+    JOIN legal_acts la ON la.id = cla.legal_act_id
+    WHERE cla.case_id = :case_id
+) timeline
+WHERE occurred_at IS NOT NULL {after}
+ORDER BY occurred_at {direction}, kind {direction}, entity_id {direction}
+LIMIT :limit
+"""
+
+TIMELINE_CURSOR_COLUMNS = [
+    column("occurred_at", DateTime(timezone=True)),
+    column("kind", String()),
+    column("entity_id", Integer()),
+]
+
+
 @router.get("/{case_id}/timeline")
 async def get_case_timeline(
     case_id: int,
+    size: int = Query(50, ge=1, le=200),
+    after: Optional[str] = Query(None, description="Курсор следующей страницы (next_cursor)"),
+    newest_first: bool = Query(False, description="Сначала новые записи"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -261,33 +362,64 @@ async def get_case_timeline(
 
     Возвращает хронологический список всех событий дела:
     - Создание дела
+    - События дела (заседания, сроки и т.д.)
     - Загрузка документов
-    - Судебные заседания
-    - Изменения статуса
+    - Изменения статуса (из журнала аудита)
+    - Добавление участников и законодательных актов
+
+    Страницы по size записей, следующая - по курсору next_cursor
     """
     # Проверка существования дела
-    result = await db.execute(select(Case).where(Case.id == case_id))
-    case = result.scalar_one_or_none()
+    result = await db.execute(select(Case.case_number).where(Case.id == case_id))
+    case_number = result.scalar_one_or_none()
 
-    if not case:
+    if not case_number:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Дело с ID {case_id} не найдено"
         )
 
-    # TODO: Реализовать сбор событий из разных таблиц
-    # Пока возвращаем базовую информацию
+    params = {"case_id": case_id, "limit": size + 1}
+    after_condition = ""
+    if after:
+        occurred_at, kind, entity_id = decode_cursor("timeline", after, TIMELINE_CURSOR_COLUMNS)
+        comparison = "<" if newest_first else ">"
+        after_condition = (
+            f"AND (occurred_at, kind, entity_id) {comparison} "
+            f"(CAST(:after_occurred_at AS timestamptz), CAST(:after_kind AS text), "
+            f"CAST(:after_entity_id AS integer))"
+        )
+        params.update(after_occurred_at=occurred_at, after_kind=kind, after_entity_id=entity_id)
+
+    query = CASE_TIMELINE_QUERY.format(
+        after=after_condition,
+        direction="DESC" if newest_first else "ASC"
+    )
+    rows = (await db.execute(text(query), params)).all()
+
+    has_more = len(rows) > size
+    rows = rows[:size]
+
     timeline = [
         {
-            "date": case.created_at.isoformat(),
-            "event_type": "case_created",
-            "description": f"Дело создано: {case.title}",
-            "user_id": case.created_by
+            "date": row.occurred_at.isoformat(),
+            "event_type": row.kind,
+            "entity_id": row.entity_id,
+            "description": row.description,
+            "user_id": row.user_id,
+            "details": row.details
         }
+        for row in rows
     ]
 
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor("timeline", [last.occurred_at, last.kind, last.entity_id])
+
     return {
         "case_id": case_id,
-        "case_number": case.case_number,
-        "timeline": timeline
+        "case_number": case_number,
+        "timeline": timeline,
+        "next_cursor": next_cursor
     }
@@ -2,29 +2,30 @@
 API endpoints для управления документами
 Ключевой модуль: загрузка файлов, OCR, предпросмотр
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Form, Request, Response
 from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete, func, or_
+from sqlalchemy import select, update, delete, or_
 from typing import List, Optional
 from datetime import datetime, date
 from pathlib import Path
-import aiofiles
-import mimetypes
-import magic
-import hashlib
 from app.database import get_db
 from app.models.user import User
 from app.models.document import Document
 from app.models.case import Case
+from app.models.ocr_job import OCRJob
 from app.schemas.document import (
     DocumentCreate, DocumentUpdate, DocumentResponse, DocumentListResponse,
-    DocumentType, DocumentOCRResponse
+    DocumentType, OCRJobResponse
 )
-from app.api.deps import get_current_user
+from app.utils.pagination import paginate
+from app.api.deps import get_current_user, get_audit
+from app.utils.audit import AuditContext, changed_values
 from app.config import settings
-from app.utils.ollama import ollama_client
-import math
+from app.utils.jobs import ocr_queue
+from app.utils.storage import receive_upload, blob_store
+from app.utils.renditions import rendition_cache, is_renderable, PageNotFound, RENDITION_SIZES
+from app.utils.file_response import file_response, etag_matches
 import logging
 
 logger = logging.getLogger(__name__)
@@ -45,94 +46,39 @@ ALLOWED_FORMATS = {
 MAX_FILE_SIZE = settings.MAX_FILE_SIZE
 
 
-def get_file_hash(content: bytes) -> str:
-    """Получение SHA256 хеша файла"""
-    return hashlib.sha256(content).hexdigest()
-
-
-def validate_file_type(content: bytes, filename: str) -> tuple[str, str]:
-    """
-    Проверка типа файла по magic bytes (не только по расширению!)
-    Возвращает (mime_type, extension)
-    """
-    # Проверяем magic bytes
-    mime = magic.Magic(mime=True)
-    detected_mime = mime.from_buffer(content)
-
-    if detected_mime not in ALLOWED_FORMATS:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Недопустимый тип файла: {detected_mime}. Разрешены: PDF, DOCX, DOC, JPG, PNG, TXT"
-        )
-
-    extension = ALLOWED_FORMATS[detected_mime]
-    return detected_mime, extension
-
-
-def get_storage_path(case_id: Optional[int] = None) -> Path:
-    """Получение пути к хранилищу документов"""
-    storage_path = Path(settings.STORAGE_PATH) / "documents"
-
-    if case_id:
-        storage_path = storage_path / f"case_{case_id}"
-    else:
-        storage_path = storage_path / "general"
-
-    storage_path.mkdir(parents=True, exist_ok=True)
-    return storage_path
-
-
 async def save_uploaded_file(
     file: UploadFile,
-    case_id: Optional[int] = None
-) -> tuple[str, str, int, str]:
-    """
-    Сохранение загруженного файла
-    Возвращает (relative_path, new_filename, file_size, mime_type)
+    db: AsyncSession
+) -> tuple[str, str, int, str, str]:
     """
-    # Читаем содержимое файла
-    content = await file.read()
-    file_size = len(content)
-
-    # Проверка размера
-    if file_size > MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Файл слишком большой. Максимальный размер: {MAX_FILE_SIZE / 1024 / 1024:.0f} МБ"
-        )
+    Сохранение загруженного файла в контентно-адресуемое хранилище
+    (потоковый приём, дедупликация по SHA-256, см. app.utils.storage)
 
-    # Проверка типа файла
-    mime_type, extension = validate_file_type(content, file.filename)
+    Возвращает (relative_path, new_filename, file_size, mime_type, content_hash)
+    """
+    uploaded = await receive_upload(file, allowed_formats=ALLOWED_FORMATS, max_size=MAX_FILE_SIZE)
 
-    # Генерируем уникальное имя файла
+    # Отображаемое имя файла
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    file_hash = get_file_hash(content)[:8]  # Первые 8 символов хеша
+    file_hash = uploaded.sha256[:8]  # Первые 8 символов хеша
     safe_filename = file.filename.replace(" ", "_").replace("/", "_")
     new_filename = f"{timestamp}_{file_hash}_{safe_filename}"
 
-    # Определяем путь сохранения
-    storage_path = get_storage_path(case_id)
-    file_path = storage_path / new_filename
+    # Сам файл хранится один раз на всё содержимое
+    await blob_store.store(db, uploaded)
+    relative_path = blob_store.relative_path(uploaded.sha256)
 
-    # Сохраняем файл
-    async with aiofiles.open(file_path, 'wb') as f:
-        await f.write(content)
+    logger.info(f"Файл сохранён: {relative_path} ({uploaded.file_size} байт)")
 
-    # Формируем относительный путь
-    if case_id:
-        relative_path = f"case_{case_id}/{new_filename}"
-    else:
-        relative_path = f"general/{new_filename}"
-
-    logger.info(f"Файл сохранён: {relative_path} ({file_size} байт)")
-
-    return relative_path, new_filename, file_size, mime_type
+    return relative_path, new_filename, uploaded.file_size, uploaded.mime_type, uploaded.sha256
 
 
 @router.get("/", response_model=DocumentListResponse)
 async def get_documents(
     page: int = Query(1, ge=1),
     size: int = Query(50, ge=1, le=100),
+    after: Optional[str] = Query(None, description="Курсор следующей страницы (next_cursor)"),
+    include_total: bool = Query(True, description="Считать общее количество"),
     case_id: Optional[int] = None,
     document_type: Optional[DocumentType] = None,
     is_template: Optional[bool] = None,
@@ -145,6 +91,8 @@ async def get_documents(
 
     - **page**: номер страницы
     - **size**: количество элементов
+    - **after**: курсор из next_cursor предыдущего ответа (вместо page)
+    - **include_total**: false - не считать total (для списков без фильтров оценивается)
     - **case_id**: фильтр по делу
     - **document_type**: фильтр по типу документа
     - **is_template**: только шаблоны (true) или обычные документы (false)
@@ -172,33 +120,14 @@ async def get_documents(
         )
         query = query.where(search_filter)
 
-    # Подсчёт общего количества
-    count_query = select(func.count()).select_from(query.subquery())
-    total_result = await db.execute(count_query)
-    total = total_result.scalar()
-
-    # Пагинация
-    offset = (page - 1) * size
-    query = query.offset(offset).limit(size)
-
-    # Сортировка (новые первые)
-    query = query.order_by(Document.upload_date.desc())
-
-    # Выполнение запроса
-    result = await db.execute(query)
-    documents = result.scalars().all()
-
-    # Расчёт количества страниц
-    pages = math.ceil(total / size) if total > 0 else 1
-
-    return DocumentListResponse(
-        items=documents,
-        total=total,
-        page=page,
-        size=size,
-        pages=pages
+    # Сортировка (новые первые), пагинация по странице или курсору
+    page_data = await paginate(
+        db, query, Document, Document.upload_date, descending=True,
+        page=page, size=size, after=after, include_total=include_total
     )
 
+    return DocumentListResponse(**page_data)
+
 
 @router.post("/", response_model=DocumentResponse, status_code=status.HTTP_201_CREATED)
 async def upload_document(
@@ -211,7 +140,8 @@ async def upload_document(
     is_template: bool = Form(False),
     auto_ocr: bool = Form(True),  # Автоматически запустить OCR
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    audit: AuditContext = Depends(get_audit)
 ):
     """
     Загрузка документа
@@ -238,8 +168,12 @@ async def upload_document(
 
     # Сохранение файла
     try:
-        relative_path, new_filename, file_size, mime_type = await save_uploaded_file(file, case_id)
+        relative_path, new_filename, file_size, mime_type, content_hash = await save_uploaded_file(file, db)
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
+        await db.rollback()
         logger.error(f"Ошибка при сохранении файла: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -255,6 +189,16 @@ async def upload_document(
         except json.JSONDecodeError:
             tags_list = [tag.strip() for tag in tags.split(',')]
 
+    # Если такой же файл уже распознан, OCR повторно не нужен
+    existing_ocr_text = None
+    if mime_type == 'application/pdf':
+        result = await db.execute(
+            select(Document.ocr_text)
+            .where(Document.content_hash == content_hash, Document.ocr_text.isnot(None))
+            .limit(1)
+        )
+        existing_ocr_text = result.scalar_one_or_none()
+
     # Создание записи в БД
     new_document = Document(
         case_id=case_id,
@@ -264,12 +208,14 @@ async def upload_document(
         file_path=relative_path,
         file_size=file_size,
         file_format=Path(file.filename).suffix.upper().replace('.', ''),
+        content_hash=content_hash,
         upload_date=datetime.now(),
         document_date=document_date,
         description=description,
         tags=tags_list,
         version=1,
         is_template=is_template,
+        ocr_text=existing_ocr_text,
         created_by=current_user.id
     )
 
@@ -277,28 +223,31 @@ async def upload_document(
     await db.commit()
     await db.refresh(new_document)
 
-    # Автоматический OCR для PDF файлов
-    if auto_ocr and mime_type == 'application/pdf' and settings.OLLAMA_ENABLED:
+    audit.record("create", "document", new_document.id, new_value={
+        "case_id": case_id,
+        "original_file_name": new_document.original_file_name,
+        "document_type": new_document.document_type
+    })
+
+    # Миниатюра первой страницы для списка документов (в фоне)
+    rendition_cache.warm(
+        Path(settings.STORAGE_PATH) / "documents" / new_document.file_path,
+        new_document.file_format,
+        content_hash
+    )
+
+    # Автоматический OCR для PDF файлов (в фоновой очереди)
+    if existing_ocr_text:
+        logger.info(f"Документ {new_document.id}: OCR текст взят из документа с тем же содержимым")
+    elif auto_ocr and mime_type == 'application/pdf' and settings.OLLAMA_ENABLED:
         try:
-            logger.info(f"Запуск автоматического OCR для документа {new_document.id}")
-            # OCR запускаем асинхронно (в фоне)
-            # TODO: В production использовать Celery или background tasks
-            # Пока что синхронно для простоты
-            from app.utils.ollama import ollama_client
-            file_full_path = Path(settings.STORAGE_PATH) / "documents" / relative_path
-            ocr_text = await ollama_client.ocr_document(str(file_full_path))
-
-            if ocr_text:
-                await db.execute(
-                    update(Document)
-                    .where(Document.id == new_document.id)
-                    .values(ocr_text=ocr_text)
-                )
-                await db.commit()
-                await db.refresh(new_document)
-                logger.info(f"OCR успешно выполнен для документа {new_document.id}")
+            job = await ocr_queue.enqueue(db, new_document.id, current_user.id)
+            await db.commit()
+            ocr_queue.notify()
+            logger.info(f"Документ {new_document.id} поставлен в очередь OCR (задание {job.id})")
         except Exception as e:
-            logger.error(f"Ошибка при автоматическом OCR: {e}")
+            logger.error(f"Ошибка при постановке в очередь OCR: {e}")
+            await db.rollback()
             # Не прерываем загрузку, OCR можно запустить позже вручную
 
     return new_document
@@ -330,7 +279,8 @@ async def update_document(
     document_id: int,
     document_data: DocumentUpdate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    audit: AuditContext = Depends(get_audit)
 ):
     """
     Обновление метаданных документа
@@ -353,6 +303,8 @@ async def update_document(
         update_data['document_type'] = update_data['document_type'].value
 
     if update_data:
+        old_value, new_value = changed_values(document, update_data)
+
         await db.execute(
             update(Document)
             .where(Document.id == document_id)
@@ -361,6 +313,9 @@ async def update_document(
         await db.commit()
         await db.refresh(document)
 
+        if new_value:
+            audit.record("update", "document", document_id, old_value=old_value, new_value=new_value)
+
     return document
 
 
@@ -368,7 +323,8 @@ async def update_document(
 async def delete_document(
     document_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    audit: AuditContext = Depends(get_audit)
 ):
     """
     Удаление документа
@@ -393,31 +349,43 @@ async def delete_document(
             detail=f"Документ с ID {document_id} не найден"
         )
 
-    # Удаление файла с диска
-    try:
-        file_full_path = Path(settings.STORAGE_PATH) / "documents" / document.file_path
-        if file_full_path.exists():
-            file_full_path.unlink()
-            logger.info(f"Файл удалён: {file_full_path}")
-    except Exception as e:
-        logger.error(f"Ошибка при удалении файла: {e}")
-        # Продолжаем удаление записи из БД даже если файл не удалился
+    # Файл хранилища удаляется после коммита, если на него больше никто не ссылается
+    if document.content_hash:
+        await blob_store.release(db, document.content_hash)
 
     # Удаление записи из БД
     await db.execute(delete(Document).where(Document.id == document_id))
     await db.commit()
 
+    # Файл, сохранённый до перехода на хранилище blobs, - тоже только после коммита
+    if not document.content_hash:
+        try:
+            file_full_path = Path(settings.STORAGE_PATH) / "documents" / document.file_path
+            if file_full_path.exists():
+                file_full_path.unlink()
+                logger.info(f"Файл удалён: {file_full_path}")
+        except Exception as e:
+            logger.error(f"Ошибка при удалении файла: {e}")
+
+    audit.record("delete", "document", document_id, old_value={
+        "case_id": document.case_id,
+        "original_file_name": document.original_file_name
+    })
+
     return None
 
 
 @router.get("/{document_id}/download")
 async def download_document(
     document_id: int,
+    request: Request,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Скачивание документа
+
+    Поддерживает Range (206) и условные запросы (ETag - SHA-256 содержимого)
     """
     result = await db.execute(select(Document).where(Document.id == document_id))
     document = result.scalar_one_or_none()
@@ -436,22 +404,26 @@ async def download_document(
             detail="Файл не найден на диске"
         )
 
-    return FileResponse(
-        path=file_full_path,
-        filename=document.original_file_name,
-        media_type='application/octet-stream'
+    return await file_response(
+        request,
+        file_full_path,
+        content_hash=document.content_hash,
+        media_type='application/octet-stream',
+        filename=document.original_file_name
     )
 
 
 @router.get("/{document_id}/preview")
 async def preview_document(
     document_id: int,
+    request: Request,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Предпросмотр документа (inline)
-    Для PDF откроется в браузере
+    Для PDF откроется в браузере; просмотрщик PDF может запрашивать
+    диапазоны страниц (Range) вместо всего файла
     """
     result = await db.execute(select(Document).where(Document.id == document_id))
     document = result.scalar_one_or_none()
@@ -470,28 +442,116 @@ async def preview_document(
             detail="Файл не найден на диске"
         )
 
-    # Определяем MIME-тип
-    mime_type, _ = mimetypes.guess_type(str(file_full_path))
-    if not mime_type:
-        mime_type = 'application/octet-stream'
+    # MIME-тип - по исходному имени (у файлов хранилища blobs нет расширения)
+    return await file_response(
+        request,
+        file_full_path,
+        content_hash=document.content_hash,
+        filename=document.original_file_name,
+        inline=True
+    )
+
+
+@router.get("/{document_id}/thumbnail")
+async def get_document_thumbnail(
+    document_id: int,
+    request: Request,
+    page: int = Query(1, ge=1, description="Номер страницы"),
+    size: str = Query("thumb", description="Размер: thumb, medium, large"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Миниатюра страницы документа в WebP (PDF и изображения)
+
+    Оригинал не передаётся: страница растеризуется на сервере один раз и
+    отдаётся из кеша. Ответ кешируется браузером (ETag, Cache-Control)
+    """
+    if size not in RENDITION_SIZES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Неверный размер миниатюры. Доступны: {', '.join(RENDITION_SIZES)}"
+        )
 
-    return FileResponse(
-        path=file_full_path,
-        media_type=mime_type,
-        headers={"Content-Disposition": f"inline; filename={document.original_file_name}"}
+    result = await db.execute(
+        select(Document.file_path, Document.file_format, Document.content_hash)
+        .where(Document.id == document_id)
     )
+    document = result.one_or_none()
+
+    if not document:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Документ с ID {document_id} не найден"
+        )
+
+    if not is_renderable(document.file_format):
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Миниатюры недоступны для формата {document.file_format}"
+        )
+
+    file_full_path = Path(settings.STORAGE_PATH) / "documents" / document.file_path
+
+    # Документы до контентно-адресуемого хранилища - ключ по файлу на диске
+    content_hash = document.content_hash
+    if not content_hash:
+        try:
+            stat = file_full_path.stat()
+        except FileNotFoundError:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Файл не найден на диске"
+            )
+        content_hash = f"doc{document_id}_{stat.st_mtime_ns}_{stat.st_size}"
 
+    etag = f'"{rendition_cache.cache_key(content_hash, page, size)}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={settings.RENDITION_MAX_AGE}"
+    }
 
-@router.post("/{document_id}/ocr", response_model=DocumentOCRResponse)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if not file_full_path.exists():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Файл не найден на диске"
+        )
+
+    try:
+        path = await rendition_cache.get_or_render(file_full_path, document.file_format, content_hash, page, size)
+    except PageNotFound:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Страница {page} не найдена в документе"
+        )
+    except Exception as e:
+        logger.error(f"Ошибка построения миниатюры документа {document_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Не удалось построить миниатюру документа"
+        )
+
+    return FileResponse(path=path, media_type="image/webp", headers=headers)
+
+
+@router.post(
+    "/{document_id}/ocr",
+    response_model=OCRJobResponse,
+    status_code=status.HTTP_202_ACCEPTED
+)
 async def run_ocr(
     document_id: int,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
-    Запуск OCR обработки документа через Ollama
+    Постановка документа в очередь OCR обработки через Ollama
 
-    Работает только для PDF файлов
+    Работает только для PDF файлов. Возвращает задание сразу,
+    ход обработки - через GET /{document_id}/ocr/status
     """
     if not settings.OLLAMA_ENABLED:
         raise HTTPException(
@@ -524,36 +584,37 @@ async def run_ocr(
             detail="Файл не найден на диске"
         )
 
-    # Запуск OCR
-    try:
-        logger.info(f"Запуск OCR для документа {document_id}: {document.file_name}")
-        ocr_text = await ollama_client.ocr_document(str(file_full_path))
+    job = await ocr_queue.enqueue(db, document_id, current_user.id)
+    await db.commit()
+    await db.refresh(job)
+    ocr_queue.notify()
 
-        if not ocr_text:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="OCR не вернул результат"
-            )
+    logger.info(f"Документ {document_id} поставлен в очередь OCR (задание {job.id})")
 
-        # Сохранение результата в БД
-        await db.execute(
-            update(Document)
-            .where(Document.id == document_id)
-            .values(ocr_text=ocr_text)
-        )
-        await db.commit()
+    return job
 
-        logger.info(f"OCR успешно выполнен для документа {document_id}")
 
-        return DocumentOCRResponse(
-            document_id=document_id,
-            ocr_text=ocr_text,
-            success=True
-        )
+@router.get("/{document_id}/ocr/status", response_model=OCRJobResponse)
+async def get_ocr_status(
+    document_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Состояние последнего задания OCR для документа
+    """
+    result = await db.execute(
+        select(OCRJob)
+        .where(OCRJob.document_id == document_id)
+        .order_by(OCRJob.created_at.desc(), OCRJob.id.desc())
+        .limit(1)
+    )
+    job = result.scalar_one_or_none()
 
-    except Exception as e:
-        logger.error(f"Ошибка при OCR обработке: {e}")
+    if not job:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Ошибка при OCR обработке: {str(e)}"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Для документа с ID {document_id} нет заданий OCR"
         )
+
+    return job
@@ -1,11 +1,11 @@
 """
 API endpoints для управления событиями и календарём
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Path
+from fastapi import APIRouter, Body, Depends, HTTPException, status, Query, Path
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete, func, and_, or_
+from sqlalchemy import select, update, delete, and_, or_
 from typing import List, Optional
-from datetime import datetime, date, timedelta
+from datetime import datetime, date, timedelta, timezone
 from app.database import get_db
 from app.models.user import User
 from app.models.case_event import CaseEvent
@@ -14,8 +14,9 @@ from app.schemas.case_event import (
     CaseEventCreate, CaseEventUpdate, CaseEventResponse, CaseEventListResponse,
     EventType, EventStatus, CalendarEventResponse
 )
-from app.api.deps import get_current_user
-import math
+from app.utils.pagination import paginate
+from app.api.deps import get_current_user, get_audit
+from app.utils.audit import AuditContext, changed_values
 import logging
 
 logger = logging.getLogger(__name__)
@@ -27,6 +28,8 @@ router = APIRouter()
 async def get_events(
     page: int = Query(1, ge=1),
     size: int = Query(50, ge=1, le=100),
+    after: Optional[str] = Query(None, description="Курсор следующей страницы (next_cursor)"),
+    include_total: bool = Query(True, description="Считать общее количество"),
     case_id: Optional[int] = None,
     event_type: Optional[EventType] = None,
     event_status: Optional[EventStatus] = None,
@@ -40,6 +43,8 @@ async def get_events(
 
     - **page**: номер страницы
     - **size**: количество элементов
+    - **after**: курсор из next_cursor предыдущего ответа (вместо page)
+    - **include_total**: false - не считать total (для списков без фильтров оценивается)
     - **case_id**: фильтр по делу
     - **event_type**: фильтр по типу события
     - **event_status**: фильтр по статусу
@@ -69,39 +74,21 @@ async def get_events(
         datetime_to = datetime.combine(date_to, datetime.max.time())
         query = query.where(CaseEvent.event_date <= datetime_to)
 
-    # Подсчёт общего количества
-    count_query = select(func.count()).select_from(query.subquery())
-    total_result = await db.execute(count_query)
-    total = total_result.scalar()
-
-    # Пагинация
-    offset = (page - 1) * size
-    query = query.offset(offset).limit(size)
-
-    # Сортировка (ближайшие события первыми)
-    query = query.order_by(CaseEvent.event_date.asc())
-
-    # Выполнение запроса
-    result = await db.execute(query)
-    events = result.scalars().all()
-
-    # Расчёт количества страниц
-    pages = math.ceil(total / size) if total > 0 else 1
-
-    return CaseEventListResponse(
-        items=events,
-        total=total,
-        page=page,
-        size=size,
-        pages=pages
+    # Сортировка (ближайшие события первыми), пагинация по странице или курсору
+    page_data = await paginate(
+        db, query, CaseEvent, CaseEvent.event_date, descending=False,
+        page=page, size=size, after=after, include_total=include_total
     )
 
+    return CaseEventListResponse(**page_data)
+
 
 @router.post("/", response_model=CaseEventResponse, status_code=status.HTTP_201_CREATED)
 async def create_event(
     event_data: CaseEventCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    audit: AuditContext = Depends(get_audit)
 ):
     """
     Создание нового события
@@ -137,6 +124,12 @@ async def create_event(
     await db.commit()
     await db.refresh(new_event)
 
+    audit.record("create", "case_event", new_event.id, new_value={
+        "case_id": new_event.case_id,
+        "event_type": new_event.event_type,
+        "event_date": new_event.event_date
+    })
+
     logger.info(f"Создано событие {new_event.id} для дела {case.case_number}")
 
     return new_event
@@ -168,7 +161,8 @@ async def update_event(
     event_id: int,
     event_data: CaseEventUpdate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    audit: AuditContext = Depends(get_audit)
 ):
     """
     Обновление события
@@ -192,11 +186,13 @@ async def update_event(
     if 'event_status' in update_data and update_data['event_status']:
         update_data['event_status'] = update_data['event_status'].value
 
-    # Если изменилась дата или статус, сбросить reminder_sent
-    if 'event_date' in update_data or 'event_status' in update_data:
+    # Если изменилась дата, срок напоминания или статус, сбросить reminder_sent
+    if 'event_date' in update_data or 'event_status' in update_data or 'reminder_days_before' in update_data:
         update_data['reminder_sent'] = False
 
     if update_data:
+        old_value, new_value = changed_values(event, update_data)
+
         await db.execute(
             update(CaseEvent)
             .where(CaseEvent.id == event_id)
@@ -205,6 +201,9 @@ async def update_event(
         await db.commit()
         await db.refresh(event)
 
+        if new_value:
+            audit.record("update", "case_event", event_id, old_value=old_value, new_value=new_value)
+
     return event
 
 
@@ -212,7 +211,8 @@ async def update_event(
 async def delete_event(
     event_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    audit: AuditContext = Depends(get_audit)
 ):
     """
     Удаление события
@@ -231,6 +231,12 @@ async def delete_event(
     await db.execute(delete(CaseEvent).where(CaseEvent.id == event_id))
     await db.commit()
 
+    audit.record("delete", "case_event", event_id, old_value={
+        "case_id": event.case_id,
+        "event_type": event.event_type,
+        "event_date": event.event_date
+    })
+
     return None
 
 
@@ -381,43 +387,39 @@ async def get_pending_reminders(
             detail="Требуются права администратора"
         )
 
-    now = datetime.now()
+    now = datetime.now(timezone.utc)
 
-    # Находим события, для которых пора отправить напоминание
+    # Наступившие напоминания по частичному индексу ix_case_events_remind_at_pending
     query = (
         select(CaseEvent, Case.case_number)
         .join(Case, CaseEvent.case_id == Case.id)
         .where(
             and_(
-                CaseEvent.event_status == EventStatus.SCHEDULED.value,
                 CaseEvent.reminder_sent == False,
+                CaseEvent.remind_at <= now,
+                CaseEvent.event_status == EventStatus.SCHEDULED.value,
                 CaseEvent.event_date > now  # Событие ещё не прошло
             )
         )
+        .order_by(CaseEvent.remind_at)
     )
 
     result = await db.execute(query)
-    events_data = result.all()
 
-    # Фильтруем события, для которых пора отправить напоминание
-    pending_reminders = []
-    for event, case_number in events_data:
-        # Вычисляем дату напоминания
-        reminder_date = event.event_date - timedelta(days=event.reminder_days_before)
-
-        # Если пора отправить напоминание (reminder_date <= now)
-        if reminder_date <= now:
-            pending_reminders.append({
-                "event_id": event.id,
-                "case_id": event.case_id,
-                "case_number": case_number,
-                "event_type": event.event_type,
-                "event_date": event.event_date.isoformat(),
-                "description": event.description,
-                "location": event.location,
-                "reminder_days_before": event.reminder_days_before,
-                "reminder_date": reminder_date.isoformat()
-            })
+    pending_reminders = [
+        {
+            "event_id": event.id,
+            "case_id": event.case_id,
+            "case_number": case_number,
+            "event_type": event.event_type,
+            "event_date": event.event_date.isoformat(),
+            "description": event.description,
+            "location": event.location,
+            "reminder_days_before": event.reminder_days_before,
+            "reminder_date": event.remind_at.isoformat()
+        }
+        for event, case_number in result.all()
+    ]
 
     return {
         "pending_reminders": pending_reminders,
@@ -425,6 +427,35 @@ async def get_pending_reminders(
     }
 
 
+@router.post("/reminders/mark-sent")
+async def mark_reminders_sent(
+    event_ids: List[int] = Body(..., embed=True),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Отметить отправленными напоминания нескольких событий одним запросом
+
+    Для внешней отправки; встроенная отправка (app.utils.reminders)
+    отмечает напоминания сама
+    **Требуются права администратора**
+    """
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Требуются права администратора"
+        )
+
+    result = await db.execute(
+        update(CaseEvent)
+        .where(CaseEvent.id.in_(event_ids), CaseEvent.reminder_sent == False)
+        .values(reminder_sent=True)
+    )
+    await db.commit()
+
+    return {"updated": result.rowcount}
+
+
 @router.post("/{event_id}/mark-reminder-sent", status_code=status.HTTP_204_NO_CONTENT)
 async def mark_reminder_sent(
     event_id: int,
@@ -1,14 +1,12 @@
 """
 API endpoints для законодательной базы РМ
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Form
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Form, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete, func, or_
+from sqlalchemy import select, update, delete, or_
 from typing import List, Optional
 from datetime import datetime, date
 from pathlib import Path
-import aiofiles
 from app.database import get_db
 from app.models.user import User
 from app.models.legal_act import LegalAct
@@ -16,9 +14,12 @@ from app.schemas.legal_act import (
     LegalActCreate, LegalActUpdate, LegalActResponse, LegalActListResponse,
     ActType, ActStatus
 )
-from app.api.deps import get_current_user
+from app.utils.pagination import paginate
+from app.api.deps import get_current_user, get_audit
+from app.utils.audit import AuditContext
 from app.config import settings
-import math
+from app.utils.storage import receive_upload, commit_upload
+from app.utils.file_response import file_response
 import logging
 
 logger = logging.getLogger(__name__)
@@ -30,6 +31,8 @@ router = APIRouter()
 async def get_legal_acts(
     page: int = Query(1, ge=1),
     size: int = Query(50, ge=1, le=100),
+    after: Optional[str] = Query(None, description="Курсор следующей страницы (next_cursor)"),
+    include_total: bool = Query(True, description="Считать общее количество"),
     act_type: Optional[ActType] = None,
     act_status: Optional[ActStatus] = None,
     search: Optional[str] = None,
@@ -55,26 +58,14 @@ async def get_legal_acts(
         )
         query = query.where(search_filter)
 
-    count_query = select(func.count()).select_from(query.subquery())
-    total_result = await db.execute(count_query)
-    total = total_result.scalar()
-
-    offset = (page - 1) * size
-    query = query.offset(offset).limit(size).order_by(LegalAct.created_at.desc())
-
-    result = await db.execute(query)
-    legal_acts = result.scalars().all()
-
-    pages = math.ceil(total / size) if total > 0 else 1
-
-    return LegalActListResponse(
-        items=legal_acts,
-        total=total,
-        page=page,
-        size=size,
-        pages=pages
+    # Сортировка и пагинация по странице или курсору
+    page_data = await paginate(
+        db, query, LegalAct, LegalAct.created_at, descending=True,
+        page=page, size=size, after=after, include_total=include_total
     )
 
+    return LegalActListResponse(**page_data)
+
 
 @router.post("/", response_model=LegalActResponse, status_code=status.HTTP_201_CREATED)
 async def upload_legal_act(
@@ -86,23 +77,21 @@ async def upload_legal_act(
     tags: Optional[str] = Form(None),
     act_status: ActStatus = Form(ActStatus.ACTIVE),
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    audit: AuditContext = Depends(get_audit)
 ):
     """
     Загрузка законодательного акта
     """
-    # Сохранение файла
+    # Сохранение файла (потоковое)
     storage_path = Path(settings.STORAGE_PATH) / "legal_acts"
-    storage_path.mkdir(parents=True, exist_ok=True)
+
+    uploaded = await receive_upload(file)
 
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     safe_filename = file.filename.replace(" ", "_")
     new_filename = f"{timestamp}_{safe_filename}"
-    file_path = storage_path / new_filename
-
-    content = await file.read()
-    async with aiofiles.open(file_path, 'wb') as f:
-        await f.write(content)
+    await commit_upload(uploaded, storage_path / new_filename)
 
     # Парсинг тегов
     import json
@@ -120,7 +109,8 @@ async def upload_legal_act(
         act_date=act_date,
         title=title,
         file_path=f"legal_acts/{new_filename}",
-        file_size=len(content),
+        file_size=uploaded.file_size,
+        content_hash=uploaded.sha256,
         tags=tags_list,
         act_status=act_status.value
     )
@@ -129,6 +119,12 @@ async def upload_legal_act(
     await db.commit()
     await db.refresh(new_legal_act)
 
+    audit.record("create", "legal_act", new_legal_act.id, new_value={
+        "act_type": new_legal_act.act_type,
+        "act_number": new_legal_act.act_number,
+        "title": new_legal_act.title
+    })
+
     return new_legal_act
 
 
@@ -154,10 +150,11 @@ async def get_legal_act(
 @router.get("/{legal_act_id}/download")
 async def download_legal_act(
     legal_act_id: int,
+    request: Request,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Скачивание файла законодательного акта"""
+    """Скачивание файла законодательного акта (с поддержкой Range и условных запросов)"""
     result = await db.execute(select(LegalAct).where(LegalAct.id == legal_act_id))
     legal_act = result.scalar_one_or_none()
 
@@ -169,14 +166,20 @@ async def download_legal_act(
     if not file_full_path.exists():
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Файл не найден")
 
-    return FileResponse(path=file_full_path, filename=Path(legal_act.file_path).name)
+    return await file_response(
+        request,
+        file_full_path,
+        content_hash=legal_act.content_hash,
+        filename=Path(legal_act.file_path).name
+    )
 
 
 @router.delete("/{legal_act_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_legal_act(
     legal_act_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    audit: AuditContext = Depends(get_audit)
 ):
     """Удаление законодательного акта (только admin)"""
     if current_user.role != "admin":
@@ -199,4 +202,9 @@ async def delete_legal_act(
     await db.execute(delete(LegalAct).where(LegalAct.id == legal_act_id))
     await db.commit()
 
+    audit.record("delete", "legal_act", legal_act_id, old_value={
+        "act_number": legal_act.act_number,
+        "title": legal_act.title
+    })
+
     return None
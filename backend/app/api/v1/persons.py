@@ -3,7 +3,7 @@ API endpoints для управления персонами
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete, func, or_
+from sqlalchemy import select, update, delete, or_
 from typing import List, Optional
 from datetime import datetime
 from app.database import get_db
@@ -14,8 +14,9 @@ from app.models.case import Case
 from app.schemas.person import (
     PersonCreate, PersonUpdate, PersonResponse, PersonListResponse, PersonType
 )
-from app.api.deps import get_current_user
-import math
+from app.utils.pagination import paginate
+from app.api.deps import get_current_user, get_audit
+from app.utils.audit import AuditContext, changed_values
 
 
 router = APIRouter()
@@ -25,6 +26,8 @@ router = APIRouter()
 async def get_persons(
     page: int = Query(1, ge=1),
     size: int = Query(50, ge=1, le=100),
+    after: Optional[str] = Query(None, description="Курсор следующей страницы (next_cursor)"),
+    include_total: bool = Query(True, description="Считать общее количество"),
     person_type: Optional[PersonType] = None,
     search: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
@@ -35,6 +38,8 @@ async def get_persons(
 
     - **page**: номер страницы (начиная с 1)
     - **size**: количество элементов на странице
+    - **after**: курсор из next_cursor предыдущего ответа (вместо page)
+    - **include_total**: false - не считать total (для списков без фильтров оценивается)
     - **person_type**: фильтр по типу персоны
     - **search**: поиск по ФИО, IDNP, телефону, email
     """
@@ -55,39 +60,21 @@ async def get_persons(
         )
         query = query.where(search_filter)
 
-    # Подсчёт общего количества
-    count_query = select(func.count()).select_from(query.subquery())
-    total_result = await db.execute(count_query)
-    total = total_result.scalar()
-
-    # Пагинация
-    offset = (page - 1) * size
-    query = query.offset(offset).limit(size)
-
-    # Сортировка (по имени)
-    query = query.order_by(Person.full_name.asc())
-
-    # Выполнение запроса
-    result = await db.execute(query)
-    persons = result.scalars().all()
-
-    # Расчёт количества страниц
-    pages = math.ceil(total / size) if total > 0 else 1
-
-    return PersonListResponse(
-        items=persons,
-        total=total,
-        page=page,
-        size=size,
-        pages=pages
+    # Сортировка (по имени), пагинация по странице или курсору
+    page_data = await paginate(
+        db, query, Person, Person.full_name, descending=False,
+        page=page, size=size, after=after, include_total=include_total
     )
 
+    return PersonListResponse(**page_data)
+
 
 @router.post("/", response_model=PersonResponse, status_code=status.HTTP_201_CREATED)
 async def create_person(
     person_data: PersonCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    audit: AuditContext = Depends(get_audit)
 ):
     """
     Создание новой персоны
@@ -127,6 +114,11 @@ async def create_person(
     await db.commit()
     await db.refresh(new_person)
 
+    audit.record("create", "person", new_person.id, new_value={
+        "full_name": new_person.full_name,
+        "person_type": new_person.person_type
+    })
+
     return new_person
 
 
@@ -156,7 +148,8 @@ async def update_person(
     person_id: int,
     person_data: PersonUpdate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    audit: AuditContext = Depends(get_audit)
 ):
     """
     Обновление персоны
@@ -191,6 +184,8 @@ async def update_person(
         update_data['person_type'] = update_data['person_type'].value
 
     if update_data:
+        old_value, new_value = changed_values(person, update_data)
+
         await db.execute(
             update(Person)
             .where(Person.id == person_id)
@@ -199,6 +194,9 @@ async def update_person(
         await db.commit()
         await db.refresh(person)
 
+        if new_value:
+            audit.record("update", "person", person_id, old_value=old_value, new_value=new_value)
+
     return person
 
 
@@ -206,7 +204,8 @@ async def update_person(
 async def delete_person(
     person_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    audit: AuditContext = Depends(get_audit)
 ):
     """
     Удаление персоны
@@ -235,6 +234,8 @@ async def delete_person(
     await db.execute(delete(Person).where(Person.id == person_id))
     await db.commit()
 
+    audit.record("delete", "person", person_id, old_value={"full_name": person.full_name})
+
     return None
 
 
@@ -2,20 +2,28 @@
 API endpoints для генерации отчётов
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from typing import Optional
+from sqlalchemy import select, text
+from typing import List, Optional
 from datetime import datetime, date
-from pathlib import Path
-import tempfile
 from app.database import get_db
 from app.models.user import User
 from app.models.case import Case
 from app.models.document import Document
 from app.models.case_event import CaseEvent
+from app.models.person import Person
+from app.models.case_person import CasePerson
+from app.models.legal_act import LegalAct
+from app.models.case_legal_act import CaseLegalAct
 from app.api.deps import get_current_user
+from app.api.v1.cases import filter_cases
+from app.schemas.case import CaseStatus, CaseType
+from app.utils.reports import report_cache, render_case_dossier, dossier_version
+from app.utils.export import case_export_query, stream_cases_csv, write_cases_xlsx
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
@@ -29,13 +37,17 @@ async def generate_case_report_pdf(
     current_user: User = Depends(get_current_user)
 ):
     """
-    Генерация PDF карточки дела
+    Генерация PDF досье дела
 
     Включает:
     - Основная информация о деле
     - Список персон
     - Список документов
     - События
+    - Связанные законодательные акты
+
+    Связанные данные загружаются четырьмя запросами (только нужные
+    столбцы), независимо от размера дела
     """
     # Получение дела
     result = await db.execute(select(Case).where(Case.id == case_id))
@@ -47,59 +59,65 @@ async def generate_case_report_pdf(
             detail=f"Дело с ID {case_id} не найдено"
         )
 
-    # Генерация PDF с помощью reportlab
-    from reportlab.lib.pagesizes import A4
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import cm
-    from reportlab.pdfbase import pdfmetrics
-    from reportlab.pdfbase.ttfonts import TTFont
-
-    # Создаём временный файл
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-        pdf_path = tmp_file.name
-
-    # Создаём PDF документ
-    doc = SimpleDocTemplate(pdf_path, pagesize=A4)
-    story = []
-    styles = getSampleStyleSheet()
-
-    # Заголовок
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=16,
-        spaceAfter=30,
+    persons = await db.execute(
+        select(
+            Person.full_name, Person.person_type, CasePerson.role_in_case,
+            Person.idnp, Person.phone, CasePerson.notes
+        )
+        .join(Person, Person.id == CasePerson.person_id)
+        .where(CasePerson.case_id == case_id)
+        .order_by(CasePerson.role_in_case, Person.full_name)
+    )
+
+    documents = await db.execute(
+        select(
+            Document.document_date, Document.upload_date,
+            Document.original_file_name, Document.document_type,
+            Document.file_size, Document.description
+        )
+        .where(Document.case_id == case_id)
+        .order_by(Document.upload_date, Document.id)
+    )
+
+    events = await db.execute(
+        select(
+            CaseEvent.event_date, CaseEvent.event_type, CaseEvent.event_status,
+            CaseEvent.location, CaseEvent.description
+        )
+        .where(CaseEvent.case_id == case_id)
+        .order_by(CaseEvent.event_date, CaseEvent.id)
+    )
+
+    legal_acts = await db.execute(
+        select(
+            LegalAct.act_type, LegalAct.act_number, LegalAct.act_date,
+            LegalAct.title, CaseLegalAct.relevance_note
+        )
+        .join(LegalAct, LegalAct.id == CaseLegalAct.legal_act_id)
+        .where(CaseLegalAct.case_id == case_id)
+        .order_by(LegalAct.act_date, LegalAct.id)
+    )
+
+    # Снимок данных для потока генерации (ORM объекты в поток не передаём)
+    dossier = {
+        "case": {
+            column.key: getattr(case, column.key)
+            for column in Case.__table__.columns
+            if column.key != "search_vector"
+        },
+        "persons": [tuple(row) for row in persons.all()],
+        "documents": [tuple(row) for row in documents.all()],
+        "events": [tuple(row) for row in events.all()],
+        "legal_acts": [tuple(row) for row in legal_acts.all()],
+    }
+
+    # Готовый PDF из кеша или генерация в отдельном потоке
+    pdf_path = await report_cache.get_or_render(
+        "case",
+        case.id,
+        dossier_version(dossier),
+        lambda path: render_case_dossier(dossier, path)
     )
-    story.append(Paragraph(f"Карточка дела №{case.case_number}", title_style))
-
-    # Основная информация
-    info_data = [
-        ["Номер дела:", case.case_number],
-        ["Префикс:", case.case_prefix],
-        ["Тип дела:", case.case_type],
-        ["Статус:", case.case_status],
-        ["Название:", case.title],
-        ["Истец:", case.plaintiff or "-"],
-        ["Ответчик:", case.defendant or "-"],
-        ["Суд:", case.court or "-"],
-        ["Судья:", case.judge or "-"],
-        ["Дата открытия:", case.open_date.strftime('%d.%m.%Y') if case.open_date else "-"],
-        ["Дата закрытия:", case.close_date.strftime('%d.%m.%Y') if case.close_date else "-"],
-    ]
-
-    info_table = Table(info_data, colWidths=[5*cm, 12*cm])
-    story.append(info_table)
-    story.append(Spacer(1, 1*cm))
-
-    # Описание
-    if case.description:
-        story.append(Paragraph("<b>Описание:</b>", styles['Heading2']))
-        story.append(Paragraph(case.description, styles['BodyText']))
-        story.append(Spacer(1, 0.5*cm))
-
-    # Генерация PDF
-    doc.build(story)
 
     return FileResponse(
         path=pdf_path,
@@ -109,6 +127,23 @@ async def generate_case_report_pdf(
     )
 
 
+# Статистика за период одним запросом по дневным счётчикам (миграция 009):
+# GROUPING SETS даёт разбивку по статусам, по типам и общий итог дел,
+# UNION ALL добавляет количество документов. {where} - условия по дню
+STATISTICS_QUERY = """
+SELECT 'case' AS kind, case_status, case_type,
+       GROUPING(case_status, case_type) AS grouping_id,
+       SUM(cases_count)::bigint AS total
+FROM case_stats_daily
+{where}
+GROUP BY GROUPING SETS ((case_status), (case_type), ())
+UNION ALL
+SELECT 'document', NULL, NULL, 3, COALESCE(SUM(documents_count), 0)::bigint
+FROM document_stats_daily
+{where}
+"""
+
+
 @router.get("/statistics")
 async def get_statistics(
     date_from: Optional[date] = None,
@@ -122,49 +157,38 @@ async def get_statistics(
     - Количество дел по статусам
     - Количество дел по типам
     - Количество документов
-    - Ближайшие события
-    """
-    # Базовый запрос
-    query = select(Case)
 
+    Период (date_from, date_to включительно) применяется ко всем
+    показателям: к дате создания дел и дате загрузки документов
+    """
+    conditions = []
+    params = {}
     if date_from:
-        datetime_from = datetime.combine(date_from, datetime.min.time())
-        query = query.where(Case.created_at >= datetime_from)
-
+        conditions.append("day >= :date_from")
+        params["date_from"] = date_from
     if date_to:
-        datetime_to = datetime.combine(date_to, datetime.max.time())
-        query = query.where(Case.created_at <= datetime_to)
-
-    # Статистика по статусам
-    status_query = select(
-        Case.case_status,
-        func.count(Case.id)
-    ).group_by(Case.case_status)
-
-    if date_from or date_to:
-        status_query = query.add_columns(func.count(Case.id)).group_by(Case.case_status)
-
-    status_result = await db.execute(status_query)
-    status_stats = {row[0]: row[1] for row in status_result.all()}
-
-    # Статистика по типам
-    type_query = select(
-        Case.case_type,
-        func.count(Case.id)
-    ).group_by(Case.case_type)
-
-    type_result = await db.execute(type_query)
-    type_stats = {row[0]: row[1] for row in type_result.all()}
-
-    # Общее количество документов
-    doc_count_query = select(func.count(Document.id))
-    doc_count_result = await db.execute(doc_count_query)
-    total_documents = doc_count_result.scalar()
-
-    # Общее количество дел
-    case_count_query = select(func.count(Case.id))
-    case_count_result = await db.execute(case_count_query)
-    total_cases = case_count_result.scalar()
+        conditions.append("day <= :date_to")
+        params["date_to"] = date_to
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    result = await db.execute(text(STATISTICS_QUERY.format(where=where)), params)
+
+    status_stats = {}
+    type_stats = {}
+    total_cases = 0
+    total_documents = 0
+    for row in result.all():
+        if row.kind == "document":
+            total_documents = row.total
+        elif row.grouping_id == 1:
+            # Счётчики дня могут обнулиться после удалений
+            if row.total:
+                status_stats[row.case_status] = row.total
+        elif row.grouping_id == 2:
+            if row.total:
+                type_stats[row.case_type] = row.total
+        else:
+            total_cases = row.total or 0
 
     return {
         "total_cases": total_cases,
@@ -179,15 +203,39 @@ async def get_statistics(
 @router.get("/export/cases")
 async def export_cases(
     format: str = Query("csv", description="Формат экспорта: csv, excel"),
-    db: AsyncSession = Depends(get_db),
+    case_type: Optional[CaseType] = None,
+    case_status: Optional[CaseStatus] = None,
+    search: Optional[str] = None,
+    tags: Optional[List[str]] = Query(None),
     current_user: User = Depends(get_current_user)
 ):
     """
     Экспорт списка дел в CSV или Excel
 
-    **В разработке**
+    Фильтры те же, что у списка дел (GET /api/cases). Строки читаются
+    серверным курсором: CSV отдаётся по мере чтения, Excel (XLSX)
+    собирается во временном файле в режиме write-only.
     """
-    raise HTTPException(
-        status_code=status.HTTP_501_NOT_IMPLEMENTED,
-        detail="Экспорт находится в разработке"
+    if format not in ("csv", "excel"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Неподдерживаемый формат экспорта (допустимо: csv, excel)"
+        )
+
+    query = case_export_query(filter_cases(select(Case), case_type, case_status, search, tags))
+    file_name = f"cases_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+    if format == "csv":
+        return StreamingResponse(
+            stream_cases_csv(query),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": f'attachment; filename="{file_name}.csv"'}
+        )
+
+    xlsx_path = await write_cases_xlsx(query)
+    return FileResponse(
+        xlsx_path,
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        filename=f"{file_name}.xlsx",
+        background=BackgroundTask(os.unlink, xlsx_path)
     )
@@ -1,17 +1,20 @@
 """
 API endpoints для глобального поиска
 """
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_, func, text
+from sqlalchemy import select, text
 from typing import Optional, List
 from app.database import get_db
 from app.models.user import User
-from app.models.case import Case
-from app.models.person import Person
-from app.models.document import Document
-from app.models.legal_act import LegalAct
+from app.models.case import SEARCH_TEXT as CASE_SEARCH_TEXT
+from app.models.person import SEARCH_TEXT as PERSON_SEARCH_TEXT
+from app.models.document import Document, SEARCH_TEXT as DOCUMENT_SEARCH_TEXT
+from app.models.legal_act import LegalAct, SEARCH_TEXT as LEGAL_ACT_SEARCH_TEXT
+from app.models.document_embedding import DocumentEmbedding
+from app.schemas.document import DocumentType
 from app.api.deps import get_current_user
+from app.config import settings
 from app.utils.ollama import ollama_client
 import logging
 
@@ -20,6 +23,63 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
+# Запрос разбирается обеими конфигурациями: строки индексированы русской
+# или румынской конфигурацией в зависимости от языка текста
+FTS_QUERY = (
+    "(SELECT websearch_to_tsquery('russian', :q) || websearch_to_tsquery('romanian', :q) AS query) AS fts"
+)
+
+
+def escape_like(value: str) -> str:
+    """Экранирование спецсимволов LIKE (%, _ и \\) в пользовательском запросе"""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+# Ветки глобального поиска: короткие поля ищутся подстрокой по триграммному
+# индексу, длинные тексты (OCR, текст акта) - по полнотекстовому индексу.
+# Ранжирование по word_similarity (pg_trgm) или ts_rank, что больше
+GLOBAL_SEARCH_BRANCHES = {
+    "cases": f"""
+        SELECT 'cases' AS category, word_similarity(:q, {CASE_SEARCH_TEXT}) AS score,
+               json_build_object('id', id, 'case_number', case_number, 'title', title,
+                                 'case_type', case_type, 'case_status', case_status) AS item
+        FROM cases
+        WHERE ({CASE_SEARCH_TEXT}) ILIKE :pattern
+        ORDER BY score DESC, id DESC
+        LIMIT :limit
+    """,
+    "persons": f"""
+        SELECT 'persons' AS category, word_similarity(:q, {PERSON_SEARCH_TEXT}) AS score,
+               json_build_object('id', id, 'full_name', full_name, 'person_type', person_type,
+                                 'idnp', idnp) AS item
+        FROM persons
+        WHERE ({PERSON_SEARCH_TEXT}) ILIKE :pattern
+        ORDER BY score DESC, id DESC
+        LIMIT :limit
+    """,
+    "documents": f"""
+        SELECT 'documents' AS category,
+               GREATEST(word_similarity(:q, {DOCUMENT_SEARCH_TEXT}), ts_rank(search_vector, query)) AS score,
+               json_build_object('id', id, 'file_name', file_name, 'document_type', document_type,
+                                 'case_id', case_id) AS item
+        FROM documents, {FTS_QUERY}
+        WHERE ({DOCUMENT_SEARCH_TEXT}) ILIKE :pattern OR search_vector @@ query
+        ORDER BY score DESC, id DESC
+        LIMIT :limit
+    """,
+    "legal_acts": f"""
+        SELECT 'legal_acts' AS category,
+               GREATEST(word_similarity(:q, {LEGAL_ACT_SEARCH_TEXT}), ts_rank(search_vector, query)) AS score,
+               json_build_object('id', id, 'title', title, 'act_type', act_type,
+                                 'act_number', act_number) AS item
+        FROM legal_acts, {FTS_QUERY}
+        WHERE ({LEGAL_ACT_SEARCH_TEXT}) ILIKE :pattern OR search_vector @@ query
+        ORDER BY score DESC, id DESC
+        LIMIT :limit
+    """,
+}
+
+
 @router.get("/")
 async def global_search(
     q: str = Query(..., min_length=2, description="Поисковый запрос"),
@@ -31,6 +91,9 @@ async def global_search(
     """
     Глобальный поиск по всей системе
 
+    Все категории ищутся одним запросом (UNION ALL), результаты внутри
+    категории отсортированы по релевантности
+
     - **q**: поисковый запрос (минимум 2 символа)
     - **search_type**: где искать (all, cases, persons, documents, legal_acts)
     - **limit**: максимальное количество результатов в каждой категории
@@ -44,99 +107,22 @@ async def global_search(
         "total": 0
     }
 
-    # Поиск дел
-    if search_type in ["all", "cases"]:
-        query = select(Case).where(
-            or_(
-                Case.case_number.ilike(f"%{q}%"),
-                Case.title.ilike(f"%{q}%"),
-                Case.plaintiff.ilike(f"%{q}%"),
-                Case.defendant.ilike(f"%{q}%"),
-                Case.description.ilike(f"%{q}%")
-            )
-        ).limit(limit)
-
-        result = await db.execute(query)
-        cases = result.scalars().all()
+    categories = list(GLOBAL_SEARCH_BRANCHES) if search_type == "all" else [search_type]
+    branches = [GLOBAL_SEARCH_BRANCHES[c] for c in categories if c in GLOBAL_SEARCH_BRANCHES]
+    if not branches:
+        return results
 
-        results["cases"] = [
-            {
-                "id": c.id,
-                "case_number": c.case_number,
-                "title": c.title,
-                "case_type": c.case_type,
-                "case_status": c.case_status
-            } for c in cases
-        ]
-
-    # Поиск персон
-    if search_type in ["all", "persons"]:
-        query = select(Person).where(
-            or_(
-                Person.full_name.ilike(f"%{q}%"),
-                Person.idnp.ilike(f"%{q}%"),
-                Person.phone.ilike(f"%{q}%"),
-                Person.email.ilike(f"%{q}%"),
-                Person.organization.ilike(f"%{q}%")
-            )
-        ).limit(limit)
-
-        result = await db.execute(query)
-        persons = result.scalars().all()
-
-        results["persons"] = [
-            {
-                "id": p.id,
-                "full_name": p.full_name,
-                "person_type": p.person_type,
-                "idnp": p.idnp
-            } for p in persons
-        ]
-
-    # Поиск документов
-    if search_type in ["all", "documents"]:
-        query = select(Document).where(
-            or_(
-                Document.file_name.ilike(f"%{q}%"),
-                Document.original_file_name.ilike(f"%{q}%"),
-                Document.description.ilike(f"%{q}%"),
-                Document.ocr_text.ilike(f"%{q}%")
-            )
-        ).limit(limit)
-
-        result = await db.execute(query)
-        documents = result.scalars().all()
-
-        results["documents"] = [
-            {
-                "id": d.id,
-                "file_name": d.file_name,
-                "document_type": d.document_type,
-                "case_id": d.case_id
-            } for d in documents
-        ]
-
-    # Поиск законодательных актов
-    if search_type in ["all", "legal_acts"]:
-        query = select(LegalAct).where(
-            or_(
-                LegalAct.title.ilike(f"%{q}%"),
-                LegalAct.act_number.ilike(f"%{q}%"),
-                LegalAct.full_text.ilike(f"%{q}%")
-            )
-        ).limit(limit)
-
-        result = await db.execute(query)
-        legal_acts = result.scalars().all()
+    query = text(" UNION ALL ".join(f"({branch})" for branch in branches))
+    result = await db.execute(
+        query,
+        {"q": q, "pattern": f"%{escape_like(q)}%", "limit": limit}
+    )
 
-        results["legal_acts"] = [
-            {
-                "id": la.id,
-                "title": la.title,
-                "act_type": la.act_type,
-                "act_number": la.act_number
-            } for la in legal_acts
-        ]
+    for row in result:
+        # json_build_object декодирует драйвер (JSON codec asyncpg)
+        item = dict(row.item)
+        item["relevance_score"] = round(float(row.score), 4)
+        results[row.category].append(item)
 
     # Подсчёт общего количества
     results["total"] = (
@@ -159,37 +145,72 @@ async def fulltext_search(
     """
     Полнотекстовый поиск PostgreSQL (FTS)
 
-    Использует to_tsvector и to_tsquery для эффективного поиска
-    Поддерживает русский и румынский языки
+    Ищет по хранимым столбцам search_vector (GIN индексы) документов,
+    дел и законодательных актов. Поддерживает русский и румынский языки
+    и синтаксис веб-поиска: "точная фраза", OR, -исключение
     """
-    # Полнотекстовый поиск по документам
-    fts_query = text("""
+    params = {"q": q, "limit": limit}
+
+    documents_query = text(f"""
         SELECT id, file_name, document_type, case_id,
-               ts_rank(to_tsvector('russian', COALESCE(ocr_text, '')), query) AS rank
-        FROM documents, to_tsquery('russian', :search_query) query
-        WHERE to_tsvector('russian', COALESCE(ocr_text, '')) @@ query
+               ts_rank(search_vector, query) AS rank
+        FROM documents, {FTS_QUERY}
+        WHERE search_vector @@ query
         ORDER BY rank DESC
         LIMIT :limit
     """)
+    documents = (await db.execute(documents_query, params)).fetchall()
 
-    result = await db.execute(
-        fts_query,
-        {"search_query": q.replace(' ', ' & '), "limit": limit}
-    )
-    documents = result.fetchall()
+    cases_query = text(f"""
+        SELECT id, case_number, title, case_status,
+               ts_rank(search_vector, query) AS rank
+        FROM cases, {FTS_QUERY}
+        WHERE search_vector @@ query
+        ORDER BY rank DESC
+        LIMIT :limit
+    """)
+    cases = (await db.execute(cases_query, params)).fetchall()
+
+    legal_acts_query = text(f"""
+        SELECT id, title, act_type, act_number,
+               ts_rank(search_vector, query) AS rank
+        FROM legal_acts, {FTS_QUERY}
+        WHERE search_vector @@ query
+        ORDER BY rank DESC
+        LIMIT :limit
+    """)
+    legal_acts = (await db.execute(legal_acts_query, params)).fetchall()
 
     return {
         "query": q,
         "documents": [
             {
-                "id": d[0],
-                "file_name": d[1],
-                "document_type": d[2],
-                "case_id": d[3],
-                "relevance_score": float(d[4])
+                "id": d.id,
+                "file_name": d.file_name,
+                "document_type": d.document_type,
+                "case_id": d.case_id,
+                "relevance_score": float(d.rank)
             } for d in documents
         ],
-        "total": len(documents)
+        "cases": [
+            {
+                "id": c.id,
+                "case_number": c.case_number,
+                "title": c.title,
+                "case_status": c.case_status,
+                "relevance_score": float(c.rank)
+            } for c in cases
+        ],
+        "legal_acts": [
+            {
+                "id": la.id,
+                "title": la.title,
+                "act_type": la.act_type,
+                "act_number": la.act_number,
+                "relevance_score": float(la.rank)
+            } for la in legal_acts
+        ],
+        "total": len(documents) + len(cases) + len(legal_acts)
     }
 
 
@@ -197,41 +218,137 @@ async def fulltext_search(
 async def semantic_search(
     q: str = Query(..., min_length=2, description="Поисковый запрос"),
     limit: int = Query(10, ge=1, le=50),
+    source: str = Query("documents", description="Где искать: documents, legal_acts"),
+    case_id: Optional[int] = Query(None, description="Искать только в документах дела"),
+    document_type: Optional[DocumentType] = Query(None, description="Фильтр по типу документа"),
+    min_similarity: float = Query(0.0, ge=0.0, le=1.0, description="Минимальное косинусное сходство"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Семантический поиск через Ollama embeddings
 
-    **Экспериментальная функция**
-    Использует векторные представления текста для поиска по смыслу
+    Использует векторные представления фрагментов текста для поиска по смыслу:
+    top-k фрагментов по косинусному расстоянию через HNSW индекс pgvector,
+    затем для каждого документа остаётся лучший фрагмент
     """
-    from app.config import settings
-
     if not settings.OLLAMA_ENABLED:
-        from fastapi import HTTPException, status
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Ollama API отключен. Семантический поиск недоступен."
         )
 
-    # Получаем embedding поискового запроса
-    query_embedding = await ollama_client.get_embeddings(q)
+    if source not in ("documents", "legal_acts"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Параметр source должен быть documents или legal_acts"
+        )
 
-    if not query_embedding:
-        from fastapi import HTTPException, status
+    # Embedding запроса тем же эндпоинтом, что и при индексации
+    query_embeddings = await ollama_client.embed_batch([q])
+
+    if not query_embeddings:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Не удалось получить embeddings для запроса"
         )
 
-    # TODO: Реализовать векторный поиск с использованием pgvector
-    # Пока возвращаем заглушку
-    logger.warning("Семантический поиск находится в разработке")
+    query_embedding = query_embeddings[0]
+    if len(query_embedding) != settings.EMBEDDING_DIMENSIONS:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=(
+                f"Размерность embeddings модели ({len(query_embedding)}) не совпадает "
+                f"с EMBEDDING_DIMENSIONS ({settings.EMBEDDING_DIMENSIONS})"
+            )
+        )
+
+    distance = DocumentEmbedding.embedding_vector.cosine_distance(query_embedding)
+
+    if source == "documents":
+        query = (
+            select(
+                Document.id,
+                Document.file_name,
+                Document.document_type,
+                Document.case_id,
+                DocumentEmbedding.chunk_text,
+                distance.label("distance")
+            )
+            .join(DocumentEmbedding, DocumentEmbedding.document_id == Document.id)
+        )
+
+        if case_id is not None:
+            query = query.where(Document.case_id == case_id)
+
+        if document_type:
+            query = query.where(Document.document_type == document_type.value)
+    else:
+        query = (
+            select(
+                LegalAct.id,
+                LegalAct.title,
+                LegalAct.act_type,
+                LegalAct.act_number,
+                DocumentEmbedding.chunk_text,
+                distance.label("distance")
+            )
+            .join(DocumentEmbedding, DocumentEmbedding.legal_act_id == LegalAct.id)
+        )
+
+    # Векторы другой модели несопоставимы с вектором запроса
+    query = query.where(
+        DocumentEmbedding.embedding_vector.isnot(None),
+        DocumentEmbedding.model_name == settings.EMBEDDING_MODEL
+    )
+
+    if min_similarity > 0:
+        query = query.where(distance <= 1 - min_similarity)
+
+    # У одного документа может совпасть несколько фрагментов - берём с запасом
+    candidates = limit * 4
+    query = query.order_by(distance).limit(candidates)
+
+    # Размер списка кандидатов HNSW (действует только в текущей транзакции).
+    # Индекс отдаёт не больше ef_search строк до фильтров по делу и типу,
+    # поэтому он не меньше числа запрашиваемых кандидатов
+    ef_search = max(int(settings.SEMANTIC_EF_SEARCH), candidates)
+    await db.execute(text(f"SET LOCAL hnsw.ef_search = {ef_search}"))
+    result = await db.execute(query)
+
+    # Лучший фрагмент каждого документа (строки уже отсортированы по расстоянию)
+    best = {}
+    for row in result.all():
+        if row.id not in best:
+            best[row.id] = row
+        if len(best) >= limit:
+            break
+
+    if source == "documents":
+        results = [
+            {
+                "id": d.id,
+                "file_name": d.file_name,
+                "document_type": d.document_type,
+                "case_id": d.case_id,
+                "fragment": d.chunk_text,
+                "similarity": round(1 - float(d.distance), 4)
+            } for d in best.values()
+        ]
+    else:
+        results = [
+            {
+                "id": la.id,
+                "title": la.title,
+                "act_type": la.act_type,
+                "act_number": la.act_number,
+                "fragment": la.chunk_text,
+                "similarity": round(1 - float(la.distance), 4)
+            } for la in best.values()
+        ]
 
     return {
         "query": q,
-        "message": "Семантический поиск находится в разработке",
-        "query_embedding_length": len(query_embedding),
-        "results": []
+        "results": results,
+        "total": len(results)
     }
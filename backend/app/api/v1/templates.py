@@ -8,7 +8,6 @@ from sqlalchemy import select, delete
 from typing import Optional
 from datetime import datetime
 from pathlib import Path
-import aiofiles
 from app.database import get_db
 from app.models.user import User
 from app.models.document_template import DocumentTemplate
@@ -16,9 +15,11 @@ from app.models.case import Case
 from app.schemas.document_template import (
     DocumentTemplateResponse, DocumentTemplateListResponse
 )
-from app.api.deps import get_current_user
+from app.api.deps import get_current_user, get_audit
+from app.utils.audit import AuditContext
 from app.config import settings
 from app.utils.ollama import ollama_client
+from app.utils.storage import receive_upload, commit_upload
 import logging
 
 logger = logging.getLogger(__name__)
@@ -50,7 +51,8 @@ async def upload_template(
     template_type: str = Form(...),
     description: Optional[str] = Form(None),
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    audit: AuditContext = Depends(get_audit)
 ):
     """Загрузка нового шаблона документа (DOCX)"""
     # Проверка формата
@@ -60,17 +62,13 @@ async def upload_template(
             detail="Поддерживаются только DOCX файлы"
         )
 
-    # Сохранение файла
+    # Сохранение файла (потоковое)
     storage_path = Path(settings.STORAGE_PATH) / "templates"
-    storage_path.mkdir(parents=True, exist_ok=True)
+    uploaded = await receive_upload(file)
 
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     new_filename = f"{timestamp}_{file.filename.replace(' ', '_')}"
-    file_path = storage_path / new_filename
-
-    content = await file.read()
-    async with aiofiles.open(file_path, 'wb') as f:
-        await f.write(content)
+    file_path = await commit_upload(uploaded, storage_path / new_filename)
 
     # Извлечение переменных из шаблона ({{variable_name}})
     import re
@@ -90,7 +88,7 @@ async def upload_template(
         template_type=template_type,
         description=description,
         file_path=f"templates/{new_filename}",
-        file_size=len(content),
+        file_size=uploaded.file_size,
         variables={"variables": variables} if variables else None,
         created_by=current_user.id
     )
@@ -99,6 +97,11 @@ async def upload_template(
     await db.commit()
     await db.refresh(new_template)
 
+    audit.record("create", "document_template", new_template.id, new_value={
+        "template_name": new_template.template_name,
+        "template_type": new_template.template_type
+    })
+
     return new_template
 
 
@@ -169,7 +172,8 @@ async def generate_document(
 async def delete_template(
     template_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    audit: AuditContext = Depends(get_audit)
 ):
     """Удаление шаблона (только admin)"""
     if current_user.role != "admin":
@@ -192,4 +196,8 @@ async def delete_template(
     await db.execute(delete(DocumentTemplate).where(DocumentTemplate.id == template_id))
     await db.commit()
 
+    audit.record("delete", "document_template", template_id, old_value={
+        "template_name": template.template_name
+    })
+
     return None
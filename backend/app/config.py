@@ -16,26 +16,70 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    BCRYPT_ROUNDS: int = 12  # При изменении хеши пересчитываются при следующем входе
+    PASSWORD_HASH_WORKERS: int = 2  # Потоков для bcrypt
+    PASSWORD_HASH_QUEUE_SIZE: int = 32  # Ожидающих проверок пароля, сверх - HTTP 503
+    USER_CACHE_TTL: float = 60.0  # Секунды жизни записи кеша пользователей (0 - кеш отключен)
+    USER_CACHE_SIZE: int = 1024  # Максимум пользователей в кеше
 
     # Ollama (на отдельном сервере в локальной сети)
     OLLAMA_BASE_URL: str = "http://192.168.0.21:11434"
     OCR_MODEL: str = "deepseek-ocr:latest"
     GENERATION_MODEL: str = "qwen2.5:7b"
     EMBEDDING_MODEL: str = "nomic-embed-text:latest"
+    EMBEDDING_DIMENSIONS: int = 768  # Размерность векторов EMBEDDING_MODEL (pgvector)
     OCR_TIMEOUT: int = 60
     GENERATION_TIMEOUT: int = 30
+    EMBEDDING_TIMEOUT: int = 120  # Таймаут пакетного запроса embeddings
     OLLAMA_ENABLED: bool = True
+    OLLAMA_MAX_CONNECTIONS: int = 20  # Размер пула HTTP соединений
+    OLLAMA_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    OLLAMA_KEEPALIVE_EXPIRY: float = 60.0  # Секунды простоя keep-alive соединения
+    OLLAMA_MODEL_CONCURRENCY: int = 4  # Одновременных запросов к одной модели
+    OCR_CONCURRENCY: int = 4  # Страниц PDF, распознаваемых параллельно
+    OCR_PAGE_BATCH_SIZE: int = 4  # Страниц в одной пачке растеризации
+    OCR_PREFETCH_BATCHES: int = 2  # На сколько пачек растеризация опережает OCR
+
+    # Фоновая очередь OCR
+    OCR_WORKERS: int = 2  # Количество воркеров очереди
+    OCR_JOB_MAX_ATTEMPTS: int = 3
+    OCR_JOB_RETRY_BACKOFF: int = 30  # Секунды до первого повтора (далее удваивается)
+    OCR_JOB_POLL_INTERVAL: float = 5.0  # Секунды между опросами пустой очереди
+    OCR_JOB_HEARTBEAT_INTERVAL: int = 30  # Секунды между отметками воркера о выполняемом задании
+    OCR_JOB_LEASE_TIMEOUT: int = 120  # Через сколько секунд без отметки running-задание считается брошенным
+
+    # Семантический поиск (pgvector)
+    SEMANTIC_EF_SEARCH: int = 100  # hnsw.ef_search: точность/скорость поиска по HNSW индексу (не меньше limit * 4)
+    EMBEDDING_CHUNK_SIZE: int = 1500  # Символов во фрагменте текста
+    EMBEDDING_CHUNK_OVERLAP: int = 200  # Перекрытие соседних фрагментов (символов)
+    EMBEDDING_BATCH_SIZE: int = 32  # Фрагментов в одном запросе к Ollama
+    EMBEDDING_INDEX_INTERVAL: float = 300.0  # Секунды между проходами индексатора
 
     # Хранилище
     STORAGE_PATH: str
     MAX_FILE_SIZE: int = 52428800  # 50 МБ
     ALLOWED_EXTENSIONS: str = "pdf,docx,doc,jpg,jpeg,png,txt"
+    REPORT_CACHE_MAX_SIZE: int = 209715200  # 200 МБ кеша готовых PDF отчётов
+    RENDITION_CACHE_MAX_SIZE: int = 1073741824  # 1 ГБ кеша миниатюр страниц документов
+    RENDITION_CONCURRENCY: int = 2  # Одновременных растеризаций страниц
+    RENDITION_MAX_AGE: int = 86400  # Cache-Control max-age миниатюр (секунды)
+    X_ACCEL_REDIRECT_PREFIX: str = ""  # Internal location nginx для отдачи файлов (например /protected-storage/), пусто - отдаёт приложение
+
+    # Журнал аудита
+    AUDIT_BATCH_SIZE: int = 500  # Записей в одном INSERT
+    AUDIT_FLUSH_INTERVAL: float = 2.0  # Максимум секунд между записью в БД
+    AUDIT_PARTITIONS_AHEAD: int = 3  # Месячных разделов audit_log, создаваемых заранее
+    AUDIT_RETENTION_MONTHS: int = 0  # Срок хранения журнала в месяцах (0 - бессрочно)
+    AUDIT_BATCH_MAX_ATTEMPTS: int = 5  # Попыток записи пакета, отвергнутого БД, до переноса в failed/
 
     # Резервное копирование
     BACKUP_PATH: str
     BACKUP_ENABLED: bool = True
     BACKUP_TIME: str = "03:00"
     BACKUP_KEEP_DAYS: int = 30
+    BACKUP_JOBS: int = 4  # Параллельных потоков pg_dump (-j)
+    BACKUP_ZSTD_LEVEL: int = 3  # Уровень сжатия zstd (pg_dump 16+)
+    FILE_BACKUP_MAX_RATE: int = 50  # МБ/с при копировании файлов в снимок (0 - без ограничения)
 
     # Email
     SMTP_HOST: str = ""
@@ -49,6 +93,8 @@ class Settings(BaseSettings):
     REMINDER_ENABLED: bool = True
     REMINDER_DAYS_BEFORE: int = 1
     REMINDER_HOURS_BEFORE: int = 3
+    REMINDER_CHECK_INTERVAL: int = 60  # Секунды между проверками наступивших напоминаний
+    REMINDER_BATCH_SIZE: int = 100  # Напоминаний в одной пачке (одно SMTP соединение)
 
     # Режим работы
     DEBUG: bool = False
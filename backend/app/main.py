@@ -69,20 +69,74 @@ async def startup_event():
     logger.info(f"Environment: {settings.ENVIRONMENT}")
     logger.info(f"Debug mode: {settings.DEBUG}")
 
-    # Проверка подключения к Ollama
+    # Общий HTTP клиент и проверка подключения к Ollama
     from app.utils.ollama import ollama_client
+    await ollama_client.start()
     ollama_available = await ollama_client.check_availability()
     if ollama_available:
         logger.info("Ollama API доступен")
     else:
         logger.warning("Ollama API недоступен - AI функции будут отключены")
 
+    # Пакетная запись журнала аудита
+    from app.utils.audit import audit_writer
+    await audit_writer.start()
+
+    # Очистка файлов хранилища, оставшихся без ссылок
+    from app.utils.storage import blob_store
+    await blob_store.start()
+
+    # Email напоминания о событиях
+    from app.utils.reminders import reminder_dispatcher
+    await reminder_dispatcher.start()
+
+    # Ежедневное резервное копирование БД
+    from app.utils.backup import backup_manager
+    await backup_manager.start()
+
+    # Ежедневный снимок файлового хранилища
+    from app.utils.file_backup import file_backup_manager
+    await file_backup_manager.start()
+
+    # Фоновая очередь OCR
+    if settings.OLLAMA_ENABLED:
+        from app.utils.jobs import ocr_queue
+        await ocr_queue.start()
+
+        # Фоновая индексация embeddings
+        from app.utils.indexer import embedding_indexer
+        await embedding_indexer.start()
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Действия при остановке приложения"""
     logger.info("Shutting down Legal CMS API...")
 
+    from app.utils.jobs import ocr_queue
+    await ocr_queue.stop()
+
+    from app.utils.indexer import embedding_indexer
+    await embedding_indexer.stop()
+
+    from app.utils.ollama import ollama_client
+    await ollama_client.close()
+
+    from app.utils.reminders import reminder_dispatcher
+    await reminder_dispatcher.stop()
+
+    from app.utils.backup import backup_manager
+    await backup_manager.stop()
+
+    from app.utils.file_backup import file_backup_manager
+    await file_backup_manager.stop()
+
+    from app.utils.storage import blob_store
+    await blob_store.stop()
+
+    from app.utils.audit import audit_writer
+    await audit_writer.stop()
+
 
 @app.get("/")
 async def root():
@@ -98,10 +152,29 @@ async def root():
 async def health_check():
     """Проверка здоровья приложения"""
     from app.utils.ollama import ollama_client
+    from app.utils.storage import blob_store
+    from app.utils.indexer import embedding_indexer
+    from app.utils.user_cache import user_cache
+    from app.utils.reports import report_cache
+    from app.utils.renditions import rendition_cache
+    from app.utils.audit import audit_writer
+    from app.utils.reminders import reminder_dispatcher
+    from app.utils.backup import backup_manager
+    from app.utils.file_backup import file_backup_manager
 
     ollama_status = await ollama_client.check_availability()
 
     return {
         "status": "healthy",
-        "ollama": "available" if ollama_status else "unavailable"
+        "ollama": "available" if ollama_status else "unavailable",
+        "ollama_pool": ollama_client.get_pool_stats(),
+        "storage": blob_store.get_stats(),
+        "embeddings": embedding_indexer.get_stats(),
+        "user_cache": user_cache.get_stats(),
+        "report_cache": report_cache.get_stats(),
+        "rendition_cache": rendition_cache.get_stats(),
+        "audit": audit_writer.get_stats(),
+        "reminders": reminder_dispatcher.get_stats(),
+        "backup": backup_manager.get_stats(),
+        "file_backup": file_backup_manager.get_stats()
     }
@@ -13,6 +13,9 @@ from app.models.document_template import DocumentTemplate
 from app.models.audit_log import AuditLog
 from app.models.document_embedding import DocumentEmbedding
 from app.models.system_setting import SystemSetting
+from app.models.ocr_job import OCRJob
+from app.models.storage_blob import StorageBlob
+from app.models.daily_stats import CaseStatsDaily, DocumentStatsDaily
 
 __all__ = [
     "User",
@@ -27,4 +30,8 @@ __all__ = [
     "AuditLog",
     "DocumentEmbedding",
     "SystemSetting",
+    "OCRJob",
+    "StorageBlob",
+    "CaseStatsDaily",
+    "DocumentStatsDaily",
 ]
@@ -1,7 +1,11 @@
 """
 Модель журнала аудита
+
+Таблица секционирована по месяцам (RANGE по created_at, миграция 011):
+разделы audit_log_pYYYYMM создаются заранее и удаляются целиком по сроку
+хранения (app.utils.audit.maintain_partitions)
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, ForeignKey
+from sqlalchemy import Column, BigInteger, Integer, String, Text, DateTime, JSON, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import INET
 from app.database import Base
@@ -10,16 +14,25 @@ from app.database import Base
 class AuditLog(Base):
     __tablename__ = "audit_log"
 
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
+    id = Column(BigInteger, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     action = Column(String(100), nullable=False)
-    entity_type = Column(String(50), nullable=False, index=True)
+    entity_type = Column(String(50), nullable=False)
     entity_id = Column(Integer, nullable=True)
     old_value = Column(JSON, nullable=True)
     new_value = Column(JSON, nullable=True)
     ip_address = Column(INET, nullable=True)
     user_agent = Column(Text, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    # Ключ секционирования входит в первичный ключ
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
+
+    __table_args__ = (
+        # История объекта (временная шкала дела)
+        Index('ix_audit_log_entity_created_at', 'entity_type', 'entity_id', 'created_at'),
+        Index('ix_audit_log_created_at', 'created_at'),
+        Index('ix_audit_log_user_id_created_at', 'user_id', 'created_at'),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
 
     def __repr__(self):
         return f"<AuditLog {self.action} on {self.entity_type}#{self.entity_id}>"
@@ -1,12 +1,22 @@
 """
 Модель дела
 """
-from sqlalchemy import Column, Integer, String, Text, Date, DateTime, ARRAY, JSON, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, JSON, ForeignKey, Computed, Index, text
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
 from app.database import Base
 
 
+# Короткие текстовые поля дела одной строкой: по ней строится триграммный
+# индекс (pg_trgm) для поиска подстроки через ILIKE
+SEARCH_TEXT = (
+    "COALESCE(case_number, '') || ' ' || COALESCE(title, '') || ' ' || "
+    "COALESCE(plaintiff, '') || ' ' || COALESCE(defendant, '') || ' ' || "
+    "COALESCE(description, '')"
+)
+
+
 class Case(Base):
     __tablename__ = "cases"
 
@@ -25,8 +35,15 @@ class Case(Base):
     close_date = Column(Date, nullable=True)
     tags = Column(ARRAY(Text), nullable=True)
     extra_metadata = Column("metadata", JSON, nullable=True)  # Renamed from 'metadata' to avoid SQLAlchemy conflict
+    # Полнотекстовый индекс (конфигурация russian/romanian выбирается по тексту строки),
+    # не загружается вместе с объектом
+    search_vector = deferred(Column(TSVECTOR, Computed(
+        "setweight(to_tsvector(ts_config_for(COALESCE(title, '') || ' ' || COALESCE(description, '')), COALESCE(case_number, '') || ' ' || COALESCE(title, '')), 'A') || "
+        "setweight(to_tsvector(ts_config_for(COALESCE(title, '') || ' ' || COALESCE(description, '')), COALESCE(plaintiff, '') || ' ' || COALESCE(defendant, '') || ' ' || COALESCE(description, '')), 'B')",
+        persisted=True
+    )))
     created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     # Relationships
@@ -35,5 +52,11 @@ class Case(Base):
     case_persons = relationship("CasePerson", back_populates="case", cascade="all, delete-orphan")
     case_legal_acts = relationship("CaseLegalAct", back_populates="case", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index('ix_cases_search_vector', 'search_vector', postgresql_using='gin'),
+        Index('ix_cases_search_text_trgm', text(f"({SEARCH_TEXT}) gin_trgm_ops"), postgresql_using='gin'),
+        Index('ix_cases_open_date_id', 'open_date', 'id'),  # Keyset пагинация списка
+    )
+
     def __repr__(self):
         return f"<Case {self.case_number}: {self.title}>"
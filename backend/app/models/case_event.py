@@ -1,7 +1,7 @@
 """
 Модель события дела
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Index, FetchedValue, text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -17,7 +17,9 @@ class CaseEvent(Base):
     description = Column(Text, nullable=False)
     location = Column(String(255), nullable=True)
     reminder_days_before = Column(Integer, default=1)
-    reminder_sent = Column(Boolean, default=False, index=True)
+    reminder_sent = Column(Boolean, nullable=False, default=False, server_default=text('false'), index=True)
+    # Когда отправить напоминание: event_date - reminder_days_before (заполняет триггер БД)
+    remind_at = Column(DateTime(timezone=True), FetchedValue(), server_onupdate=FetchedValue(), nullable=True)
     event_status = Column(String(20), nullable=False, default="scheduled", index=True)
     created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -26,5 +28,11 @@ class CaseEvent(Base):
     # Relationships
     case = relationship("Case", back_populates="events")
 
+    __table_args__ = (
+        Index('ix_case_events_event_date_id', 'event_date', 'id'),  # Keyset пагинация списка
+        Index('ix_case_events_case_id_event_date', 'case_id', 'event_date'),  # Временная шкала дела
+        Index('ix_case_events_remind_at_pending', 'remind_at', postgresql_where=text('reminder_sent = false')),
+    )
+
     def __repr__(self):
         return f"<CaseEvent {self.event_type} on {self.event_date}>"
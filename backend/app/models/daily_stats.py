@@ -0,0 +1,34 @@
+"""
+Модели дневной статистики (материализованные счётчики для отчётов)
+
+Таблицы ведутся триггерами БД (миграция 009): каждое изменение cases и
+documents прибавляет или вычитает единицу в строке своего дня, поэтому
+статистика за любой период считается по нескольким сотням строк без
+сканирования исходных таблиц.
+"""
+from sqlalchemy import Column, Integer, String, Date
+from app.database import Base
+
+
+class CaseStatsDaily(Base):
+    """Количество дел по дню создания, статусу и типу"""
+    __tablename__ = "case_stats_daily"
+
+    day = Column(Date, primary_key=True)
+    case_status = Column(String(30), primary_key=True)
+    case_type = Column(String(50), primary_key=True)
+    cases_count = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<CaseStatsDaily {self.day} {self.case_status}/{self.case_type}: {self.cases_count}>"
+
+
+class DocumentStatsDaily(Base):
+    """Количество документов по дню загрузки"""
+    __tablename__ = "document_stats_daily"
+
+    day = Column(Date, primary_key=True)
+    documents_count = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DocumentStatsDaily {self.day}: {self.documents_count}>"
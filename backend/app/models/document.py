@@ -1,12 +1,21 @@
 """
 Модель документа
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, Date, Boolean, ARRAY, JSON, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, Date, Boolean, ARRAY, JSON, ForeignKey, Computed, Index, text
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from app.database import Base
 
 
+# Короткие текстовые поля документа одной строкой: по ней строится триграммный
+# индекс (pg_trgm) для поиска подстроки через ILIKE
+SEARCH_TEXT = (
+    "COALESCE(file_name, '') || ' ' || COALESCE(original_file_name, '') || ' ' || "
+    "COALESCE(description, '')"
+)
+
+
 class Document(Base):
     __tablename__ = "documents"
 
@@ -18,10 +27,19 @@ class Document(Base):
     file_path = Column(Text, nullable=False)
     file_size = Column(Integer, nullable=True)
     file_format = Column(String(10), nullable=True)
-    upload_date = Column(DateTime(timezone=True), server_default=func.now())
+    content_hash = Column(String(64), nullable=True, index=True)  # SHA-256 файла в хранилище blobs
+    upload_date = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
     document_date = Column(Date, nullable=True, index=True)
     description = Column(Text, nullable=True)
     ocr_text = Column(Text, nullable=True)
+    ocr_text_hash = Column(String(32), Computed("md5(COALESCE(ocr_text, ''))", persisted=True))
+    # Полнотекстовый индекс (конфигурация russian/romanian выбирается по тексту строки),
+    # не загружается вместе с объектом
+    search_vector = deferred(Column(TSVECTOR, Computed(
+        "setweight(to_tsvector(ts_config_for(COALESCE(ocr_text, description, original_file_name)), COALESCE(original_file_name, '') || ' ' || COALESCE(description, '')), 'A') || "
+        "setweight(to_tsvector(ts_config_for(COALESCE(ocr_text, description, original_file_name)), COALESCE(ocr_text, '')), 'B')",
+        persisted=True
+    )))
     extracted_metadata = Column(JSON, nullable=True)
     tags = Column(ARRAY(Text), nullable=True)
     version = Column(Integer, default=1)
@@ -31,7 +49,14 @@ class Document(Base):
 
     # Relationships
     case = relationship("Case", back_populates="documents")
-    embedding = relationship("DocumentEmbedding", back_populates="document", uselist=False, cascade="all, delete-orphan")
+    embeddings = relationship("DocumentEmbedding", back_populates="document", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        Index('ix_documents_search_vector', 'search_vector', postgresql_using='gin'),
+        Index('ix_documents_search_text_trgm', text(f"({SEARCH_TEXT}) gin_trgm_ops"), postgresql_using='gin'),
+        Index('ix_documents_upload_date_id', 'upload_date', 'id'),  # Keyset пагинация списка
+        Index('ix_documents_case_id_upload_date', 'case_id', 'upload_date'),  # Временная шкала дела
+    )
 
     def __repr__(self):
         return f"<Document {self.file_name} ({self.document_type})>"
@@ -1,9 +1,14 @@
 """
 Модель embeddings для семантического поиска
+
+Текст документа (ocr_text) или законодательного акта (full_text) режется на
+перекрывающиеся фрагменты, для каждого фрагмента хранится свой вектор
 """
-from sqlalchemy import Column, Integer, DateTime, ForeignKey, ARRAY, Float, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, UniqueConstraint, CheckConstraint, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
+from pgvector.sqlalchemy import Vector
+from app.config import settings
 from app.database import Base
 
 
@@ -11,16 +16,33 @@ class DocumentEmbedding(Base):
     __tablename__ = "document_embeddings"
 
     id = Column(Integer, primary_key=True, index=True)
-    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False, unique=True, index=True)
-    embedding_vector = Column(ARRAY(Float), nullable=True)
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), nullable=True, index=True)
+    legal_act_id = Column(Integer, ForeignKey("legal_acts.id", ondelete="CASCADE"), nullable=True, index=True)
+    chunk_index = Column(Integer, nullable=False, default=0)
+    chunk_text = Column(Text, nullable=True)
+    content_hash = Column(String(64), nullable=True)  # Хеш исходного текста на момент индексации
+    model_name = Column(String(100), nullable=True)
+    embedding_vector = Column(Vector(settings.EMBEDDING_DIMENSIONS), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
-    document = relationship("Document", back_populates="embedding")
+    document = relationship("Document", back_populates="embeddings")
 
     __table_args__ = (
-        UniqueConstraint('document_id', name='unique_document_embedding'),
+        UniqueConstraint('document_id', 'chunk_index', name='unique_document_embedding_chunk'),
+        UniqueConstraint('legal_act_id', 'chunk_index', name='unique_legal_act_embedding_chunk'),
+        CheckConstraint(
+            '(document_id IS NULL) <> (legal_act_id IS NULL)',
+            name='document_embedding_single_source'
+        ),
+        Index(
+            'ix_document_embeddings_vector_hnsw',
+            'embedding_vector',
+            postgresql_using='hnsw',
+            postgresql_ops={'embedding_vector': 'vector_cosine_ops'}
+        ),
     )
 
     def __repr__(self):
-        return f"<DocumentEmbedding document_id={self.document_id}>"
+        source = f"document_id={self.document_id}" if self.document_id else f"legal_act_id={self.legal_act_id}"
+        return f"<DocumentEmbedding {source} chunk={self.chunk_index}>"
@@ -1,12 +1,20 @@
 """
 Модель законодательного акта
 """
-from sqlalchemy import Column, Integer, String, Text, Date, DateTime, ARRAY
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, ARRAY, Computed, Index, text
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from app.database import Base
 
 
+# Короткие текстовые поля законодательного акта одной строкой: по ней строится триграммный
+# индекс (pg_trgm) для поиска подстроки через ILIKE
+SEARCH_TEXT = (
+    "COALESCE(title, '') || ' ' || COALESCE(act_number, '')"
+)
+
+
 class LegalAct(Base):
     __tablename__ = "legal_acts"
 
@@ -17,14 +25,29 @@ class LegalAct(Base):
     title = Column(String(255), nullable=False)
     file_path = Column(Text, nullable=False)
     file_size = Column(Integer, nullable=True)
+    content_hash = Column(String(64), nullable=True)  # SHA-256 файла (ETag при скачивании)
     tags = Column(ARRAY(Text), nullable=True)
     full_text = Column(Text, nullable=True)
+    full_text_hash = Column(String(32), Computed("md5(COALESCE(full_text, ''))", persisted=True))
+    # Полнотекстовый индекс (конфигурация russian/romanian выбирается по тексту строки),
+    # не загружается вместе с объектом
+    search_vector = deferred(Column(TSVECTOR, Computed(
+        "setweight(to_tsvector(ts_config_for(COALESCE(full_text, title)), COALESCE(act_number, '') || ' ' || COALESCE(title, '')), 'A') || "
+        "setweight(to_tsvector(ts_config_for(COALESCE(full_text, title)), COALESCE(full_text, '')), 'B')",
+        persisted=True
+    )))
     act_status = Column(String(20), default="active", index=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     # Relationships
     case_legal_acts = relationship("CaseLegalAct", back_populates="legal_act", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index('ix_legal_acts_search_vector', 'search_vector', postgresql_using='gin'),
+        Index('ix_legal_acts_search_text_trgm', text(f"({SEARCH_TEXT}) gin_trgm_ops"), postgresql_using='gin'),
+        Index('ix_legal_acts_created_at_id', 'created_at', 'id'),  # Keyset пагинация списка
+    )
+
     def __repr__(self):
         return f"<LegalAct {self.act_type}: {self.title}>"
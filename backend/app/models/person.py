@@ -1,12 +1,21 @@
 """
 Модель персоны
 """
-from sqlalchemy import Column, Integer, String, Text, Date, DateTime, JSON
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, JSON, Index, text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
 
 
+# Короткие текстовые поля персоны одной строкой: по ней строится триграммный
+# индекс (pg_trgm) для поиска подстроки через ILIKE
+SEARCH_TEXT = (
+    "COALESCE(full_name, '') || ' ' || COALESCE(idnp, '') || ' ' || "
+    "COALESCE(phone, '') || ' ' || COALESCE(email, '') || ' ' || "
+    "COALESCE(organization, '')"
+)
+
+
 class Person(Base):
     __tablename__ = "persons"
 
@@ -30,5 +39,10 @@ class Person(Base):
     # Relationships
     case_persons = relationship("CasePerson", back_populates="person", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index('ix_persons_search_text_trgm', text(f"({SEARCH_TEXT}) gin_trgm_ops"), postgresql_using='gin'),
+        Index('ix_persons_full_name_id', 'full_name', 'id'),  # Keyset пагинация списка
+    )
+
     def __repr__(self):
         return f"<Person {self.full_name} ({self.person_type})>"
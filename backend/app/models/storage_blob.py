@@ -0,0 +1,18 @@
+"""
+Модель файла в контентно-адресуемом хранилище
+"""
+from sqlalchemy import Column, String, BigInteger, Integer, DateTime
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class StorageBlob(Base):
+    __tablename__ = "storage_blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    file_size = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<StorageBlob {self.sha256[:12]} refs={self.ref_count}>"
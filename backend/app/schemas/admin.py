@@ -49,10 +49,7 @@ class AuditLogResponse(BaseModel):
 
 class AuditLogListResponse(BaseModel):
     items: List[AuditLogResponse]
-    total: int
-    page: int
-    size: int
-    pages: int
+    next_cursor: Optional[str] = None  # Курсор следующей страницы (параметр after)
 
 
 class BackupRequest(BaseModel):
@@ -80,7 +80,9 @@ class CaseResponse(CaseInDB):
 
 class CaseListResponse(BaseModel):
     items: List[CaseResponse]
-    total: int
+    total: Optional[int] = None  # None, если количество не запрашивалось (include_total=false)
+    total_is_estimate: bool = False  # total оценён по статистике таблицы
     page: int
     size: int
-    pages: int
+    pages: Optional[int] = None
+    next_cursor: Optional[str] = None  # Курсор следующей страницы (параметр after)
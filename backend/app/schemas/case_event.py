@@ -73,10 +73,12 @@ class CaseEventResponse(CaseEventInDB):
 
 class CaseEventListResponse(BaseModel):
     items: List[CaseEventResponse]
-    total: int
+    total: Optional[int] = None  # None, если количество не запрашивалось (include_total=false)
+    total_is_estimate: bool = False  # total оценён по статистике таблицы
     page: int
     size: int
-    pages: int
+    pages: Optional[int] = None
+    next_cursor: Optional[str] = None  # Курсор следующей страницы (параметр after)
 
 
 class CalendarEventResponse(BaseModel):
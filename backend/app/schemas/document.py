@@ -66,10 +66,12 @@ class DocumentResponse(DocumentInDB):
 
 class DocumentListResponse(BaseModel):
     items: List[DocumentResponse]
-    total: int
+    total: Optional[int] = None  # None, если количество не запрашивалось (include_total=false)
+    total_is_estimate: bool = False  # total оценён по статистике таблицы
     page: int
     size: int
-    pages: int
+    pages: Optional[int] = None
+    next_cursor: Optional[str] = None  # Курсор следующей страницы (параметр after)
 
 
 class DocumentOCRRequest(BaseModel):
@@ -82,3 +84,26 @@ class DocumentOCRResponse(BaseModel):
     document_id: int
     ocr_text: str
     success: bool
+
+
+class OCRJobStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class OCRJobResponse(BaseModel):
+    """Состояние задания фоновой OCR обработки"""
+    id: int
+    document_id: int
+    status: OCRJobStatus
+    attempts: int
+    last_error: Optional[str]
+    run_after: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
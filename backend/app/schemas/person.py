@@ -100,7 +100,9 @@ class PersonResponse(PersonInDB):
 
 class PersonListResponse(BaseModel):
     items: List[PersonResponse]
-    total: int
+    total: Optional[int] = None  # None, если количество не запрашивалось (include_total=false)
+    total_is_estimate: bool = False  # total оценён по статистике таблицы
     page: int
     size: int
-    pages: int
+    pages: Optional[int] = None
+    next_cursor: Optional[str] = None  # Курсор следующей страницы (параметр after)
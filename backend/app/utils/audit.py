@@ -0,0 +1,497 @@
+"""
+Журнал аудита: сбор записей в запросе и пакетная запись в БД
+
+Эндпоинты получают через dependency get_audit() сборщик AuditContext,
+который знает пользователя, IP и User-Agent запроса, и вызывают
+audit.record(...) после успешного commit. По завершении запроса записи
+передаются в audit_writer - это только добавление в буфер, без обращения
+к БД, поэтому аудит не добавляет задержки к ответу.
+
+AuditWriter пишет буфер в audit_log одним многострочным INSERT, когда
+набирается AUDIT_BATCH_SIZE записей или проходит AUDIT_FLUSH_INTERVAL
+секунд. Каждая запись сначала дописывается в журнал процесса на диске
+(STORAGE_PATH/audit/current-<метка процесса>.jsonl, у каждого воркера
+uvicorn свой). Перед записью в БД журнал переименовывается в пакет
+batch-*.jsonl. Пакет захватывается одним процессом (переименованием в
+claimed-<метка>-*) и удаляется после успешного INSERT. Пакеты, оставшиеся
+после сбоя БД или перезапуска приложения, дописываются при следующем
+сбросе (доставка "хотя бы один раз"); пакет, который БД отвергает,
+после AUDIT_BATCH_MAX_ATTEMPTS попыток переносится в failed/.
+
+Тот же фоновый цикл обслуживает месячные разделы audit_log: создаёт их
+заранее и удаляет разделы старше срока хранения.
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+from sqlalchemy import insert, text
+from sqlalchemy.exc import InterfaceError, OperationalError
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.audit_log import AuditLog
+
+logger = logging.getLogger(__name__)
+
+# Разделы audit_log: audit_log_pYYYYMM (миграция 011)
+PARTITION_NAME_RE = re.compile(r"^audit_log_p(\d{4})(\d{2})$")
+
+# Раздел для записей вне месячных разделов (миграция 014)
+DEFAULT_PARTITION = "audit_log_default"
+
+# Секунды между проверками разделов
+PARTITION_CHECK_INTERVAL = 6 * 3600
+
+# Файл блокировки процесса, пишущего журнал: owner-<метка>.lock
+OWNER_PREFIX = "owner-"
+
+# batch-<время>-<номер>-<метка>[.a<попыток>].jsonl
+BATCH_NAME_RE = re.compile(r"^(batch-.+?)(?:\.a(\d+))?\.jsonl$")
+
+
+def _json_safe(value: Any) -> Any:
+    """Значения old_value/new_value в виде, пригодном для JSON (даты - строками)"""
+    if value is None:
+        return None
+    return json.loads(json.dumps(value, default=str, ensure_ascii=False))
+
+
+def changed_values(obj, values: dict) -> Tuple[dict, dict]:
+    """Старые и новые значения только изменившихся полей (для записи update)"""
+    old_value = {}
+    new_value = {}
+    for key, value in values.items():
+        old = getattr(obj, key, None)
+        if old != value:
+            old_value[key] = old
+            new_value[key] = value
+    return old_value, new_value
+
+
+def _add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+async def maintain_partitions() -> dict:
+    """
+    Обслуживание месячных разделов audit_log
+
+    Создаёт разделы от текущего месяца на AUDIT_PARTITIONS_AHEAD месяцев
+    вперёд и удаляет целиком разделы старше AUDIT_RETENTION_MONTHS
+    (0 - хранить бессрочно). Границы разделов - в UTC, как в миграции 011.
+    Записи, попавшие в раздел по умолчанию (миграция 014), переносятся в
+    создаваемый раздел своего месяца; число оставшихся возвращается в
+    default_rows.
+    """
+    current = datetime.now(timezone.utc).date().replace(day=1)
+    created = []
+    dropped = []
+
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'audit_log'::regclass"
+        ))
+        existing = {}
+        for (name,) in result.all():
+            match = PARTITION_NAME_RE.match(name)
+            if match:
+                existing[date(int(match.group(1)), int(match.group(2)), 1)] = name
+
+        for offset in range(settings.AUDIT_PARTITIONS_AHEAD + 1):
+            month = _add_months(current, offset)
+            if month in existing:
+                continue
+            name = f"audit_log_p{month:%Y%m}"
+            bounds = (
+                f"FROM ('{month.isoformat()} 00:00+00') "
+                f"TO ('{_add_months(month, 1).isoformat()} 00:00+00')"
+            )
+            range_condition = (
+                f"created_at >= '{month.isoformat()} 00:00+00' "
+                f"AND created_at < '{_add_months(month, 1).isoformat()} 00:00+00'"
+            )
+            stray = await db.execute(text(
+                f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE {range_condition})"
+            ))
+            if stray.scalar():
+                # Раздел нельзя создать, пока строки его месяца лежат в
+                # разделе по умолчанию: они переносятся в новую таблицу,
+                # которая затем подключается как раздел
+                await db.execute(text(f"CREATE TABLE {name} (LIKE audit_log INCLUDING DEFAULTS)"))
+                await db.execute(text(
+                    f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE {range_condition} RETURNING *) "
+                    f"INSERT INTO {name} SELECT * FROM moved"
+                ))
+                await db.execute(text(f"ALTER TABLE audit_log ATTACH PARTITION {name} FOR VALUES {bounds}"))
+                logger.warning(f"Записи аудита перенесены из {DEFAULT_PARTITION} в {name}")
+            else:
+                await db.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF audit_log FOR VALUES {bounds}"
+                ))
+            created.append(name)
+
+        if settings.AUDIT_RETENTION_MONTHS > 0:
+            # Раздел удаляется, когда весь его месяц старше срока хранения
+            oldest_kept = _add_months(current, -settings.AUDIT_RETENTION_MONTHS)
+            for month, name in sorted(existing.items()):
+                if month >= oldest_kept:
+                    break
+                # DETACH + DROP вместо DELETE: мгновенно и без раздувания таблицы
+                await db.execute(text(f"ALTER TABLE audit_log DETACH PARTITION {name}"))
+                await db.execute(text(f"DROP TABLE {name}"))
+                dropped.append(name)
+
+        # Строки вне месячных разделов (должно быть 0)
+        default_rows = (await db.execute(text(f"SELECT count(*) FROM {DEFAULT_PARTITION}"))).scalar()
+
+        await db.commit()
+
+    if default_rows:
+        logger.warning(f"В {DEFAULT_PARTITION} {default_rows} записей вне месячных разделов")
+    if created:
+        logger.info(f"Созданы разделы audit_log: {', '.join(created)}")
+    if dropped:
+        logger.info(f"Удалены разделы audit_log старше {settings.AUDIT_RETENTION_MONTHS} мес.: {', '.join(dropped)}")
+
+    return {"created": created, "dropped": dropped, "default_rows": default_rows}
+
+
+class AuditContext:
+    """Сборщик записей аудита одного запроса"""
+
+    def __init__(
+        self,
+        user_id: Optional[int] = None,
+        ip_address: Optional[str] = None,
+        user_agent: Optional[str] = None
+    ):
+        self.user_id = user_id
+        self.ip_address = ip_address
+        self.user_agent = user_agent
+        self.entries: List[dict] = []
+
+    def record(
+        self,
+        action: str,
+        entity_type: str,
+        entity_id: Optional[int] = None,
+        old_value: Optional[dict] = None,
+        new_value: Optional[dict] = None
+    ) -> None:
+        """
+        Добавление записи (вызывать после успешного commit изменения)
+
+        Время фиксируется сейчас, а не при записи пакета в БД
+        """
+        self.entries.append({
+            "user_id": self.user_id,
+            "action": action,
+            "entity_type": entity_type,
+            "entity_id": entity_id,
+            "old_value": _json_safe(old_value),
+            "new_value": _json_safe(new_value),
+            "ip_address": self.ip_address,
+            "user_agent": self.user_agent,
+            "created_at": datetime.now(timezone.utc).isoformat()
+        })
+
+    def commit(self) -> None:
+        """Передача собранных записей в audit_writer"""
+        if self.entries:
+            audit_writer.submit(self.entries)
+            self.entries = []
+
+
+class AuditWriter:
+    """Буферизованная пакетная запись журнала аудита"""
+
+    def __init__(self, batch_size: int, flush_interval: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffered = 0
+        self._journal = None
+        self._owner: Optional[str] = None
+        self._owner_lock = None
+        self._batch_seq = 0
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        # Статистика для /health
+        self.written = 0
+        self.batches = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self.default_partition_rows: Optional[int] = None
+
+    def get_spool_dir(self) -> Path:
+        spool_dir = Path(settings.STORAGE_PATH) / "audit"
+        spool_dir.mkdir(parents=True, exist_ok=True)
+        return spool_dir
+
+    def _get_owner(self) -> str:
+        """
+        Метка процесса в именах файлов журнала
+
+        Пока процесс жив, он держит блокировку owner-<метка>.lock; по ней
+        другие процессы узнают, что журнал и захваченные пакеты не брошены.
+        PID дополнен случайной частью: после перезапуска контейнера PID
+        воркеров повторяются
+        """
+        if self._owner is None or not self._owner.startswith(f"{os.getpid()}-"):
+            self._journal = None
+            self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+            # Файл блокируется под временным именем: иначе другой процесс
+            # может успеть принять его за брошенный и удалить
+            spool_dir = self.get_spool_dir()
+            temp_path = spool_dir / f".{OWNER_PREFIX}{self._owner}.lock"
+            self._owner_lock = open(temp_path, "w")
+            fcntl.flock(self._owner_lock, fcntl.LOCK_EX)
+            temp_path.rename(spool_dir / f"{OWNER_PREFIX}{self._owner}.lock")
+        return self._owner
+
+    def _journal_path(self) -> Path:
+        return self.get_spool_dir() / f"current-{self._get_owner()}.jsonl"
+
+    def submit(self, entries: List[dict]) -> None:
+        """
+        Добавление записей в буфер (журнал процесса на диске)
+
+        У каждого процесса (воркера uvicorn) свой журнал current-<метка>.jsonl.
+        Запись в файл без fsync: данные переживают перезапуск процесса,
+        но не отключение питания
+        """
+        if self._journal is None:
+            self._journal = open(self._journal_path(), "a", encoding="utf-8")
+
+        self._journal.write("".join(
+            json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries
+        ))
+        self._journal.flush()
+
+        self._buffered += len(entries)
+        if self._buffered >= self.batch_size:
+            self._wakeup.set()
+
+    async def start(self) -> None:
+        """Запуск фоновой записи (вызывается при старте приложения)"""
+        if self._task:
+            return
+        self._get_owner()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Запись журнала аудита запущена")
+
+    async def stop(self) -> None:
+        """Остановка с финальным сбросом буфера"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        await self.flush()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if self._owner_lock is not None:
+            # Незаписанные пакеты уже переименованы в batch-* и достанутся другим процессам
+            self._journal_path().unlink(missing_ok=True)
+            (self.get_spool_dir() / f"{OWNER_PREFIX}{self._owner}.lock").unlink(missing_ok=True)
+            self._owner_lock.close()
+            self._owner_lock = None
+            self._owner = None
+        logger.info("Запись журнала аудита остановлена")
+
+    async def _run(self) -> None:
+        """Сброс буфера по размеру пакета или по таймеру, обслуживание разделов"""
+        partitions_checked_at = None
+
+        while True:
+            # Разделы - до записи, чтобы для пакетов был раздел текущего месяца
+            if partitions_checked_at is None or time.monotonic() - partitions_checked_at > PARTITION_CHECK_INTERVAL:
+                try:
+                    partitions = await maintain_partitions()
+                    self.default_partition_rows = partitions["default_rows"]
+                    partitions_checked_at = time.monotonic()
+                except Exception as e:
+                    logger.error(f"Ошибка обслуживания разделов audit_log: {e}")
+
+            # Первый проход записывает пакеты, оставшиеся с прошлого запуска
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка записи журнала аудита: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def _rotate(self) -> None:
+        """Журнал процесса становится пакетом для записи в БД"""
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+        current = self._journal_path()
+        if current.exists() and current.stat().st_size > 0:
+            self._batch_seq += 1
+            current.rename(current.with_name(f"batch-{time.time_ns()}-{self._batch_seq}-{self._owner}.jsonl"))
+        self._buffered = 0
+
+    def _recover_orphans(self) -> None:
+        """
+        Журналы и захваченные пакеты завершившихся процессов
+
+        Блокировка владельца снимается ОС при завершении процесса (в том
+        числе аварийном). Журнал такого процесса становится пакетом, а
+        захваченные им пакеты возвращаются в очередь
+        """
+        spool_dir = self.get_spool_dir()
+        for lock_path in spool_dir.glob(f"{OWNER_PREFIX}*.lock"):
+            owner = lock_path.name[len(OWNER_PREFIX):-len(".lock")]
+            if owner == self._owner:
+                continue
+            with open(lock_path, "a") as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    # Процесс жив
+                    continue
+
+                journal = spool_dir / f"current-{owner}.jsonl"
+                if journal.exists():
+                    journal.rename(spool_dir / f"batch-{time.time_ns()}-0-{owner}.jsonl")
+                claimed_prefix = f"claimed-{owner}-"
+                for claimed in spool_dir.glob(f"{claimed_prefix}*"):
+                    claimed.rename(spool_dir / claimed.name[len(claimed_prefix):])
+                lock_path.unlink(missing_ok=True)
+            logger.warning(f"Подобран журнал аудита завершившегося процесса {owner}")
+
+    def _claim(self, batch_path: Path) -> Optional[Path]:
+        """
+        Захват пакета переименованием; None - пакет уже взял другой процесс
+
+        rename атомарен, поэтому каждый пакет записывает ровно один процесс
+        """
+        claimed = batch_path.with_name(f"claimed-{self._owner}-{batch_path.name}")
+        try:
+            batch_path.rename(claimed)
+        except FileNotFoundError:
+            return None
+        return claimed
+
+    def _release(self, claimed: Path, batch_name: str) -> None:
+        """
+        Возврат пакета после ошибки INSERT
+
+        Пакет, не записанный AUDIT_BATCH_MAX_ATTEMPTS раз, переносится в
+        failed/ для разбора вручную и больше не задерживает следующие
+        """
+        match = BATCH_NAME_RE.match(batch_name)
+        stem, attempts = match.group(1), int(match.group(2) or 0) + 1
+
+        if attempts >= settings.AUDIT_BATCH_MAX_ATTEMPTS:
+            failed_dir = self.get_spool_dir() / "failed"
+            failed_dir.mkdir(exist_ok=True)
+            claimed.rename(failed_dir / f"{stem}.jsonl")
+            logger.error(f"Пакет аудита {stem} перенесён в failed/ после {attempts} попыток")
+        else:
+            claimed.rename(claimed.with_name(f"{stem}.a{attempts}.jsonl"))
+
+    async def flush(self) -> int:
+        """
+        Запись всех накопленных пакетов в БД, возвращает число записей
+
+        Пакет удаляется с диска только после успешного INSERT. Если БД
+        недоступна, сброс прекращается и пакеты ждут следующего; если
+        отвергнут сам пакет, он возвращается в очередь с увеличенным
+        счётчиком попыток, а запись продолжается со следующего
+        """
+        async with self._flush_lock:
+            self._get_owner()
+            self._rotate()
+            self._recover_orphans()
+
+            written = 0
+            for batch_path in sorted(self.get_spool_dir().glob("batch-*.jsonl")):
+                claimed = self._claim(batch_path)
+                if claimed is None:
+                    continue
+
+                rows = self._load_batch(claimed)
+                if rows:
+                    try:
+                        async with AsyncSessionLocal() as db:
+                            # executemany - SQLAlchemy собирает многострочный INSERT ... VALUES
+                            await db.execute(insert(AuditLog), rows)
+                            await db.commit()
+                    except asyncio.CancelledError:
+                        # Остановка приложения: пакет остаётся в очереди
+                        claimed.rename(batch_path)
+                        raise
+                    except (OperationalError, InterfaceError, OSError) as e:
+                        self.failures += 1
+                        self.last_error = str(e)
+                        claimed.rename(batch_path)
+                        logger.error(f"БД недоступна, запись аудита отложена: {e}")
+                        break
+                    except Exception as e:
+                        self.failures += 1
+                        self.last_error = str(e)
+                        logger.error(f"Не удалось записать пакет аудита {batch_path.name}: {e}")
+                        self._release(claimed, batch_path.name)
+                        continue
+
+                claimed.unlink()
+                written += len(rows)
+                self.batches += 1
+
+            self.written += written
+            return written
+
+    def _load_batch(self, batch_path: Path) -> List[dict]:
+        """Чтение пакета; строка, оборванная при сбое, пропускается"""
+        rows = []
+        with open(batch_path, encoding="utf-8") as batch_file:
+            for line in batch_file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Пропущена повреждённая запись аудита в {batch_path.name}")
+                    continue
+                entry["created_at"] = datetime.fromisoformat(entry["created_at"])
+                rows.append(entry)
+        return rows
+
+    def get_stats(self) -> dict:
+        """Статистика записи для /health"""
+        spool_dir = self.get_spool_dir()
+        return {
+            "running": self._task is not None,
+            "buffered": self._buffered,
+            "pending_batches": len(list(spool_dir.glob("batch-*.jsonl"))),
+            "failed_batches": len(list(spool_dir.glob("failed/*.jsonl"))),
+            "written": self.written,
+            "batches": self.batches,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "default_partition_rows": self.default_partition_rows
+        }
+
+
+# Глобальный экземпляр
+audit_writer = AuditWriter(
+    batch_size=settings.AUDIT_BATCH_SIZE,
+    flush_interval=settings.AUDIT_FLUSH_INTERVAL
+)
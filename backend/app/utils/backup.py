@@ -0,0 +1,370 @@
+"""
+Резервное копирование базы данных в фоне
+
+pg_dump запускается через asyncio.create_subprocess_exec (без shell и без
+блокировки event loop) в формате каталога с параллельной выгрузкой таблиц
+(-Fd -j BACKUP_JOBS) и сжатием zstd (pg_dump 16+, для старых версий -
+gzip). Копия пишется в BACKUP_PATH/db_YYYYMMDD_HHMMSS.partial и
+переименовывается после успешного завершения, поэтому незавершённая копия
+никогда не выглядит готовой.
+
+Ход выполнения берётся из вывода pg_dump --verbose: каждая выгруженная
+таблица увеличивает счётчик tables_done. Ежедневный запуск в BACKUP_TIME
+и удаление копий старше BACKUP_KEEP_DAYS выполняет APScheduler.
+
+Планировщик есть в каждом воркере uvicorn, поэтому запуск и очистка
+выполняются под блокировкой файла в BACKUP_PATH (BackupLock): копию
+делает один процесс, остальные пропускают плановый запуск и отвечают 409
+на ручной. Ход выполнения пишется в файл состояния рядом с блокировкой,
+и /api/admin/backup/status показывает его в любом процессе.
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import time
+import re
+import shutil
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from fastapi import HTTPException, status
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from app.config import settings
+from app.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+BACKUP_PREFIX = "db_"
+PARTIAL_SUFFIX = ".partial"
+
+# pg_dump --verbose: "pg_dump: dumping contents of table "public.cases""
+TABLE_DUMPED_RE = re.compile(r'dumping contents of table "([^"]+)"')
+
+# Сколько последних строк вывода pg_dump хранить для сообщения об ошибке
+STDERR_TAIL_LINES = 20
+
+# Не чаще раза в столько секунд ход выполнения пишется в файл состояния
+STATE_SAVE_INTERVAL = 1.0
+
+
+def _dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+class BackupLock:
+    """
+    Блокировка резервного копирования между процессами и его состояние
+
+    BACKUP_PATH/.<name>.lock захватывается flock на всё время копирования
+    (блокировку снимает ОС, даже если процесс упал). Текущая и последняя
+    копия хранятся в BACKUP_PATH/.<name>.json для всех процессов.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._file = None
+        self._saved_at = 0.0
+
+    def _path(self, suffix: str) -> Path:
+        backup_dir = Path(settings.BACKUP_PATH)
+        backup_dir.mkdir(parents=True, exist_ok=True)
+        return backup_dir / f".{self.name}{suffix}"
+
+    def acquire(self) -> bool:
+        """False, если копирование уже выполняет другой процесс"""
+        lock_file = open(self._path(".lock"), "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._file = lock_file
+        return True
+
+    def release(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def held_elsewhere(self) -> bool:
+        """Выполняется ли копирование в другом процессе"""
+        if self._file is not None:
+            return False
+        if not self.acquire():
+            return True
+        self.release()
+        return False
+
+    def save_state(self, current: Optional[dict], last: Optional[dict], force: bool = False) -> None:
+        """Запись состояния (ход выполнения - не чаще STATE_SAVE_INTERVAL)"""
+        if not force and time.monotonic() - self._saved_at < STATE_SAVE_INTERVAL:
+            return
+        self._saved_at = time.monotonic()
+        state_path = self._path(".json")
+        temp_path = state_path.with_name(f"{state_path.name}.{os.getpid()}")
+        temp_path.write_text(json.dumps({"current": current, "last": last}, ensure_ascii=False), encoding="utf-8")
+        os.replace(temp_path, state_path)
+
+    def load_state(self) -> Dict[str, Any]:
+        try:
+            return json.loads(self._path(".json").read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return {"current": None, "last": None}
+
+    def get_state(self, current: Optional[dict], last: Optional[dict]) -> Dict[str, Any]:
+        """Текущая и последняя копия с учётом других процессов"""
+        if current is not None:
+            return {"running": True, "current": current, "last": last}
+        state = self.load_state()
+        running = state.get("current") is not None and self.held_elsewhere()
+        return {
+            "running": running,
+            "current": state.get("current") if running else None,
+            "last": state.get("last") or last
+        }
+
+
+class BackupManager:
+    """Фоновые резервные копии БД: запуск, ход выполнения, хранение"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._scheduler: Optional[AsyncIOScheduler] = None
+        self._compression: Optional[str] = None
+        self._lock = BackupLock("db_backup")
+        self.current: Optional[dict] = None
+        self.last: Optional[dict] = None
+
+    def get_backup_dir(self) -> Path:
+        backup_dir = Path(settings.BACKUP_PATH)
+        backup_dir.mkdir(parents=True, exist_ok=True)
+        return backup_dir
+
+    async def start(self) -> None:
+        """Ежедневный запуск в BACKUP_TIME (вызывается при старте приложения)"""
+        if self._scheduler or not settings.BACKUP_ENABLED:
+            return
+
+        hour, minute = (int(part) for part in settings.BACKUP_TIME.split(":"))
+        self._scheduler = AsyncIOScheduler()
+        self._scheduler.add_job(
+            self._scheduled_backup,
+            "cron",
+            hour=hour,
+            minute=minute,
+            id="database_backup",
+            max_instances=1,
+            coalesce=True
+        )
+        self._scheduler.start()
+        logger.info(f"Ежедневное резервное копирование в {settings.BACKUP_TIME}")
+
+    async def stop(self) -> None:
+        """Остановка расписания и прерывание выполняющейся копии"""
+        if self._scheduler:
+            self._scheduler.shutdown(wait=False)
+            self._scheduler = None
+        if self._task and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _scheduled_backup(self) -> None:
+        try:
+            self.start_backup(trigger="schedule")
+        except HTTPException:
+            # Срабатывает во всех воркерах, копию делает один
+            logger.info("Плановое резервное копирование выполняется другим запуском")
+
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start_backup(self, trigger: str = "manual") -> dict:
+        """Запуск копии в фоне; одновременно (во всех процессах) выполняется только одна"""
+        if self.is_running() or not self._lock.acquire():
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Резервное копирование уже выполняется"
+            )
+
+        started_at = datetime.now()
+        name = f"{BACKUP_PREFIX}{started_at:%Y%m%d_%H%M%S}"
+        self.current = {
+            "name": name,
+            "trigger": trigger,
+            "status": "running",
+            "phase": "starting",
+            "started_at": started_at.isoformat(),
+            "finished_at": None,
+            "tables_total": None,
+            "tables_done": 0,
+            "size": None,
+            "error": None
+        }
+        self._lock.save_state(self.current, self.last, force=True)
+        self._task = asyncio.create_task(self._run(self.current))
+        return self.current
+
+    async def _run(self, job: dict) -> None:
+        """Копия и очистка; блокировка снимается по завершении"""
+        target = self.get_backup_dir() / job["name"]
+        partial = target.with_name(target.name + PARTIAL_SUFFIX)
+        try:
+            job["tables_total"] = await self._count_tables()
+            job["phase"] = "dumping"
+            self._lock.save_state(job, self.last, force=True)
+            await self._pg_dump(partial, job)
+
+            partial.rename(target)
+            job["size"] = await asyncio.to_thread(_dir_size, target)
+            job["phase"] = "cleanup"
+            self._lock.save_state(job, self.last, force=True)
+            await asyncio.to_thread(self._cleanup)
+
+            job["status"] = "completed"
+            logger.info(f"Резервная копия {target.name} создана ({job['size']} байт)")
+        except asyncio.CancelledError:
+            job["status"] = "cancelled"
+            shutil.rmtree(partial, ignore_errors=True)
+            raise
+        except Exception as e:
+            job["status"] = "failed"
+            job["error"] = str(e)
+            shutil.rmtree(partial, ignore_errors=True)
+            logger.error(f"Ошибка резервного копирования: {e}")
+        finally:
+            job["phase"] = None
+            job["finished_at"] = datetime.now().isoformat()
+            self.last = job
+            self.current = None
+            self._lock.save_state(None, job, force=True)
+            self._lock.release()
+
+    async def _count_tables(self) -> Optional[int]:
+        """Число таблиц с данными - знаменатель для хода выполнения"""
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(text(
+                    "SELECT count(*) FROM pg_class c "
+                    "JOIN pg_namespace n ON n.oid = c.relnamespace "
+                    "WHERE c.relkind = 'r' "
+                    "AND n.nspname NOT IN ('pg_catalog', 'information_schema') "
+                    "AND n.nspname NOT LIKE 'pg_toast%'"
+                ))
+                return result.scalar()
+        except Exception as e:
+            logger.warning(f"Не удалось посчитать таблицы для хода резервного копирования: {e}")
+            return None
+
+    async def _get_compression(self) -> str:
+        """zstd поддерживается pg_dump начиная с PostgreSQL 16"""
+        if self._compression is None:
+            process = await asyncio.create_subprocess_exec(
+                "pg_dump", "--version",
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+            stdout, _ = await process.communicate()
+            match = re.search(r"(\d+)", stdout.decode(errors="replace"))
+            major = int(match.group(1)) if match else 0
+            # До 16 версии --compress принимает только уровень gzip
+            self._compression = f"zstd:{settings.BACKUP_ZSTD_LEVEL}" if major >= 16 else "6"
+            if major < 16:
+                logger.warning(f"pg_dump {major} не поддерживает zstd, используется gzip")
+        return self._compression
+
+    async def _pg_dump(self, output_dir: Path, job: dict) -> None:
+        """pg_dump -Fd -j N с разбором --verbose вывода для хода выполнения"""
+        url = make_url(settings.DATABASE_URL)
+        env = dict(os.environ)
+        if url.password:
+            env["PGPASSWORD"] = url.password
+
+        args = [
+            "pg_dump",
+            "--format=directory",
+            f"--jobs={settings.BACKUP_JOBS}",
+            f"--compress={await self._get_compression()}",
+            "--verbose",
+            f"--file={output_dir}",
+            f"--dbname={url.database}",
+        ]
+        if url.host:
+            args.append(f"--host={url.host}")
+        if url.port:
+            args.append(f"--port={url.port}")
+        if url.username:
+            args.append(f"--username={url.username}")
+
+        process = await asyncio.create_subprocess_exec(
+            *args,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+            env=env
+        )
+
+        tail: List[str] = []
+        try:
+            async for raw_line in process.stderr:
+                line = raw_line.decode(errors="replace").rstrip()
+                if TABLE_DUMPED_RE.search(line):
+                    job["tables_done"] += 1
+                    self._lock.save_state(job, self.last)
+                tail = (tail + [line])[-STDERR_TAIL_LINES:]
+            returncode = await process.wait()
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+
+        if returncode != 0:
+            raise RuntimeError(f"pg_dump завершился с кодом {returncode}: {' | '.join(tail[-5:])}")
+
+    def _cleanup(self) -> None:
+        """
+        Удаление копий старше BACKUP_KEEP_DAYS и брошенных .partial
+
+        Выполняется под блокировкой, поэтому .partial другого процесса
+        здесь может быть только брошенным
+        """
+        keep_after = datetime.now() - timedelta(days=settings.BACKUP_KEEP_DAYS)
+        for path in self.get_backup_dir().glob(f"{BACKUP_PREFIX}*"):
+            if path.name.endswith(PARTIAL_SUFFIX):
+                if self.current is None or path.name != self.current["name"] + PARTIAL_SUFFIX:
+                    shutil.rmtree(path, ignore_errors=True)
+                continue
+            try:
+                created = datetime.strptime(path.name[len(BACKUP_PREFIX):], "%Y%m%d_%H%M%S")
+            except ValueError:
+                continue
+            if created < keep_after:
+                shutil.rmtree(path, ignore_errors=True)
+                logger.info(f"Удалена устаревшая резервная копия {path.name}")
+
+    def list_backups(self) -> List[dict]:
+        """Готовые копии на диске, новые первыми"""
+        backups = []
+        for path in sorted(self.get_backup_dir().glob(f"{BACKUP_PREFIX}*"), reverse=True):
+            if path.name.endswith(PARTIAL_SUFFIX) or not path.is_dir():
+                continue
+            backups.append({
+                "name": path.name,
+                "size": _dir_size(path),
+                "created_at": datetime.fromtimestamp(path.stat().st_mtime).isoformat()
+            })
+        return backups
+
+    def get_stats(self) -> dict:
+        """Текущая и последняя копия для /health и /api/admin/backup/status"""
+        return {
+            **self._lock.get_state(self.current, self.last),
+            "schedule": settings.BACKUP_TIME if self._scheduler else None,
+            "keep_days": settings.BACKUP_KEEP_DAYS
+        }
+
+
+# Глобальный экземпляр
+backup_manager = BackupManager()
@@ -0,0 +1,382 @@
+"""
+Инкрементальное резервное копирование файлового хранилища
+
+Каждый запуск создаёт полный снимок каталогов STORAGE_PATH (documents,
+legal_acts, templates) в BACKUP_PATH/files/files_YYYYMMDD_HHMMSS:
+
+    data/...         - дерево файлов, как в STORAGE_PATH
+    manifest.jsonl   - строка на файл: path, size, mtime_ns, sha256
+
+Файл, у которого размер и mtime совпадают с манифестом предыдущего
+снимка, не читается: в новый снимок ставится жёсткая ссылка на копию из
+предыдущего. Копируются только новые и изменённые файлы (с подсчётом
+SHA-256 по ходу копирования); если такое содержимое уже есть в предыдущем
+или текущем снимке, копия тоже заменяется жёсткой ссылкой. Поэтому
+ночной запуск читает с диска только изменения за сутки, а каждый снимок
+при этом остаётся полным и удаляется независимо от остальных.
+
+Копирование выполняется в отдельном потоке и ограничено
+FILE_BACKUP_MAX_RATE МБ/с, чтобы не забирать диск у пользователей.
+Снимок и очистка выполняются под блокировкой между процессами
+(app.utils.backup.BackupLock), как и копия БД.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from fastapi import HTTPException, status
+from app.config import settings
+from app.utils.backup import BackupLock
+
+logger = logging.getLogger(__name__)
+
+# Каталоги STORAGE_PATH с пользовательскими файлами (tmp, cache, audit - служебные)
+SNAPSHOT_DIRS = ("documents", "legal_acts", "templates")
+
+SNAPSHOT_PREFIX = "files_"
+PARTIAL_SUFFIX = ".partial"
+MANIFEST_NAME = "manifest.jsonl"
+
+# Размер части при копировании
+CHUNK_SIZE = 1024 * 1024
+
+
+class ManifestEntry(NamedTuple):
+    """Файл в снимке"""
+    size: int
+    mtime_ns: int
+    sha256: str
+
+
+class BackupCancelled(Exception):
+    """Копирование прервано остановкой приложения"""
+
+
+class Throttle:
+    """Ограничение скорости чтения/записи (байт в секунду)"""
+
+    def __init__(self, bytes_per_second: int, stop_event: threading.Event):
+        self.bytes_per_second = bytes_per_second
+        self.stop_event = stop_event
+        self._started = time.monotonic()
+        self._consumed = 0
+
+    def consume(self, size: int) -> None:
+        if self.stop_event.is_set():
+            raise BackupCancelled()
+        if self.bytes_per_second <= 0:
+            return
+        self._consumed += size
+        ahead = self._consumed / self.bytes_per_second - (time.monotonic() - self._started)
+        if ahead > 0:
+            # Ожидание прерывается остановкой приложения
+            if self.stop_event.wait(ahead):
+                raise BackupCancelled()
+
+
+def load_manifest(snapshot_dir: Path) -> Dict[str, ManifestEntry]:
+    """Манифест снимка {относительный путь: запись}"""
+    manifest = {}
+    manifest_path = snapshot_dir / MANIFEST_NAME
+    if not manifest_path.exists():
+        return manifest
+
+    with open(manifest_path, encoding="utf-8") as manifest_file:
+        for line in manifest_file:
+            entry = json.loads(line)
+            manifest[entry["path"]] = ManifestEntry(entry["size"], entry["mtime_ns"], entry["sha256"])
+    return manifest
+
+
+def walk_files(root: Path) -> Iterator[Tuple[str, os.stat_result]]:
+    """Все файлы каталогов SNAPSHOT_DIRS: (путь относительно root, stat)"""
+    for dir_name in SNAPSHOT_DIRS:
+        stack = [root / dir_name]
+        while stack:
+            try:
+                entries = list(os.scandir(stack.pop()))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(Path(entry.path))
+                elif entry.is_file(follow_symlinks=False):
+                    try:
+                        stat = entry.stat(follow_symlinks=False)
+                    except FileNotFoundError:
+                        # Файл удалён между scandir и stat
+                        continue
+                    yield Path(entry.path).relative_to(root).as_posix(), stat
+
+
+def copy_with_hash(source: Path, destination: Path, throttle: Throttle) -> str:
+    """Копирование с подсчётом SHA-256 по ходу чтения"""
+    sha256 = hashlib.sha256()
+    with open(source, "rb") as src, open(destination, "wb") as dst:
+        while True:
+            chunk = src.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            throttle.consume(len(chunk))
+            sha256.update(chunk)
+            dst.write(chunk)
+    shutil.copystat(source, destination)
+    return sha256.hexdigest()
+
+
+def try_link(stored: Path, destination: Path) -> bool:
+    """
+    Жёсткая ссылка на уже сохранённую копию
+
+    False, если ссылку создать нельзя (копия удалена, исчерпан лимит
+    ссылок на inode) - тогда файл копируется из хранилища
+    """
+    try:
+        os.link(stored, destination)
+        return True
+    except OSError:
+        return False
+
+
+class FileBackupManager:
+    """Снимки файлового хранилища: запуск, ход выполнения, хранение"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._scheduler: Optional[AsyncIOScheduler] = None
+        self._stop_event = threading.Event()
+        self._lock = BackupLock("file_backup")
+        self.current: Optional[dict] = None
+        self.last: Optional[dict] = None
+
+    def get_snapshots_dir(self) -> Path:
+        snapshots_dir = Path(settings.BACKUP_PATH) / "files"
+        snapshots_dir.mkdir(parents=True, exist_ok=True)
+        return snapshots_dir
+
+    async def start(self) -> None:
+        """Ежедневный запуск в BACKUP_TIME (вызывается при старте приложения)"""
+        if self._scheduler or not settings.BACKUP_ENABLED:
+            return
+
+        hour, minute = (int(part) for part in settings.BACKUP_TIME.split(":"))
+        self._scheduler = AsyncIOScheduler()
+        self._scheduler.add_job(
+            self._scheduled_backup,
+            "cron",
+            hour=hour,
+            minute=minute,
+            id="file_backup",
+            max_instances=1,
+            coalesce=True
+        )
+        self._scheduler.start()
+        logger.info(f"Ежедневный снимок файлового хранилища в {settings.BACKUP_TIME}")
+
+    async def stop(self) -> None:
+        """Остановка расписания и прерывание выполняющегося снимка"""
+        if self._scheduler:
+            self._scheduler.shutdown(wait=False)
+            self._scheduler = None
+        if self._task and not self._task.done():
+            self._stop_event.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _scheduled_backup(self) -> None:
+        try:
+            self.start_backup(trigger="schedule")
+        except HTTPException:
+            # Срабатывает во всех воркерах, снимок делает один
+            logger.info("Плановый снимок файлов выполняется другим запуском")
+
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start_backup(self, trigger: str = "manual") -> dict:
+        """Запуск снимка в фоне; одновременно (во всех процессах) выполняется только один"""
+        if self.is_running() or not self._lock.acquire():
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Резервное копирование файлов уже выполняется"
+            )
+
+        started_at = datetime.now()
+        self._stop_event.clear()
+        self.current = {
+            "name": f"{SNAPSHOT_PREFIX}{started_at:%Y%m%d_%H%M%S}",
+            "trigger": trigger,
+            "status": "running",
+            "base": None,
+            "started_at": started_at.isoformat(),
+            "finished_at": None,
+            "files_done": 0,
+            "files_copied": 0,
+            "files_linked": 0,
+            "bytes_total": 0,
+            "bytes_copied": 0,
+            "error": None
+        }
+        self._lock.save_state(self.current, self.last, force=True)
+        self._task = asyncio.create_task(self._run(self.current))
+        return self.current
+
+    async def _run(self, job: dict) -> None:
+        """Снимок и очистка; блокировка снимается по завершении"""
+        try:
+            await asyncio.to_thread(self._snapshot, job)
+            await asyncio.to_thread(self._cleanup)
+            job["status"] = "completed"
+            logger.info(
+                f"Снимок файлов {job['name']}: {job['files_done']} файлов, "
+                f"скопировано {job['files_copied']} ({job['bytes_copied']} байт), "
+                f"ссылок {job['files_linked']}"
+            )
+        except BackupCancelled:
+            job["status"] = "cancelled"
+            logger.warning(f"Снимок файлов {job['name']} прерван")
+        except Exception as e:
+            job["status"] = "failed"
+            job["error"] = str(e)
+            logger.error(f"Ошибка резервного копирования файлов: {e}")
+        finally:
+            job["finished_at"] = datetime.now().isoformat()
+            self.last = job
+            self.current = None
+            self._lock.save_state(None, job, force=True)
+            self._lock.release()
+
+    def _latest_snapshot(self) -> Optional[Path]:
+        snapshots = [
+            path for path in self.get_snapshots_dir().glob(f"{SNAPSHOT_PREFIX}*")
+            if not path.name.endswith(PARTIAL_SUFFIX) and (path / MANIFEST_NAME).exists()
+        ]
+        return max(snapshots, key=lambda path: path.name) if snapshots else None
+
+    def _snapshot(self, job: dict) -> None:
+        """Создание снимка (выполняется в отдельном потоке)"""
+        storage_root = Path(settings.STORAGE_PATH)
+        throttle = Throttle(settings.FILE_BACKUP_MAX_RATE * 1024 * 1024, self._stop_event)
+
+        base = self._latest_snapshot()
+        previous = load_manifest(base) if base else {}
+        job["base"] = base.name if base else None
+
+        # Содержимое, уже сохранённое в снимках: sha256 -> путь копии
+        stored_by_hash: Dict[str, Path] = {
+            entry.sha256: base / "data" / path for path, entry in previous.items()
+        }
+
+        partial = self.get_snapshots_dir() / (job["name"] + PARTIAL_SUFFIX)
+        data_dir = partial / "data"
+        data_dir.mkdir(parents=True)
+
+        try:
+            with open(partial / MANIFEST_NAME, "w", encoding="utf-8") as manifest:
+                for relative_path, stat in walk_files(storage_root):
+                    if self._stop_event.is_set():
+                        raise BackupCancelled()
+                    destination = data_dir / relative_path
+                    destination.parent.mkdir(parents=True, exist_ok=True)
+
+                    entry = previous.get(relative_path)
+                    unchanged = entry and entry.size == stat.st_size and entry.mtime_ns == stat.st_mtime_ns
+                    # Файл не менялся - данные не читаются
+                    linked = bool(unchanged) and try_link(base / "data" / relative_path, destination)
+                    if linked:
+                        sha256 = entry.sha256
+                    else:
+                        try:
+                            sha256 = copy_with_hash(storage_root / relative_path, destination, throttle)
+                        except FileNotFoundError:
+                            # Файл удалён во время снимка
+                            destination.unlink(missing_ok=True)
+                            continue
+                        job["bytes_copied"] += stat.st_size
+
+                        # Такое содержимое уже сохранено - копия заменяется ссылкой
+                        existing = stored_by_hash.get(sha256)
+                        if existing is not None:
+                            temp_link = destination.with_name(destination.name + ".link")
+                            if try_link(existing, temp_link):
+                                os.replace(temp_link, destination)
+                                linked = True
+
+                    stored_by_hash.setdefault(sha256, destination)
+                    job["files_linked" if linked else "files_copied"] += 1
+                    job["files_done"] += 1
+                    job["bytes_total"] += stat.st_size
+                    self._lock.save_state(job, self.last)
+
+                    manifest.write(json.dumps({
+                        "path": relative_path,
+                        "size": stat.st_size,
+                        "mtime_ns": stat.st_mtime_ns,
+                        "sha256": sha256
+                    }) + "\n")
+
+            partial.rename(partial.with_name(job["name"]))
+        except BaseException:
+            shutil.rmtree(partial, ignore_errors=True)
+            raise
+
+    def _cleanup(self) -> None:
+        """
+        Удаление снимков старше BACKUP_KEEP_DAYS и брошенных .partial
+
+        Последний готовый снимок не удаляется - он база следующего запуска.
+        Выполняется под блокировкой, поэтому .partial другого процесса
+        здесь может быть только брошенным
+        """
+        keep_after = datetime.now() - timedelta(days=settings.BACKUP_KEEP_DAYS)
+        latest = self._latest_snapshot()
+        for path in self.get_snapshots_dir().glob(f"{SNAPSHOT_PREFIX}*"):
+            if path.name.endswith(PARTIAL_SUFFIX):
+                if self.current is None or path.name != self.current["name"] + PARTIAL_SUFFIX:
+                    shutil.rmtree(path, ignore_errors=True)
+                continue
+            if path == latest:
+                continue
+            try:
+                created = datetime.strptime(path.name[len(SNAPSHOT_PREFIX):], "%Y%m%d_%H%M%S")
+            except ValueError:
+                continue
+            if created < keep_after:
+                # Жёсткие ссылки из более новых снимков сохраняют общие данные
+                shutil.rmtree(path, ignore_errors=True)
+                logger.info(f"Удалён устаревший снимок файлов {path.name}")
+
+    def list_snapshots(self) -> List[dict]:
+        """Готовые снимки на диске, новые первыми"""
+        snapshots = []
+        for path in sorted(self.get_snapshots_dir().glob(f"{SNAPSHOT_PREFIX}*"), reverse=True):
+            manifest_path = path / MANIFEST_NAME
+            if path.name.endswith(PARTIAL_SUFFIX) or not manifest_path.exists():
+                continue
+            with open(manifest_path, encoding="utf-8") as manifest_file:
+                files = sum(1 for _ in manifest_file)
+            snapshots.append({
+                "name": path.name,
+                "files": files,
+                "created_at": datetime.fromtimestamp(manifest_path.stat().st_mtime).isoformat()
+            })
+        return snapshots
+
+    def get_stats(self) -> dict:
+        """Текущий и последний снимок для /health и /api/admin/backup/files/status"""
+        return {
+            **self._lock.get_state(self.current, self.last),
+            "schedule": settings.BACKUP_TIME if self._scheduler else None,
+            "max_rate_mb": settings.FILE_BACKUP_MAX_RATE
+        }
+
+
+# Глобальный экземпляр
+file_backup_manager = FileBackupManager()
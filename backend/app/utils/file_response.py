@@ -0,0 +1,197 @@
+"""
+Отдача файлов хранилища с условными запросами и диапазонами
+
+- ETag строгий: SHA-256 содержимого (documents.content_hash,
+  legal_acts.content_hash); для файлов без хеша - размер и mtime файла
+- If-None-Match / If-Modified-Since -> 304 без передачи файла
+- Range (один диапазон bytes=) -> 206 с Content-Range, If-Range учитывается;
+  несколько диапазонов не поддерживаются - отдаётся весь файл (200)
+- при заданном X_ACCEL_REDIRECT_PREFIX сам файл отдаёт nginx
+  (X-Accel-Redirect), включая Range; Python-воркер проверяет права,
+  If-None-Match и формирует заголовки. nginx заменяет ETag ответа своим
+  (mtime-размер), поэтому internal location должен содержать
+  `etag off` и `add_header ETag $upstream_http_etag`
+  (deployment/nginx/legal-cms-md.conf) - иначе клиент не получит SHA-256
+  ETag и If-None-Match никогда не совпадёт. Без своего ETag nginx не может
+  проверить If-Range, поэтому запросы с If-Range (докачка) отдаёт приложение
+"""
+import mimetypes
+import os
+from datetime import datetime, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import AsyncIterator, Optional, Tuple
+from urllib.parse import quote
+import aiofiles
+from fastapi import Request, Response, status
+from fastapi.responses import FileResponse, StreamingResponse
+from app.config import settings
+
+# Размер части при отдаче диапазона
+CHUNK_SIZE = 256 * 1024
+
+# Файлы неизменяемы по содержимому, но права доступа проверяются при каждом запросе
+CACHE_CONTROL = "private, no-cache"
+
+
+class RangeNotSatisfiable(Exception):
+    """Диапазон за пределами файла"""
+
+
+def make_etag(content_hash: Optional[str], stat: os.stat_result) -> str:
+    if content_hash:
+        return f'"{content_hash}"'
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Совпадение If-None-Match (слабое сравнение, как требует RFC 9110 для GET)"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    plain = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == plain for tag in header.split(","))
+
+
+def content_disposition(disposition: str, filename: str) -> str:
+    """Content-Disposition с именем файла в UTF-8 (RFC 5987) для кириллицы и румынских букв"""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"{disposition}; filename*=utf-8''{quoted}"
+    return f'{disposition}; filename="{filename}"'
+
+
+def _parse_http_date(value: str) -> Optional[datetime]:
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def is_not_modified(request: Request, etag: str, mtime: float) -> bool:
+    """If-None-Match, а при его отсутствии - If-Modified-Since"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        since = _parse_http_date(if_modified_since)
+        return since is not None and int(mtime) <= since.timestamp()
+    return False
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Один диапазон bytes= -> (start, end) включительно
+
+    None - заголовок не поддерживается или некорректен (отдаётся весь файл)
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+
+    try:
+        if first == "":
+            # bytes=-N: последние N байт
+            length = int(last)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def _if_range_matches(request: Request, etag: str, mtime: float) -> bool:
+    """If-Range: диапазон отдаётся, только если файл не изменился"""
+    if_range = request.headers.get("if-range")
+    if if_range is None:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"'):
+        # Строгое сравнение: слабый ETag никогда не совпадает
+        return if_range == etag
+    since = _parse_http_date(if_range)
+    return since is not None and int(mtime) == int(since.timestamp())
+
+
+async def _read_range(path: Path, start: int, end: int) -> AsyncIterator[bytes]:
+    remaining = end - start + 1
+    async with aiofiles.open(path, "rb") as file:
+        await file.seek(start)
+        while remaining > 0:
+            chunk = await file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+async def file_response(
+    request: Request,
+    path: Path,
+    content_hash: Optional[str] = None,
+    media_type: Optional[str] = None,
+    filename: Optional[str] = None,
+    inline: bool = False
+) -> Response:
+    """Ответ с файлом хранилища: 200, 206, 304 или 416"""
+    stat = path.stat()
+    etag = make_etag(content_hash, stat)
+    media_type = media_type or mimetypes.guess_type(filename or path.name)[0] or "application/octet-stream"
+
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+    if filename:
+        headers["Content-Disposition"] = content_disposition("inline" if inline else "attachment", filename)
+
+    if is_not_modified(request, etag, stat.st_mtime):
+        headers.pop("Content-Disposition", None)
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    # If-Range сверяется с SHA-256 ETag, которого у nginx нет
+    if settings.X_ACCEL_REDIRECT_PREFIX and "if-range" not in request.headers:
+        # nginx отдаёт файл из internal location (deployment/nginx/legal-cms-md.conf);
+        # ETag передаётся клиенту через add_header ETag $upstream_http_etag
+        relative_path = path.resolve().relative_to(Path(settings.STORAGE_PATH).resolve())
+        headers["X-Accel-Redirect"] = settings.X_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + quote(relative_path.as_posix())
+        return Response(headers=headers, media_type=media_type)
+
+    range_header = request.headers.get("range")
+    if range_header and _if_range_matches(request, etag, stat.st_mtime):
+        try:
+            byte_range = parse_range(range_header, stat.st_size)
+        except RangeNotSatisfiable:
+            return Response(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers={"Content-Range": f"bytes */{stat.st_size}", "Accept-Ranges": "bytes"}
+            )
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+            headers["Content-Length"] = str(end - start + 1)
+            return StreamingResponse(
+                _read_range(path, start, end),
+                status_code=status.HTTP_206_PARTIAL_CONTENT,
+                headers=headers,
+                media_type=media_type
+            )
+
+    return FileResponse(path=path, headers=headers, media_type=media_type, stat_result=stat)
@@ -0,0 +1,329 @@
+"""
+Фоновая индексация embeddings для семантического поиска
+
+Текст документов (ocr_text) и законодательных актов (full_text) режется на
+перекрывающиеся фрагменты, векторы фрагментов запрашиваются у Ollama
+пачками (/api/embed) и сохраняются в document_embeddings.
+
+Индексация инкрементальная: у каждого фрагмента хранятся хеш исходного
+текста и имя модели. Источник переиндексируется, только если его текст
+изменился или сменилась EMBEDDING_MODEL. Фрагменты источника заменяются
+в одной транзакции, поэтому прерванный проход (перезапуск, недоступность
+Ollama) продолжается с непроиндексированных источников.
+
+Если Ollama доступен, но отвергает пачку, источники страницы
+индексируются по одному. Источник, который Ollama не принимает,
+запоминается вместе с хешем текста и пропускается, пока текст или модель
+не изменятся, - он не останавливает индексацию остальных.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import delete, exists, insert, select, and_, or_
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.document import Document
+from app.models.document_embedding import DocumentEmbedding
+from app.models.legal_act import LegalAct
+from app.utils.ollama import ollama_client
+
+logger = logging.getLogger(__name__)
+
+# Источников, выбираемых из БД за один шаг прохода
+SOURCES_PER_STEP = 16
+
+
+def chunk_text(text: str, size: Optional[int] = None, overlap: Optional[int] = None) -> List[str]:
+    """
+    Разбиение текста на перекрывающиеся фрагменты
+
+    Граница фрагмента по возможности переносится на ближайший пробельный
+    символ во второй половине окна, чтобы не разрезать слова
+    """
+    size = max(1, size or settings.EMBEDDING_CHUNK_SIZE)
+    overlap = settings.EMBEDDING_CHUNK_OVERLAP if overlap is None else overlap
+    overlap = min(max(0, overlap), size // 2)
+
+    text = text.strip()
+    chunks = []
+    start = 0
+
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            boundary = max(text.rfind(" ", start + size // 2, end), text.rfind("\n", start + size // 2, end))
+            if boundary > start:
+                end = boundary
+
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+
+    return chunks
+
+
+class _Source:
+    """Описание индексируемой таблицы"""
+
+    def __init__(self, name: str, model, text_column, hash_column, fk_column):
+        self.name = name
+        self.model = model
+        self.text_column = text_column
+        self.hash_column = hash_column
+        self.fk_column = fk_column
+
+
+SOURCES = [
+    _Source("document", Document, Document.ocr_text, Document.ocr_text_hash, DocumentEmbedding.document_id),
+    _Source("legal_act", LegalAct, LegalAct.full_text, LegalAct.full_text_hash, DocumentEmbedding.legal_act_id),
+]
+
+
+class EmbeddingIndexer:
+    """Фоновый индексатор embeddings (один asyncio-таск на процесс)"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+
+        # (источник, id) -> хеш текста, который Ollama не принял
+        self._rejected: Dict[Tuple[str, int], str] = {}
+        self._rejected_model = settings.EMBEDDING_MODEL
+
+        # Статистика для /health
+        self.indexed_sources = 0
+        self.indexed_chunks = 0
+        self.last_run: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+
+    def notify(self) -> None:
+        """Запустить проход индексации, не дожидаясь интервала (например, после OCR)"""
+        self._wakeup.set()
+
+    async def start(self) -> None:
+        """Запуск индексатора (вызывается при старте приложения)"""
+        if self._task is not None:
+            return
+        self._stopping = False
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"Индексатор embeddings запущен (модель {settings.EMBEDDING_MODEL})")
+
+    async def stop(self) -> None:
+        """Остановка индексатора (вызывается при остановке приложения)"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        logger.info("Индексатор embeddings остановлен")
+
+    def get_stats(self) -> dict:
+        """Статистика индексации для /health"""
+        return {
+            "model": settings.EMBEDDING_MODEL,
+            "indexed_sources": self.indexed_sources,
+            "indexed_chunks": self.indexed_chunks,
+            "rejected_sources": len(self._rejected),
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+            "last_error": self.last_error
+        }
+
+    async def _loop(self) -> None:
+        """Проход индексации при старте, затем по уведомлению или по интервалу"""
+        while not self._stopping:
+            self._wakeup.clear()
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"Ошибка индексации embeddings: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.EMBEDDING_INDEX_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_once(self) -> int:
+        """
+        Один проход по всем источникам
+
+        Возвращает количество переиндексированных источников
+        """
+        if self._rejected_model != settings.EMBEDDING_MODEL:
+            self._rejected.clear()
+            self._rejected_model = settings.EMBEDDING_MODEL
+
+        total = 0
+        for source in SOURCES:
+            await self._purge_empty(source)
+
+            last_id = 0
+            while not self._stopping:
+                stale = await self._find_stale(source, last_id)
+                if not stale:
+                    break
+                last_id = stale[-1][0]
+
+                stale = [row for row in stale if self._rejected.get((source.name, row[0])) != row[1]]
+                if not stale:
+                    continue
+
+                indexed = await self._index(source, stale)
+                if indexed is None:
+                    # Ollama недоступен или вернул некорректный ответ - повторим в следующий раз
+                    self.last_run = datetime.now(timezone.utc)
+                    return total
+                total += indexed
+
+        self.last_run = datetime.now(timezone.utc)
+        self.last_error = None
+        if total:
+            logger.info(f"Индексация embeddings: обновлено источников {total}")
+        return total
+
+    async def _purge_empty(self, source: _Source) -> None:
+        """Удаление фрагментов источников, текст которых очищен"""
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                delete(DocumentEmbedding).where(
+                    source.fk_column.in_(
+                        select(source.model.id).where(
+                            or_(source.text_column.is_(None), source.text_column == "")
+                        )
+                    )
+                )
+            )
+            await db.commit()
+
+    async def _find_stale(self, source: _Source, last_id: int) -> List[Tuple[int, str, str]]:
+        """
+        Следующая страница источников с устаревшими embeddings (keyset по id)
+
+        Источник актуален, если его нулевой фрагмент построен текущей моделью
+        по тексту с тем же хешем
+        """
+        up_to_date = exists().where(
+            and_(
+                source.fk_column == source.model.id,
+                DocumentEmbedding.chunk_index == 0,
+                DocumentEmbedding.model_name == settings.EMBEDDING_MODEL,
+                DocumentEmbedding.content_hash == source.hash_column
+            )
+        )
+
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(source.model.id, source.hash_column, source.text_column)
+                .where(
+                    source.model.id > last_id,
+                    source.text_column.isnot(None),
+                    source.text_column != "",
+                    ~up_to_date
+                )
+                .order_by(source.model.id)
+                .limit(SOURCES_PER_STEP)
+            )
+            return [tuple(row) for row in result.all()]
+
+    async def _embed(self, texts: List[str]) -> Optional[List[List[float]]]:
+        """
+        Векторы текстов пачками по EMBEDDING_BATCH_SIZE; None при ошибке Ollama
+
+        Несовпадение размерности - ошибка настройки, а не источника:
+        индексация прекращается исключением
+        """
+        vectors: List[List[float]] = []
+        batch_size = max(1, settings.EMBEDDING_BATCH_SIZE)
+        for offset in range(0, len(texts), batch_size):
+            embeddings = await ollama_client.embed_batch(texts[offset:offset + batch_size])
+            if embeddings is None:
+                return None
+
+            for vector in embeddings:
+                if len(vector) != settings.EMBEDDING_DIMENSIONS:
+                    raise RuntimeError(
+                        f"Размерность {len(vector)} модели {settings.EMBEDDING_MODEL} "
+                        f"не совпадает с EMBEDDING_DIMENSIONS={settings.EMBEDDING_DIMENSIONS}"
+                    )
+            vectors.extend(embeddings)
+        return vectors
+
+    async def _index(self, source: _Source, stale: List[Tuple[int, str, str]]) -> Optional[int]:
+        """
+        Построение и замена фрагментов для страницы источников
+
+        Фрагменты всех источников страницы отправляются в Ollama общими
+        пачками. Если пачка отвергнута, а Ollama доступен, источники
+        индексируются по одному и непринятые пропускаются. Возвращает
+        None, если Ollama недоступен.
+        """
+        chunks: Dict[int, List[str]] = {
+            source_id: chunk_text(text) for source_id, _, text in stale
+        }
+        hashes = {source_id: text_hash for source_id, text_hash, _ in stale}
+
+        vectors: Dict[int, List[List[float]]] = {}
+        flat = [chunk for parts in chunks.values() for chunk in parts]
+        embeddings = await self._embed(flat)
+        if embeddings is not None:
+            position = 0
+            for source_id, parts in chunks.items():
+                vectors[source_id] = embeddings[position:position + len(parts)]
+                position += len(parts)
+        else:
+            if not await ollama_client.check_availability():
+                self.last_error = "Ollama не вернул embeddings"
+                return None
+
+            for source_id, parts in chunks.items():
+                source_vectors = await self._embed(parts)
+                if source_vectors is not None:
+                    vectors[source_id] = source_vectors
+                elif await ollama_client.check_availability():
+                    self._rejected[(source.name, source_id)] = hashes[source_id]
+                    logger.warning(
+                        f"Ollama не принял текст ({source.name} {source_id}), "
+                        f"источник пропущен до изменения текста"
+                    )
+                else:
+                    self.last_error = "Ollama не вернул embeddings"
+                    return None
+
+        rows = [
+            {
+                source.fk_column.key: source_id,
+                "chunk_index": i,
+                "chunk_text": chunk,
+                "content_hash": hashes[source_id],
+                "model_name": settings.EMBEDDING_MODEL,
+                "embedding_vector": vector
+            }
+            for source_id, source_vectors in vectors.items()
+            for i, (chunk, vector) in enumerate(zip(chunks[source_id], source_vectors))
+        ]
+
+        if vectors:
+            async with AsyncSessionLocal() as db:
+                await db.execute(delete(DocumentEmbedding).where(source.fk_column.in_(list(vectors))))
+                if rows:
+                    await db.execute(insert(DocumentEmbedding), rows)
+                await db.commit()
+
+        self.indexed_sources += len(vectors)
+        self.indexed_chunks += len(rows)
+        logger.debug(f"Проиндексировано {len(vectors)} ({source.name}), фрагментов: {len(rows)}")
+        return len(vectors)
+
+
+# Глобальный экземпляр индексатора
+embedding_indexer = EmbeddingIndexer()
@@ -0,0 +1,273 @@
+"""
+Фоновая очередь OCR заданий
+
+Задания хранятся в таблице ocr_jobs (PostgreSQL), поэтому переживают
+перезапуск приложения. Пул asyncio-воркеров запускается при старте
+приложения, забирает задания через SELECT ... FOR UPDATE SKIP LOCKED и
+повторяет неудачные попытки с экспоненциальной задержкой.
+
+Пока задание выполняется, воркер раз в OCR_JOB_HEARTBEAT_INTERVAL секунд
+обновляет heartbeat_at. Задание, прерванное перезапуском или падением
+процесса, перестаёт обновляться и через OCR_JOB_LEASE_TIMEOUT секунд
+возвращается в очередь (проверка выполняется при старте и периодически
+из цикла воркеров).
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List, Optional
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.document import Document
+from app.models.ocr_job import OCRJob
+from app.utils.ollama import ollama_client
+
+logger = logging.getLogger(__name__)
+
+
+class OCRJobQueue:
+    """Пул воркеров, обрабатывающих очередь OCR заданий"""
+
+    def __init__(self):
+        self._workers: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._recovered_at: Optional[float] = None
+
+    async def enqueue(
+        self,
+        db: AsyncSession,
+        document_id: int,
+        user_id: Optional[int] = None
+    ) -> OCRJob:
+        """
+        Постановка документа в очередь OCR
+
+        Если для документа уже есть незавершённое задание, возвращается оно.
+        Коммит выполняет вызывающий код вместе с остальными изменениями.
+        """
+        result = await db.execute(
+            select(OCRJob)
+            .where(
+                OCRJob.document_id == document_id,
+                OCRJob.status.in_(["pending", "running"])
+            )
+            .limit(1)
+        )
+        job = result.scalar_one_or_none()
+        if job:
+            return job
+
+        job = OCRJob(
+            document_id=document_id,
+            status="pending",
+            attempts=0,
+            run_after=datetime.now(timezone.utc),
+            created_by=user_id
+        )
+        db.add(job)
+        await db.flush()
+        return job
+
+    def notify(self) -> None:
+        """Разбудить воркеры после постановки нового задания"""
+        self._wakeup.set()
+
+    async def start(self) -> None:
+        """Запуск воркеров (вызывается при старте приложения)"""
+        if self._workers:
+            return
+
+        self._stopping = False
+        await self._recover_stale_jobs()
+
+        for worker_id in range(settings.OCR_WORKERS):
+            self._workers.append(asyncio.create_task(self._worker(worker_id)))
+        logger.info(f"Запущено OCR воркеров: {settings.OCR_WORKERS}")
+
+    async def stop(self) -> None:
+        """Остановка воркеров (вызывается при остановке приложения)"""
+        self._stopping = True
+        self._wakeup.set()
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        logger.info("OCR воркеры остановлены")
+
+    async def _recover_stale_jobs(self) -> None:
+        """
+        Возврат в очередь заданий, брошенных воркером (нет heartbeat)
+
+        Задание, уже исчерпавшее OCR_JOB_MAX_ATTEMPTS, завершается ошибкой:
+        документ, который роняет процесс, не должен перезапускаться бесконечно
+        """
+        self._recovered_at = time.monotonic()
+        now = datetime.now(timezone.utc)
+        stale = (
+            OCRJob.status == "running",
+            func.coalesce(OCRJob.heartbeat_at, OCRJob.started_at) < now - timedelta(seconds=settings.OCR_JOB_LEASE_TIMEOUT)
+        )
+        try:
+            async with AsyncSessionLocal() as db:
+                failed = await db.execute(
+                    update(OCRJob)
+                    .where(*stale, OCRJob.attempts >= settings.OCR_JOB_MAX_ATTEMPTS)
+                    .values(status="failed", last_error="Выполнение прервано", finished_at=now)
+                )
+                requeued = await db.execute(
+                    update(OCRJob)
+                    .where(*stale)
+                    .values(status="pending", run_after=now)
+                )
+                await db.commit()
+                if requeued.rowcount:
+                    logger.warning(f"Возвращено в очередь брошенных OCR заданий: {requeued.rowcount}")
+                if failed.rowcount:
+                    logger.error(f"OCR заданий, прерванных {settings.OCR_JOB_MAX_ATTEMPTS} раз: {failed.rowcount}")
+        except Exception as e:
+            logger.error(f"Ошибка при восстановлении OCR заданий: {e}")
+
+    async def _heartbeat(self, job_id: int) -> None:
+        """Отметка о выполнении задания, пока воркер им занят"""
+        while True:
+            await asyncio.sleep(settings.OCR_JOB_HEARTBEAT_INTERVAL)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.execute(
+                        update(OCRJob)
+                        .where(OCRJob.id == job_id, OCRJob.status == "running")
+                        .values(heartbeat_at=datetime.now(timezone.utc))
+                    )
+                    await db.commit()
+            except Exception as e:
+                logger.warning(f"OCR задание {job_id}: не удалось обновить heartbeat: {e}")
+
+    async def _worker(self, worker_id: int) -> None:
+        """Цикл воркера: забрать задание, выполнить, при отсутствии заданий ждать"""
+        while not self._stopping:
+            if time.monotonic() - self._recovered_at > settings.OCR_JOB_HEARTBEAT_INTERVAL:
+                await self._recover_stale_jobs()
+
+            try:
+                processed = await self._process_next()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"OCR воркер {worker_id}: ошибка обработки очереди: {e}")
+                processed = False
+
+            if not processed:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=settings.OCR_JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    async def _claim(self) -> Optional[OCRJob]:
+        """Захват следующего готового задания (SKIP LOCKED исключает двойную обработку)"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(OCRJob)
+                .where(
+                    OCRJob.status == "pending",
+                    OCRJob.run_after <= datetime.now(timezone.utc)
+                )
+                .order_by(OCRJob.run_after, OCRJob.id)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            )
+            job = result.scalar_one_or_none()
+            if job is None:
+                return None
+
+            job.status = "running"
+            job.attempts += 1
+            job.started_at = datetime.now(timezone.utc)
+            job.heartbeat_at = job.started_at
+            await db.commit()
+            return job
+
+    async def _process_next(self) -> bool:
+        """Обработка одного задания. Возвращает False, если очередь пуста"""
+        job = await self._claim()
+        if job is None:
+            return False
+
+        heartbeat = asyncio.create_task(self._heartbeat(job.id))
+        try:
+            ocr_text = await self._run(job)
+        except Exception as e:
+            await self._fail(job, str(e))
+            return True
+        finally:
+            heartbeat.cancel()
+
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Document)
+                .where(Document.id == job.document_id)
+                .values(ocr_text=ocr_text)
+            )
+            await db.execute(
+                update(OCRJob)
+                .where(OCRJob.id == job.id)
+                .values(status="done", last_error=None, finished_at=datetime.now(timezone.utc))
+            )
+            await db.commit()
+
+        logger.info(f"OCR успешно выполнен для документа {job.document_id} (задание {job.id})")
+
+        # Новый текст нужно проиндексировать для семантического поиска
+        from app.utils.indexer import embedding_indexer
+        embedding_indexer.notify()
+        return True
+
+    async def _run(self, job: OCRJob) -> str:
+        """Выполнение OCR для документа задания"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(Document).where(Document.id == job.document_id))
+            document = result.scalar_one_or_none()
+
+        if document is None:
+            raise RuntimeError(f"Документ с ID {job.document_id} не найден")
+
+        file_full_path = Path(settings.STORAGE_PATH) / "documents" / document.file_path
+        if not file_full_path.exists():
+            raise RuntimeError("Файл не найден на диске")
+
+        logger.info(f"OCR задание {job.id}: документ {document.id}, попытка {job.attempts}")
+        ocr_text = await ollama_client.ocr_document(str(file_full_path))
+        if not ocr_text:
+            raise RuntimeError("OCR не вернул результат")
+        return ocr_text
+
+    async def _fail(self, job: OCRJob, error: str) -> None:
+        """Неудачная попытка: повтор с экспоненциальной задержкой или окончательный отказ"""
+        async with AsyncSessionLocal() as db:
+            if job.attempts >= settings.OCR_JOB_MAX_ATTEMPTS:
+                values = {
+                    "status": "failed",
+                    "last_error": error,
+                    "finished_at": datetime.now(timezone.utc)
+                }
+                logger.error(f"OCR задание {job.id} завершилось ошибкой: {error}")
+            else:
+                delay = settings.OCR_JOB_RETRY_BACKOFF * 2 ** (job.attempts - 1)
+                values = {
+                    "status": "pending",
+                    "last_error": error,
+                    "run_after": datetime.now(timezone.utc) + timedelta(seconds=delay)
+                }
+                logger.warning(f"OCR задание {job.id}: ошибка ({error}), повтор через {delay} сек")
+
+            await db.execute(update(OCRJob).where(OCRJob.id == job.id).values(**values))
+            await db.commit()
+
+
+# Глобальный экземпляр очереди
+ocr_queue = OCRJobQueue()
@@ -1,21 +1,109 @@
 """
 Интеграция с Ollama API
 """
+import asyncio
 import httpx
 import base64
 import logging
-from typing import Optional, List
+from typing import Optional, List, Dict
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
 
 class OllamaClient:
-    """Клиент для работы с Ollama API"""
+    """
+    Клиент для работы с Ollama API
+
+    Использует один долгоживущий httpx.AsyncClient с пулом keep-alive
+    соединений. Клиент создаётся при старте приложения (start) и
+    закрывается при остановке (close). Количество одновременных запросов
+    к каждой модели ограничивается семафором.
+    """
 
     def __init__(self):
         self.base_url = settings.OLLAMA_BASE_URL
         self.enabled = settings.OLLAMA_ENABLED
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+        # Статистика пула соединений
+        self.pool_hits = 0
+        self.pool_misses = 0
+
+    async def start(self) -> None:
+        """Создание общего HTTP клиента (вызывается при старте приложения)"""
+        self._get_client()
+        logger.info(
+            f"HTTP клиент Ollama создан (max_connections={settings.OLLAMA_MAX_CONNECTIONS}, "
+            f"keepalive={settings.OLLAMA_MAX_KEEPALIVE_CONNECTIONS})"
+        )
+
+    async def close(self) -> None:
+        """Закрытие общего HTTP клиента (вызывается при остановке приложения)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            logger.info("HTTP клиент Ollama закрыт")
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Получение общего клиента (создаётся лениво, если start не вызывался)"""
+        if self._client is None:
+            limits = httpx.Limits(
+                max_connections=settings.OLLAMA_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.OLLAMA_KEEPALIVE_EXPIRY
+            )
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=limits,
+                timeout=httpx.Timeout(30.0, connect=5.0)
+            )
+        return self._client
+
+    def _get_semaphore(self, model: str) -> asyncio.Semaphore:
+        """Семафор, ограничивающий параллельные запросы к одной модели"""
+        semaphore = self._semaphores.get(model)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(settings.OLLAMA_MODEL_CONCURRENCY)
+            self._semaphores[model] = semaphore
+        return semaphore
+
+    async def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Выполнение запроса через общий клиент
+
+        Через trace-расширение httpcore определяем, было ли открыто новое
+        TCP соединение (промах пула) или переиспользовано существующее (попадание)
+        """
+        new_connection = False
+
+        async def trace(event_name: str, info: dict) -> None:
+            nonlocal new_connection
+            if event_name == "connection.connect_tcp.started":
+                new_connection = True
+
+        response = await self._get_client().request(
+            method, url, extensions={"trace": trace}, **kwargs
+        )
+
+        if new_connection:
+            self.pool_misses += 1
+        else:
+            self.pool_hits += 1
+
+        return response
+
+    def get_pool_stats(self) -> dict:
+        """Статистика пула соединений для /health"""
+        total = self.pool_hits + self.pool_misses
+        return {
+            "hits": self.pool_hits,
+            "misses": self.pool_misses,
+            "hit_ratio": round(self.pool_hits / total, 3) if total else None,
+            "max_connections": settings.OLLAMA_MAX_CONNECTIONS,
+            "model_concurrency": settings.OLLAMA_MODEL_CONCURRENCY
+        }
 
     async def check_availability(self) -> bool:
         """Проверка доступности Ollama"""
@@ -23,9 +111,8 @@ class OllamaClient:
             return False
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"{self.base_url}/api/tags", timeout=5.0)
-                return response.status_code == 200
+            response = await self._request("GET", "/api/tags", timeout=5.0)
+            return response.status_code == 200
         except Exception as e:
             logger.warning(f"Ollama недоступен: {e}")
             return False
@@ -41,9 +128,10 @@ class OllamaClient:
             with open(image_path, 'rb') as f:
                 image_base64 = base64.b64encode(f.read()).decode()
 
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/api/generate",
+            async with self._get_semaphore(settings.OCR_MODEL):
+                response = await self._request(
+                    "POST",
+                    "/api/generate",
                     json={
                         "model": settings.OCR_MODEL,
                         "prompt": "Распознай весь текст на этом изображении. Верни только текст без комментариев.",
@@ -53,12 +141,12 @@ class OllamaClient:
                     timeout=settings.OCR_TIMEOUT
                 )
 
-                if response.status_code == 200:
-                    result = response.json()
-                    return result.get("response", "")
-                else:
-                    logger.error(f"Ошибка OCR: {response.status_code}")
-                    return None
+            if response.status_code == 200:
+                result = response.json()
+                return result.get("response", "")
+            else:
+                logger.error(f"Ошибка OCR: {response.status_code}")
+                return None
 
         except Exception as e:
             logger.error(f"Ошибка при OCR распознавании: {e}")
@@ -71,9 +159,10 @@ class OllamaClient:
             return None
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/api/generate",
+            async with self._get_semaphore(settings.GENERATION_MODEL):
+                response = await self._request(
+                    "POST",
+                    "/api/generate",
                     json={
                         "model": settings.GENERATION_MODEL,
                         "prompt": prompt,
@@ -85,12 +174,12 @@ class OllamaClient:
                     timeout=settings.GENERATION_TIMEOUT
                 )
 
-                if response.status_code == 200:
-                    result = response.json()
-                    return result.get("response", "")
-                else:
-                    logger.error(f"Ошибка генерации: {response.status_code}")
-                    return None
+            if response.status_code == 200:
+                result = response.json()
+                return result.get("response", "")
+            else:
+                logger.error(f"Ошибка генерации: {response.status_code}")
+                return None
 
         except Exception as e:
             logger.error(f"Ошибка при генерации текста: {e}")
@@ -103,9 +192,10 @@ class OllamaClient:
             return None
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/api/embeddings",
+            async with self._get_semaphore(settings.EMBEDDING_MODEL):
+                response = await self._request(
+                    "POST",
+                    "/api/embeddings",
                     json={
                         "model": settings.EMBEDDING_MODEL,
                         "prompt": text
@@ -113,57 +203,143 @@ class OllamaClient:
                     timeout=30.0
                 )
 
-                if response.status_code == 200:
-                    result = response.json()
-                    return result.get("embedding", [])
-                else:
-                    logger.error(f"Ошибка получения embeddings: {response.status_code}")
-                    return None
+            if response.status_code == 200:
+                result = response.json()
+                return result.get("embedding", [])
+            else:
+                logger.error(f"Ошибка получения embeddings: {response.status_code}")
+                return None
 
         except Exception as e:
             logger.error(f"Ошибка при получении embeddings: {e}")
             return None
 
+    async def embed_batch(self, texts: List[str]) -> Optional[List[List[float]]]:
+        """
+        Получение embeddings для пачки текстов одним запросом (/api/embed)
+
+        Векторы возвращаются в том же порядке, что и тексты
+        """
+        if not self.enabled:
+            logger.warning("Ollama отключен в настройках")
+            return None
+
+        if not texts:
+            return []
+
+        try:
+            async with self._get_semaphore(settings.EMBEDDING_MODEL):
+                response = await self._request(
+                    "POST",
+                    "/api/embed",
+                    json={
+                        "model": settings.EMBEDDING_MODEL,
+                        "input": texts
+                    },
+                    timeout=settings.EMBEDDING_TIMEOUT
+                )
+
+            if response.status_code == 200:
+                embeddings = response.json().get("embeddings", [])
+                if len(embeddings) != len(texts):
+                    logger.error(
+                        f"Ollama вернул {len(embeddings)} embeddings вместо {len(texts)}"
+                    )
+                    return None
+                return embeddings
+            else:
+                logger.error(f"Ошибка получения embeddings: {response.status_code}")
+                return None
+
+        except Exception as e:
+            logger.error(f"Ошибка при пакетном получении embeddings: {e}")
+            return None
+
     async def ocr_document(self, pdf_path: str) -> Optional[str]:
         """
         OCR распознавание PDF документа
-        Конвертирует PDF в изображения и распознаёт каждую страницу
+
+        Страницы растрируются небольшими пачками (first_page/last_page) прямо
+        на диск, распознаются параллельно (не более OCR_CONCURRENCY страниц
+        одновременно) и собираются обратно в порядке страниц. Растеризация
+        опережает OCR не более чем на OCR_PREFETCH_BATCHES пачек, поэтому
+        расход памяти не зависит от количества страниц.
         """
         if not self.enabled:
             logger.warning("Ollama отключен в настройках")
             return None
 
         try:
-            from pdf2image import convert_from_path
+            from pdf2image import convert_from_path, pdfinfo_from_path
             import tempfile
             import os
 
             logger.info(f"Начало OCR обработки PDF: {pdf_path}")
 
-            # Конвертируем PDF в изображения
+            info = await asyncio.to_thread(pdfinfo_from_path, pdf_path)
+            total_pages = int(info.get("Pages", 0))
+            batch_size = max(1, settings.OCR_PAGE_BATCH_SIZE)
+            logger.info(f"PDF содержит {total_pages} страниц")
+
+            page_texts: Dict[int, str] = {}
+
             with tempfile.TemporaryDirectory() as temp_dir:
-                # Конвертация PDF в изображения (300 DPI для качественного OCR)
-                images = convert_from_path(pdf_path, dpi=300, output_folder=temp_dir)
-                logger.info(f"PDF конвертирован в {len(images)} изображений")
-
-                # OCR каждой страницы
-                full_text = []
-                for i, image in enumerate(images, 1):
-                    # Сохраняем изображение во временный файл
-                    temp_image_path = os.path.join(temp_dir, f"page_{i}.jpg")
-                    image.save(temp_image_path, 'JPEG')
-
-                    # Распознаём текст
-                    logger.info(f"OCR страницы {i}/{len(images)}")
-                    page_text = await self.ocr_image(temp_image_path)
-
-                    if page_text:
-                        full_text.append(f"=== Страница {i} ===\n{page_text}")
-
-                # Объединяем текст всех страниц
-                result = "\n\n".join(full_text)
-                logger.info(f"OCR завершён. Распознано {len(result)} символов")
-                return result
+                batches: asyncio.Queue = asyncio.Queue(maxsize=max(1, settings.OCR_PREFETCH_BATCHES))
+                fan_out = asyncio.Semaphore(max(1, settings.OCR_CONCURRENCY))
+
+                async def rasterize() -> None:
+                    """Конвертация PDF в изображения пачками (300 DPI для качественного OCR)"""
+                    try:
+                        for first_page in range(1, total_pages + 1, batch_size):
+                            last_page = min(first_page + batch_size - 1, total_pages)
+                            paths = await asyncio.to_thread(
+                                convert_from_path,
+                                pdf_path,
+                                dpi=300,
+                                first_page=first_page,
+                                last_page=last_page,
+                                output_folder=temp_dir,
+                                fmt="jpeg",
+                                paths_only=True
+                            )
+                            await batches.put(list(zip(range(first_page, last_page + 1), paths)))
+                    finally:
+                        await batches.put(None)
+
+                async def ocr_page(page_number: int, image_path: str) -> None:
+                    try:
+                        logger.info(f"OCR страницы {page_number}/{total_pages}")
+                        page_text = await self.ocr_image(image_path)
+                        if page_text:
+                            page_texts[page_number] = page_text
+                    finally:
+                        os.remove(image_path)
+                        fan_out.release()
+
+                producer = asyncio.create_task(rasterize())
+                tasks = []
+                try:
+                    while True:
+                        batch = await batches.get()
+                        if batch is None:
+                            break
+                        for page_number, image_path in batch:
+                            await fan_out.acquire()
+                            tasks.append(asyncio.create_task(ocr_page(page_number, image_path)))
+
+                    await asyncio.gather(*tasks)
+                    await producer
+                finally:
+                    for task in [producer, *tasks]:
+                        if not task.done():
+                            task.cancel()
+
+            # Объединяем текст всех страниц в исходном порядке
+            result = "\n\n".join(
+                f"=== Страница {i} ===\n{page_texts[i]}" for i in sorted(page_texts)
+            )
+            logger.info(f"OCR завершён. Распознано {len(result)} символов")
+            return result
 
         except Exception as e:
             logger.error(f"Ошибка при OCR обработке PDF: {e}")
@@ -0,0 +1,137 @@
+"""
+Пагинация списков: по номеру страницы (OFFSET) и по курсору (keyset)
+
+Курсор - непрозрачный токен со значениями ключа сортировки последней
+строки страницы. Следующая страница выбирается условием
+(sort_key, id) < (значения из курсора), поэтому стоимость запроса не
+зависит от глубины страницы. Общее количество можно не считать
+(include_total=false): для запросов без фильтров оно оценивается по
+pg_class.reltuples.
+"""
+import base64
+import binascii
+import json
+import math
+from datetime import date, datetime
+from typing import Any, List, Optional
+from fastapi import HTTPException, status
+from sqlalchemy import Date, DateTime, func, select, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+
+def encode_cursor(kind: str, values: List[Any]) -> str:
+    """Упаковка значений ключа сортировки в непрозрачный токен"""
+    payload = {
+        "k": kind,
+        "v": [v.isoformat() if isinstance(v, (date, datetime)) else v for v in values]
+    }
+    raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(kind: str, token: str, columns: list) -> List[Any]:
+    """Распаковка токена; чужой или повреждённый курсор - HTTP 400"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        if payload.get("k") != kind or len(payload["v"]) != len(columns):
+            raise ValueError("курсор от другого списка")
+
+        values = []
+        for column, value in zip(columns, payload["v"]):
+            if isinstance(column.type, DateTime):
+                value = datetime.fromisoformat(value)
+            elif isinstance(column.type, Date):
+                value = date.fromisoformat(value)
+            values.append(value)
+        return values
+    except (ValueError, KeyError, TypeError, AttributeError, binascii.Error):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный курсор пагинации"
+        )
+
+
+async def estimate_count(db: AsyncSession, table_name: str) -> Optional[int]:
+    """Оценка количества строк таблицы по статистике планировщика"""
+    result = await db.execute(
+        text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table_name)"),
+        {"table_name": table_name}
+    )
+    estimate = result.scalar()
+    # reltuples = -1, если таблица ещё ни разу не анализировалась
+    return max(int(estimate), 0) if estimate is not None else None
+
+
+async def paginate(
+    db: AsyncSession,
+    query: Select,
+    model,
+    sort_column,
+    descending: bool,
+    page: int,
+    size: int,
+    after: Optional[str] = None,
+    include_total: bool = True
+) -> dict:
+    """
+    Выполнение запроса списка с пагинацией
+
+    Сортировка по (sort_column, id) в одном направлении. Если передан
+    after, страница выбирается по курсору, иначе по номеру page.
+    Возвращает поля ответа *ListResponse.
+    """
+    kind = model.__tablename__
+    columns = [sort_column, model.id]
+    filtered = query.whereclause is not None
+
+    # Общее количество
+    total = None
+    total_is_estimate = False
+    if include_total:
+        count_query = select(func.count()).select_from(
+            query.with_only_columns(model.id).order_by(None).subquery()
+        )
+        total = (await db.execute(count_query)).scalar()
+    elif not filtered:
+        total = await estimate_count(db, kind)
+        total_is_estimate = total is not None
+
+    # Сортировка (id - для однозначного порядка при равных ключах)
+    if descending:
+        query = query.order_by(sort_column.desc(), model.id.desc())
+    else:
+        query = query.order_by(sort_column.asc(), model.id.asc())
+
+    if after:
+        values = decode_cursor(kind, after, columns)
+        key = tuple_(*columns)
+        query = query.where(key < tuple_(*values) if descending else key > tuple_(*values))
+    else:
+        query = query.offset((page - 1) * size)
+
+    # Лишняя строка показывает, есть ли следующая страница
+    result = await db.execute(query.limit(size + 1))
+    items = list(result.scalars().all())
+    has_more = len(items) > size
+    items = items[:size]
+
+    next_cursor = None
+    if has_more and items:
+        last = items[-1]
+        next_cursor = encode_cursor(kind, [getattr(last, c.key) for c in columns])
+
+    pages = None
+    if total is not None:
+        pages = math.ceil(total / size) if total > 0 else 1
+
+    return {
+        "items": items,
+        "total": total,
+        "total_is_estimate": total_is_estimate,
+        "page": page,
+        "size": size,
+        "pages": pages,
+        "next_cursor": next_cursor
+    }
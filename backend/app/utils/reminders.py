@@ -0,0 +1,238 @@
+"""
+Отправка email напоминаний о событиях дел
+
+Время напоминания хранится в case_events.remind_at (триггер БД, миграция
+012), неотправленные напоминания покрывает частичный индекс
+WHERE reminder_sent = false. Задача APScheduler раз в
+REMINDER_CHECK_INTERVAL секунд забирает пачку наступивших напоминаний
+через SELECT ... FOR UPDATE SKIP LOCKED, отправляет письма через одно
+SMTP соединение и одним UPDATE отмечает пачку отправленной.
+"""
+import logging
+from datetime import datetime, timezone
+from email.message import EmailMessage
+from typing import Dict, List, Optional, Tuple
+import aiosmtplib
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from sqlalchemy import select, update
+from sqlalchemy.orm import aliased
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.case import Case
+from app.models.case_event import CaseEvent
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+EVENT_TYPE_NAMES = {
+    "court_hearing": "Судебное заседание",
+    "document_deadline": "Срок подачи документов",
+    "consultation": "Консультация",
+    "payment_deadline": "Срок оплаты",
+    "case_deadline": "Срок по делу",
+    "custom": "Событие",
+}
+
+
+def build_reminder_message(event: CaseEvent, case_number: str, recipients: List[str]) -> EmailMessage:
+    """Письмо-напоминание о событии"""
+    event_name = EVENT_TYPE_NAMES.get(event.event_type, event.event_type)
+    event_date = event.event_date.astimezone().strftime('%d.%m.%Y %H:%M')
+
+    message = EmailMessage()
+    message["From"] = settings.SMTP_FROM
+    message["To"] = ", ".join(recipients)
+    message["Subject"] = f"Напоминание: {event_name} по делу {case_number} - {event_date}"
+
+    lines = [
+        f"{event_name} по делу {case_number}",
+        f"Дата: {event_date}",
+    ]
+    if event.location:
+        lines.append(f"Место: {event.location}")
+    lines.extend(["", event.description])
+    message.set_content("\n".join(lines))
+    return message
+
+
+def _is_permanent(error: aiosmtplib.SMTPException) -> bool:
+    """Постоянный отказ: код 5xx (для отказа получателям - у всех получателей)"""
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        return bool(error.recipients) and all(r.code >= 500 for r in error.recipients)
+    return isinstance(error, aiosmtplib.SMTPResponseException) and error.code >= 500
+
+
+class ReminderDispatcher:
+    """Периодическая отправка наступивших напоминаний"""
+
+    def __init__(self):
+        self._scheduler: Optional[AsyncIOScheduler] = None
+
+        # Статистика для /health
+        self.sent = 0
+        self.skipped = 0
+        self.rejected = 0
+        self.failures = 0
+        self.last_run: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+
+    async def start(self) -> None:
+        """Запуск задачи (вызывается при старте приложения)"""
+        if self._scheduler:
+            return
+        if not settings.REMINDER_ENABLED or not settings.SMTP_HOST:
+            logger.info("Email напоминания отключены (REMINDER_ENABLED или SMTP_HOST не заданы)")
+            return
+
+        self._scheduler = AsyncIOScheduler()
+        self._scheduler.add_job(
+            self.dispatch_due,
+            "interval",
+            seconds=settings.REMINDER_CHECK_INTERVAL,
+            id="event_reminders",
+            max_instances=1,
+            coalesce=True,
+            next_run_time=datetime.now(timezone.utc)
+        )
+        self._scheduler.start()
+        logger.info(f"Отправка напоминаний запущена (каждые {settings.REMINDER_CHECK_INTERVAL} с)")
+
+    async def stop(self) -> None:
+        """Остановка задачи (вызывается при остановке приложения)"""
+        if self._scheduler:
+            self._scheduler.shutdown(wait=False)
+            self._scheduler = None
+            logger.info("Отправка напоминаний остановлена")
+
+    async def dispatch_due(self) -> int:
+        """Отправка всех наступивших напоминаний пачками, возвращает число писем"""
+        self.last_run = datetime.now(timezone.utc)
+        total = 0
+        try:
+            while True:
+                claimed, done, sent = await self._dispatch_batch()
+                total += sent
+                # Пачка неполная или ни одно напоминание не удалось закрыть - до следующего запуска
+                if claimed < settings.REMINDER_BATCH_SIZE or not done:
+                    break
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            logger.error(f"Ошибка отправки напоминаний: {e}")
+
+        if total:
+            logger.info(f"Отправлено напоминаний: {total}")
+        return total
+
+    async def _dispatch_batch(self) -> Tuple[int, int, int]:
+        """
+        Одна пачка: захват, отправка, отметка
+
+        Строки остаются заблокированными до commit, поэтому второй экземпляр
+        приложения пропускает их (SKIP LOCKED) и не отправит письма повторно.
+        Возвращает (захвачено, отмечено, отправлено).
+        """
+        now = datetime.now(timezone.utc)
+        event_author = aliased(User)
+        case_author = aliased(User)
+
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(CaseEvent, Case.case_number, event_author.email, case_author.email)
+                .join(Case, CaseEvent.case_id == Case.id)
+                .outerjoin(event_author, (event_author.id == CaseEvent.created_by) & event_author.is_active)
+                .outerjoin(case_author, (case_author.id == Case.created_by) & case_author.is_active)
+                .where(CaseEvent.reminder_sent == False, CaseEvent.remind_at <= now)  # noqa: E712
+                .order_by(CaseEvent.remind_at)
+                .limit(settings.REMINDER_BATCH_SIZE)
+                .with_for_update(of=CaseEvent, skip_locked=True)
+            )
+            rows = result.all()
+            if not rows:
+                return 0, 0, 0
+
+            # Прошедшие и отменённые события отмечаются без письма
+            messages: Dict[int, EmailMessage] = {}
+            done_ids = []
+            for event, case_number, event_email, case_email in rows:
+                recipients = sorted({email for email in (event_email, case_email) if email})
+                if event.event_status != "scheduled" or event.event_date <= now or not recipients:
+                    done_ids.append(event.id)
+                    self.skipped += 1
+                    continue
+                messages[event.id] = build_reminder_message(event, case_number, recipients)
+
+            sent_ids, rejected_ids = await self._send(messages) if messages else ([], [])
+            done_ids.extend(sent_ids)
+            done_ids.extend(rejected_ids)
+
+            if done_ids:
+                await db.execute(
+                    update(CaseEvent)
+                    .where(CaseEvent.id.in_(done_ids))
+                    .values(reminder_sent=True)
+                )
+            await db.commit()
+
+        return len(rows), len(done_ids), len(sent_ids)
+
+    async def _send(self, messages: Dict[int, EmailMessage]) -> Tuple[List[int], List[int]]:
+        """
+        Отправка писем через одно SMTP соединение
+
+        Возвращает (отправлено, отклонено навсегда). Постоянный отказ сервера
+        (5xx, например несуществующий адрес) отмечает напоминание закрытым -
+        иначе такие строки повторялись бы бесконечно и, стоя первыми по
+        remind_at, вытесняли бы новые напоминания. Временный отказ (4xx)
+        оставляет напоминание до следующего запуска; обрыв соединения
+        и отказ отправителя прерывают отправку остатка пачки.
+        """
+        sent_ids = []
+        rejected_ids = []
+        smtp = aiosmtplib.SMTP(
+            hostname=settings.SMTP_HOST,
+            port=settings.SMTP_PORT,
+            start_tls=settings.SMTP_TLS
+        )
+        async with smtp:
+            if settings.SMTP_USER:
+                await smtp.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+
+            for event_id, message in messages.items():
+                try:
+                    await smtp.send_message(message)
+                    sent_ids.append(event_id)
+                    self.sent += 1
+                except (aiosmtplib.SMTPRecipientsRefused, aiosmtplib.SMTPDataError) as e:
+                    self.last_error = str(e)
+                    if _is_permanent(e):
+                        rejected_ids.append(event_id)
+                        self.rejected += 1
+                        logger.warning(f"Напоминание о событии {event_id} отклонено сервером: {e}")
+                    else:
+                        self.failures += 1
+                        logger.warning(f"Напоминание о событии {event_id} не отправлено, повтор позже: {e}")
+                except aiosmtplib.SMTPException as e:
+                    # Соединение потеряно или отправитель не принят: уже отправленные письма всё равно отмечаются
+                    self.failures += 1
+                    self.last_error = str(e)
+                    logger.error(f"SMTP отправка прервана: {e}")
+                    break
+
+        return sent_ids, rejected_ids
+
+    def get_stats(self) -> dict:
+        """Статистика для /health"""
+        return {
+            "running": self._scheduler is not None,
+            "sent": self.sent,
+            "skipped": self.skipped,
+            "rejected": self.rejected,
+            "failures": self.failures,
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+            "last_error": self.last_error
+        }
+
+
+# Глобальный экземпляр
+reminder_dispatcher = ReminderDispatcher()
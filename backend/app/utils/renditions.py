@@ -0,0 +1,255 @@
+"""
+Миниатюры и изображения страниц документов
+
+Страница PDF (pdf2image/poppler) или изображение (Pillow) уменьшается до
+ширины выбранного размера и сохраняется в WebP в дисковом кеше
+STORAGE_PATH/cache/renditions. Ключ кеша - SHA-256 содержимого документа,
+поэтому одинаковые файлы разделяют миниатюры, а изменение файла
+автоматически даёт новый ключ (и новый ETag).
+
+Миниатюра первой страницы строится в фоне сразу после загрузки, остальные
+страницы и размеры - при первом запросе. Кеш ограничен
+RENDITION_CACHE_MAX_SIZE, при превышении вытесняются давно не
+запрашивавшиеся файлы (LRU по mtime).
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Optional, Set
+from PIL import Image, ImageOps
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Ширина в пикселях для ?size=
+RENDITION_SIZES = {
+    "thumb": 240,
+    "medium": 640,
+    "large": 1280,
+}
+
+# Формат документа -> способ растеризации
+PDF_FORMATS = {"PDF"}
+IMAGE_FORMATS = {"JPG", "JPEG", "PNG"}
+
+# Меняется при изменении алгоритма: старые миниатюры перестают совпадать по ключу
+RENDITION_VERSION = 1
+
+WEBP_QUALITY = 80
+
+# Только что созданные файлы не вытесняются (их может отдавать соседний запрос)
+EVICTION_GRACE_SECONDS = 60
+
+# Очистка начинается при превышении лимита и освобождает место до этой доли
+EVICTION_TARGET_RATIO = 0.9
+
+
+class PageNotFound(Exception):
+    """Запрошенной страницы нет в документе"""
+
+
+def is_renderable(file_format: Optional[str]) -> bool:
+    return (file_format or "").upper() in PDF_FORMATS | IMAGE_FORMATS
+
+
+def render_page(source: Path, file_format: str, page: int, width: int, output: Path) -> None:
+    """Растеризация страницы в WebP заданной ширины (выполняется в потоке)"""
+    file_format = file_format.upper()
+
+    if file_format in PDF_FORMATS:
+        from pdf2image import convert_from_path
+
+        # poppler растеризует сразу в нужный размер, без полноразмерной страницы в памяти
+        images = convert_from_path(
+            str(source),
+            first_page=page,
+            last_page=page,
+            size=(width, None)
+        )
+        if not images:
+            raise PageNotFound(page)
+        image = images[0]
+    else:
+        if page != 1:
+            raise PageNotFound(page)
+        image = Image.open(source)
+        # JPEG декодируется сразу в уменьшенном масштабе
+        image.draft("RGB", (width, width * 4))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((width, width * 4))
+
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    image.save(output, "WEBP", quality=WEBP_QUALITY, method=4)
+
+
+class RenditionCache:
+    """Дисковый кеш миниатюр страниц с ограничением размера (LRU)"""
+
+    def __init__(self):
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # Сколько запросов держат или ждут блокировку ключа
+        self._lock_users: Dict[str, int] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._warm_tasks: Set[asyncio.Task] = set()
+        self._total_size: Optional[int] = None
+
+        # Статистика для /health
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def get_cache_dir() -> Path:
+        cache_dir = Path(settings.STORAGE_PATH) / "cache" / "renditions"
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        return cache_dir
+
+    @staticmethod
+    def cache_key(content_hash: str, page: int, size: str) -> str:
+        """Ключ миниатюры; он же ETag ответа"""
+        return f"{content_hash}_p{page}_{size}_v{RENDITION_VERSION}"
+
+    def cache_path(self, key: str) -> Path:
+        return self.get_cache_dir() / key[:2] / f"{key}.webp"
+
+    async def get_or_render(
+        self,
+        source: Path,
+        file_format: str,
+        content_hash: str,
+        page: int,
+        size: str
+    ) -> Path:
+        """
+        Путь к готовой миниатюре; при промахе она строится в потоке
+
+        Одновременные запросы одной и той же миниатюры ждут одну растеризацию,
+        растеризаций одновременно - не больше RENDITION_CONCURRENCY
+        """
+        key = self.cache_key(content_hash, page, size)
+        path = self.cache_path(key)
+
+        if self._touch(path):
+            self.hits += 1
+            return path
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(max(1, settings.RENDITION_CONCURRENCY))
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._lock_users[key] = self._lock_users.get(key, 0) + 1
+        try:
+            async with lock:
+                if self._touch(path):
+                    self.hits += 1
+                    return path
+
+                self.misses += 1
+                path.parent.mkdir(parents=True, exist_ok=True)
+                temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.part")
+                try:
+                    async with self._semaphore:
+                        await asyncio.to_thread(
+                            render_page, source, file_format, page, RENDITION_SIZES[size], temp_path
+                        )
+                    os.replace(temp_path, path)
+                finally:
+                    temp_path.unlink(missing_ok=True)
+        finally:
+            # Удаляет последний пользователь: пока блокировку ждут, новый запрос
+            # должен встать в ту же очередь (lock.locked() сбрасывается release()
+            # раньше, чем ожидающий её получит)
+            self._lock_users[key] -= 1
+            if not self._lock_users[key]:
+                del self._lock_users[key]
+                del self._locks[key]
+
+        await self._account(path.stat().st_size)
+        return path
+
+    def warm(self, source: Path, file_format: str, content_hash: str) -> None:
+        """Фоновое построение миниатюры первой страницы (после загрузки документа)"""
+        if not is_renderable(file_format) or not content_hash:
+            return
+
+        async def run() -> None:
+            try:
+                await self.get_or_render(source, file_format, content_hash, 1, "thumb")
+            except Exception as e:
+                logger.warning(f"Не удалось построить миниатюру {content_hash[:12]}: {e}")
+
+        task = asyncio.create_task(run())
+        self._warm_tasks.add(task)
+        task.add_done_callback(self._warm_tasks.discard)
+
+    @staticmethod
+    def _touch(path: Path) -> bool:
+        """Отметка использования (mtime) для LRU; False, если миниатюры нет"""
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    async def _account(self, added: int) -> None:
+        """
+        Учёт размера кеша; при превышении лимита - вытеснение
+
+        Полный обход каталога - только при первом обращении и при очистке,
+        между ними размер считается по добавленным файлам
+        """
+        if self._total_size is None:
+            self._total_size = await asyncio.to_thread(self._scan_size)
+        else:
+            self._total_size += added
+
+        if self._total_size > settings.RENDITION_CACHE_MAX_SIZE:
+            self._total_size = await asyncio.to_thread(self._evict)
+
+    def _scan_size(self) -> int:
+        return sum(path.stat().st_size for path in self.get_cache_dir().glob("*/*.webp"))
+
+    def _evict(self) -> int:
+        """Удаление давно не запрашивавшихся миниатюр, возвращает новый размер кеша"""
+        entries = []
+        total_size = 0
+        for path in self.get_cache_dir().glob("*/*.webp"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total_size += stat.st_size
+
+        target = settings.RENDITION_CACHE_MAX_SIZE * EVICTION_TARGET_RATIO
+        recent = time.time() - EVICTION_GRACE_SECONDS
+        for mtime, size, path in sorted(entries):
+            if total_size <= target:
+                break
+            if mtime > recent:
+                continue
+            path.unlink(missing_ok=True)
+            total_size -= size
+            self.evictions += 1
+
+        logger.info(f"Кеш миниатюр: размер после очистки {total_size / 1024 / 1024:.1f} МБ")
+        return total_size
+
+    def get_stats(self) -> dict:
+        """Статистика кеша для /health"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else None,
+            "evictions": self.evictions,
+            "size": self._total_size
+        }
+
+
+# Глобальный экземпляр кеша
+rendition_cache = RenditionCache()
@@ -0,0 +1,368 @@
+"""
+Генерация PDF отчётов и дисковый кеш готовых отчётов
+
+reportlab работает синхронно и нагружает CPU, поэтому отчёт строится в
+отдельном потоке (asyncio.to_thread). Готовый PDF сохраняется в
+STORAGE_PATH/cache/reports под ключом «объект + хеш данных»: пока
+данные не изменились, повторные запросы отдаются прямо с диска.
+Суммарный размер кеша ограничен REPORT_CACHE_MAX_SIZE, при превышении
+удаляются давно не запрашивавшиеся отчёты (LRU по mtime).
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import uuid
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional, Tuple
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Увеличивается при изменении оформления отчётов - старый кеш становится неактуальным
+REPORT_VERSION = 2
+
+# Отчёты, запрошенные недавно, не вытесняются: их может отдавать FileResponse
+EVICTION_GRACE_SECONDS = 60
+
+# Строк в одной таблице PDF (примерно страница): длинные таблицы reportlab
+# делит по страницам очень медленно, поэтому большие разделы выводятся
+# серией небольших таблиц
+TABLE_CHUNK_ROWS = 40
+
+# Максимальная длина текста в ячейке таблицы
+CELL_TEXT_LIMIT = 500
+
+
+# TTF шрифты с кириллицей (встроенный Helvetica её не содержит)
+FONT_CANDIDATES = [
+    ("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"),
+    ("/usr/share/fonts/TTF/DejaVuSans.ttf", "/usr/share/fonts/TTF/DejaVuSans-Bold.ttf"),
+    ("/usr/share/fonts/dejavu/DejaVuSans.ttf", "/usr/share/fonts/dejavu/DejaVuSans-Bold.ttf"),
+]
+
+
+@lru_cache(maxsize=1)
+def register_fonts() -> Tuple[str, str]:
+    """Регистрация шрифта с кириллицей. Возвращает (обычный, жирный)"""
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    for regular, bold in FONT_CANDIDATES:
+        if Path(regular).exists() and Path(bold).exists():
+            pdfmetrics.registerFont(TTFont("ReportSans", regular))
+            pdfmetrics.registerFont(TTFont("ReportSans-Bold", bold))
+            return "ReportSans", "ReportSans-Bold"
+
+    logger.warning("Шрифт DejaVuSans не найден - кириллица в PDF отображаться не будет")
+    return "Helvetica", "Helvetica-Bold"
+
+
+def _format_date(value) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, datetime):
+        return value.strftime('%d.%m.%Y %H:%M')
+    return value.strftime('%d.%m.%Y')
+
+
+def _format_size(size: Optional[int]) -> str:
+    if not size:
+        return "-"
+    if size < 1024 * 1024:
+        return f"{size / 1024:.0f} КБ"
+    return f"{size / 1024 / 1024:.1f} МБ"
+
+
+class StreamingDocTemplate:
+    """
+    Обёртка над SimpleDocTemplate, получающая flowables из генератора
+
+    reportlab перед вёрсткой каждого элемента вызывает filterFlowables -
+    в этот момент список пополняется из генератора. Поэтому в памяти
+    одновременно находятся только несколько ближайших элементов, а не вся
+    история документа.
+    """
+
+    # Сколько элементов держать в очереди перед вёрсткой очередного
+    LOOKAHEAD = 4
+
+    def __init__(self, pdf_path: Path, flowables: Iterator, **kwargs):
+        from reportlab.platypus import SimpleDocTemplate
+
+        wrapper = self
+
+        class _Template(SimpleDocTemplate):
+            def filterFlowables(self, queue):
+                # reportlab вызывает хук и для служебных списков - пополняем только основной
+                if queue is wrapper._queue:
+                    wrapper._refill()
+
+        self._doc = _Template(str(pdf_path), **kwargs)
+        self._source = flowables
+        self._queue: list = []
+
+    def _refill(self) -> None:
+        while len(self._queue) < self.LOOKAHEAD:
+            flowable = next(self._source, None)
+            if flowable is None:
+                break
+            self._queue.append(flowable)
+
+    def build(self) -> None:
+        self._refill()
+        self._doc.build(self._queue)
+
+
+def _dossier_flowables(data: dict) -> Iterator:
+    """Элементы досье дела по порядку (генератор)"""
+    from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib import colors
+    from reportlab.lib.units import cm
+    from xml.sax.saxutils import escape
+
+    font, font_bold = register_fonts()
+    styles = getSampleStyleSheet()
+
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontName=font_bold,
+        fontSize=16,
+        spaceAfter=30,
+    )
+    heading_style = ParagraphStyle('CustomHeading', parent=styles['Heading2'], fontName=font_bold)
+    body_style = ParagraphStyle('CustomBody', parent=styles['BodyText'], fontName=font)
+    cell_style = ParagraphStyle('Cell', parent=body_style, fontSize=8, leading=10)
+
+    def cell(value, max_chars: int = 0):
+        """Ячейка: короткий текст - строкой, длинный - Paragraph с переносом строк"""
+        text = "-" if value is None or value == "" else str(value)
+        if len(text) <= max_chars:
+            return text
+        if len(text) > CELL_TEXT_LIMIT:
+            text = text[:CELL_TEXT_LIMIT] + "..."
+        return Paragraph(escape(text), cell_style)
+
+    table_style = TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), font),
+        ('FONTNAME', (0, 0), (-1, 0), font_bold),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ])
+
+    def section(title: str, header: list, widths: list, rows: list, format_row=tuple) -> Iterator:
+        # Сколько символов помещается в колонку без переноса (~0.5 кегля на символ)
+        max_chars = [int((w * cm - 6) / 4.8) for w in widths]
+
+        yield Paragraph(f"{escape(title)} ({len(rows)})", heading_style)
+        if not rows:
+            yield Paragraph("Нет данных", body_style)
+        for start in range(0, len(rows), TABLE_CHUNK_ROWS):
+            chunk = [
+                [cell(v, limit) for v, limit in zip(format_row(row), max_chars)]
+                for row in rows[start:start + TABLE_CHUNK_ROWS]
+            ]
+            table = Table([header] + chunk, colWidths=[w * cm for w in widths], repeatRows=1)
+            table.setStyle(table_style)
+            yield table
+        yield Spacer(1, 0.5*cm)
+
+    case = data["case"]
+    yield Paragraph(f"Досье дела №{escape(case['case_number'])}", title_style)
+
+    # Основная информация
+    info_data = [
+        ["Номер дела:", case['case_number']],
+        ["Префикс:", case['case_prefix']],
+        ["Тип дела:", case['case_type']],
+        ["Статус:", case['case_status']],
+        ["Название:", cell(case['title'])],
+        ["Истец:", case['plaintiff'] or "-"],
+        ["Ответчик:", case['defendant'] or "-"],
+        ["Суд:", case['court'] or "-"],
+        ["Судья:", case['judge'] or "-"],
+        ["Дата открытия:", _format_date(case['open_date'])],
+        ["Дата закрытия:", _format_date(case['close_date'])],
+    ]
+    info_table = Table(info_data, colWidths=[5*cm, 12*cm])
+    info_table.setStyle(TableStyle([('FONTNAME', (0, 0), (-1, -1), font)]))
+    yield info_table
+    yield Spacer(1, 1*cm)
+
+    # Описание
+    if case['description']:
+        yield Paragraph("<b>Описание:</b>", heading_style)
+        yield Paragraph(escape(case['description']), body_style)
+        yield Spacer(1, 0.5*cm)
+
+    yield from section(
+        "Участники",
+        ["ФИО", "Тип", "Роль", "IDNP", "Телефон", "Примечание"],
+        [4.5, 2, 2.5, 2.5, 2.5, 3.5],
+        data["persons"]
+    )
+    yield from section(
+        "Документы",
+        ["Дата", "Файл", "Тип", "Размер", "Описание"],
+        [2, 5, 2.5, 1.8, 6.2],
+        data["documents"],
+        lambda d: (_format_date(d[0] or d[1].date()), d[2], d[3], _format_size(d[4]), d[5])
+    )
+    yield from section(
+        "События",
+        ["Дата", "Тип", "Статус", "Место", "Описание"],
+        [2.6, 2.4, 2.2, 3.3, 7],
+        data["events"],
+        lambda e: (_format_date(e[0]), *e[1:])
+    )
+    yield from section(
+        "Законодательство",
+        ["Тип", "Номер", "Дата", "Название", "Примечание"],
+        [2.5, 2.2, 2, 6.3, 4.5],
+        data["legal_acts"],
+        lambda la: (la[0], la[1], _format_date(la[2]), la[3], la[4])
+    )
+
+
+def render_case_dossier(data: dict, pdf_path: Path) -> None:
+    """
+    Построение PDF досье дела (выполняется в потоке)
+
+    data: {"case": dict полей дела, "persons", "documents", "events",
+    "legal_acts": списки кортежей} - см. reports.generate_case_report_pdf
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import cm
+
+    StreamingDocTemplate(
+        pdf_path,
+        _dossier_flowables(data),
+        pagesize=A4,
+        leftMargin=1.5*cm,
+        rightMargin=1.5*cm
+    ).build()
+
+
+def dossier_version(data: dict) -> str:
+    """Версия данных досье: хеш всех выводимых значений"""
+    digest = hashlib.sha256(repr(data).encode()).hexdigest()[:24]
+    return f"v{REPORT_VERSION}_{digest}"
+
+
+class ReportCache:
+    """Дисковый кеш PDF отчётов с ограничением размера (LRU)"""
+
+    def __init__(self):
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+        # Статистика для /health
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def get_cache_dir() -> Path:
+        cache_dir = Path(settings.STORAGE_PATH) / "cache" / "reports"
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        return cache_dir
+
+    async def get_or_render(
+        self,
+        kind: str,
+        object_id: int,
+        version: str,
+        render: Callable[[Path], None]
+    ) -> Path:
+        """
+        Путь к готовому отчёту; при промахе отчёт строится в потоке
+
+        Одновременные запросы одного и того же отчёта ждут одну генерацию
+        """
+        path = self.get_cache_dir() / f"{kind}_{object_id}_{version}.pdf"
+
+        if self._touch(path):
+            self.hits += 1
+            return path
+
+        lock = self._locks.setdefault(path.name, asyncio.Lock())
+        try:
+            async with lock:
+                if self._touch(path):
+                    self.hits += 1
+                    return path
+
+                self.misses += 1
+                temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.part")
+                try:
+                    await asyncio.to_thread(render, temp_path)
+                    os.replace(temp_path, path)
+                finally:
+                    temp_path.unlink(missing_ok=True)
+        finally:
+            self._locks.pop(path.name, None)
+
+        await asyncio.to_thread(self._cleanup, kind, object_id, path)
+        return path
+
+    @staticmethod
+    def _touch(path: Path) -> bool:
+        """Отметка использования (mtime) для LRU; False, если отчёта нет"""
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _cleanup(self, kind: str, object_id: int, keep: Path) -> None:
+        """Удаление устаревших версий отчёта и вытеснение по размеру кеша"""
+        cache_dir = keep.parent
+
+        for old in cache_dir.glob(f"{kind}_{object_id}_*.pdf"):
+            if old != keep:
+                old.unlink(missing_ok=True)
+
+        entries = []
+        total_size = 0
+        for path in cache_dir.glob("*.pdf"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total_size += stat.st_size
+
+        if total_size <= settings.REPORT_CACHE_MAX_SIZE:
+            return
+
+        recent = time.time() - EVICTION_GRACE_SECONDS
+        for mtime, size, path in sorted(entries):
+            if total_size <= settings.REPORT_CACHE_MAX_SIZE:
+                break
+            if path == keep or mtime > recent:
+                continue
+            path.unlink(missing_ok=True)
+            total_size -= size
+            self.evictions += 1
+
+        logger.info(f"Кеш отчётов: размер после очистки {total_size / 1024 / 1024:.1f} МБ")
+
+    def get_stats(self) -> dict:
+        """Статистика кеша для /health"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else None,
+            "evictions": self.evictions
+        }
+
+
+# Глобальный экземпляр кеша
+report_cache = ReportCache()
@@ -1,14 +1,33 @@
 """
 Утилиты для безопасности (JWT, хеширование паролей)
 """
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 import jwt
 from jwt.exceptions import PyJWTError
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
 from app.config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Хеши с другим числом раундов считаются устаревшими и пересчитываются при входе
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS
+)
+
+# bcrypt занимает CPU сотни миллисекунд: выполняется в отдельном пуле потоков,
+# чтобы не блокировать event loop. Пул ограничен, а очередь ожидающих задач
+# ограничена семафором - при её переполнении запрос сразу получает 503
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="bcrypt"
+)
+_hash_slots: Optional[asyncio.Semaphore] = None
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -21,6 +40,40 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def _run_hashing(func, *args):
+    """Выполнение bcrypt в пуле потоков с ограничением очереди"""
+    global _hash_slots
+    if _hash_slots is None:
+        _hash_slots = asyncio.Semaphore(settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE_SIZE)
+
+    if _hash_slots.locked():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Сервер перегружен запросами входа. Повторите попытку через несколько секунд",
+            headers={"Retry-After": "5"}
+        )
+
+    async with _hash_slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor, func, *args)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Проверка пароля вне event loop
+
+    Возвращает (пароль верен, новый хеш). Новый хеш не None, если
+    сохранённый хеш устарел (например, изменился BCRYPT_ROUNDS) -
+    его нужно записать вместо старого.
+    """
+    return await _run_hashing(pwd_context.verify_and_update, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """Хеширование пароля вне event loop"""
+    return await _run_hashing(pwd_context.hash, password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Создание access token"""
     to_encode = data.copy()
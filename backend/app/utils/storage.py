@@ -0,0 +1,387 @@
+"""
+Потоковый приём загружаемых файлов
+
+Файл читается из UploadFile частями фиксированного размера: тип
+определяется по первым килобайтам (magic bytes), SHA-256 считается по ходу
+чтения, превышение MAX_FILE_SIZE прерывает загрузку сразу. Данные пишутся
+во временный файл в STORAGE_PATH/tmp, который затем атомарно
+переименовывается в конечный путь.
+
+Документы хранятся контентно-адресуемо: STORAGE_PATH/documents/blobs/ab/cd/<sha256>.
+Одинаковые файлы хранятся один раз, таблица storage_blobs считает ссылки.
+
+Файл на диске никогда не удаляется раньше, чем закоммичена транзакция,
+освободившая последнюю ссылку: удаление выполняется после коммита
+(событие after_commit сессии) и отменяется при откате. Файл, оставшийся
+без строки storage_blobs (откат загрузки, сбой между коммитом и
+удалением), - мусор, который периодически удаляет sweep_orphans().
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+import aiofiles
+import aiofiles.os
+import magic
+from fastapi import HTTPException, UploadFile, status
+from sqlalchemy import delete, event, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.storage_blob import StorageBlob
+
+logger = logging.getLogger(__name__)
+
+# Размер части, читаемой из UploadFile за один раз
+CHUNK_SIZE = 1024 * 1024
+
+# Сколько первых байт используется для определения типа файла
+SNIFF_SIZE = 8 * 1024
+
+# Ключ session.info: файлы, которые удаляются после коммита сессии
+PENDING_DELETES_KEY = "blob_store_pending_deletes"
+
+# Файл без строки storage_blobs моложе этого возраста не трогается:
+# его загрузка может быть ещё не закоммичена
+ORPHAN_GRACE_SECONDS = 3600
+
+# Секунды между поисками брошенных файлов
+SWEEP_INTERVAL = 24 * 3600
+
+# Хешей в одном запросе при поиске брошенных файлов
+SWEEP_BATCH_SIZE = 500
+
+
+class UploadedFile(NamedTuple):
+    """Принятый файл во временном хранилище"""
+    temp_path: Path
+    file_size: int
+    sha256: str
+    mime_type: str
+
+
+def get_temp_dir() -> Path:
+    """Каталог временных файлов (на том же разделе, что и хранилище)"""
+    temp_dir = Path(settings.STORAGE_PATH) / "tmp"
+    temp_dir.mkdir(parents=True, exist_ok=True)
+    return temp_dir
+
+
+def detect_mime_type(head: bytes, allowed_formats: Optional[Dict[str, str]] = None) -> str:
+    """
+    Определение типа файла по magic bytes (не только по расширению!)
+
+    Если передан allowed_formats ({mime: extension}), недопустимый тип
+    приводит к HTTP 400
+    """
+    detected_mime = magic.Magic(mime=True).from_buffer(head)
+
+    if allowed_formats is not None and detected_mime not in allowed_formats:
+        allowed = ", ".join(ext.lstrip('.').upper() for ext in allowed_formats.values())
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Недопустимый тип файла: {detected_mime}. Разрешены: {allowed}"
+        )
+
+    return detected_mime
+
+
+async def receive_upload(
+    file: UploadFile,
+    allowed_formats: Optional[Dict[str, str]] = None,
+    max_size: Optional[int] = None
+) -> UploadedFile:
+    """
+    Потоковое чтение загруженного файла во временный файл
+
+    В памяти одновременно находится не больше одной части (CHUNK_SIZE)
+    """
+    max_size = max_size or settings.MAX_FILE_SIZE
+    temp_path = get_temp_dir() / f"upload_{uuid.uuid4().hex}.part"
+
+    hasher = hashlib.sha256()
+    file_size = 0
+    head = b""
+    mime_type = None
+
+    try:
+        async with aiofiles.open(temp_path, 'wb') as f:
+            while True:
+                chunk = await file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+
+                file_size += len(chunk)
+                if file_size > max_size:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"Файл слишком большой. Максимальный размер: {max_size / 1024 / 1024:.0f} МБ"
+                    )
+
+                # Проверка типа, как только набрано достаточно байт
+                if mime_type is None:
+                    head += chunk[:SNIFF_SIZE - len(head)]
+                    if len(head) >= SNIFF_SIZE:
+                        mime_type = detect_mime_type(head, allowed_formats)
+
+                hasher.update(chunk)
+                await f.write(chunk)
+
+        # Файл меньше SNIFF_SIZE
+        if mime_type is None:
+            mime_type = detect_mime_type(head, allowed_formats)
+
+    except BaseException:
+        await discard_upload(temp_path)
+        raise
+
+    return UploadedFile(
+        temp_path=temp_path,
+        file_size=file_size,
+        sha256=hasher.hexdigest(),
+        mime_type=mime_type
+    )
+
+
+async def commit_upload(uploaded: UploadedFile, destination: Path) -> Path:
+    """Атомарное перемещение принятого файла в конечный путь"""
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    await aiofiles.os.replace(uploaded.temp_path, destination)
+    return destination
+
+
+async def discard_upload(temp_path: Path) -> None:
+    """Удаление временного файла (ошибки игнорируются)"""
+    try:
+        await aiofiles.os.remove(temp_path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"Не удалось удалить временный файл {temp_path}: {e}")
+
+
+class BlobStore:
+    """
+    Контентно-адресуемое хранилище документов с подсчётом ссылок
+
+    Ссылка учитывается в той же транзакции, что и запись документа.
+    Загрузка и удаление файла с одним хешем сериализуются
+    транзакционной advisory-блокировкой по хешу: файл не удаляется, пока
+    параллельная загрузка того же содержимого не закоммичена, и наоборот.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._delete_tasks: Set[asyncio.Task] = set()
+
+        # Статистика для /health
+        self.dedup_hits = 0
+        self.dedup_misses = 0
+        self.bytes_saved = 0
+        self.files_deleted = 0
+        self.orphans_deleted = 0
+
+    @staticmethod
+    def relative_path(sha256: str) -> str:
+        """Путь файла относительно STORAGE_PATH/documents"""
+        return f"blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+    @classmethod
+    def full_path(cls, sha256: str) -> Path:
+        return Path(settings.STORAGE_PATH) / "documents" / cls.relative_path(sha256)
+
+    @staticmethod
+    async def lock(db: AsyncSession, hashes: Iterable[str]) -> None:
+        """Блокировка хешей до конца транзакции (в порядке сортировки - без взаимных блокировок)"""
+        for sha256 in sorted(set(hashes)):
+            await db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:sha256))"), {"sha256": sha256})
+
+    async def store(self, db: AsyncSession, uploaded: UploadedFile) -> bool:
+        """
+        Помещение принятого файла в хранилище и увеличение счётчика ссылок
+
+        Возвращает True, если такой файл уже был (дубликат не записывается).
+        Коммит выполняет вызывающий код; при откате записанный файл
+        остаётся без ссылки и удаляется sweep_orphans().
+        """
+        await self.lock(db, [uploaded.sha256])
+        await db.execute(
+            insert(StorageBlob)
+            .values(sha256=uploaded.sha256, file_size=uploaded.file_size, ref_count=1)
+            .on_conflict_do_update(
+                index_elements=[StorageBlob.sha256],
+                set_={"ref_count": StorageBlob.ref_count + 1}
+            )
+        )
+
+        destination = self.full_path(uploaded.sha256)
+        if destination.exists():
+            await discard_upload(uploaded.temp_path)
+            self.dedup_hits += 1
+            self.bytes_saved += uploaded.file_size
+            logger.info(f"Файл {uploaded.sha256[:12]} уже в хранилище, дубликат не сохраняется")
+            return True
+
+        await commit_upload(uploaded, destination)
+        self.dedup_misses += 1
+        return False
+
+    async def release(self, db: AsyncSession, sha256: str, count: int = 1) -> bool:
+        """
+        Уменьшение счётчика ссылок; когда ссылок не осталось, строка удаляется
+
+        Сам файл удаляется только после коммита транзакции (при откате
+        остаётся). Возвращает True, если файл будет удалён.
+        """
+        result = await db.execute(
+            update(StorageBlob)
+            .where(StorageBlob.sha256 == sha256)
+            .values(ref_count=StorageBlob.ref_count - count)
+            .returning(StorageBlob.ref_count)
+        )
+        ref_count = result.scalar_one_or_none()
+        if ref_count is None or ref_count > 0:
+            return False
+
+        await db.execute(delete(StorageBlob).where(StorageBlob.sha256 == sha256))
+        db.sync_session.info.setdefault(PENDING_DELETES_KEY, set()).add(sha256)
+        return True
+
+    def _schedule_delete(self, hashes: Set[str]) -> None:
+        """Удаление файлов, освобождённых закоммиченной транзакцией (в фоне)"""
+        task = asyncio.get_running_loop().create_task(self._delete_released(hashes))
+        self._delete_tasks.add(task)
+        task.add_done_callback(self._delete_tasks.discard)
+
+    async def _delete_released(self, hashes: Set[str]) -> None:
+        self.files_deleted += await self._delete_unreferenced(hashes)
+
+    async def _delete_unreferenced(self, hashes: Iterable[str]) -> int:
+        """
+        Удаление файлов, на которые нет строки storage_blobs
+
+        Проверка и удаление - под блокировкой хеша: параллельная загрузка
+        того же содержимого либо уже закоммитила строку (файл остаётся),
+        либо запишет файл заново после удаления
+        """
+        deleted = 0
+        for sha256 in hashes:
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self.lock(db, [sha256])
+                    referenced = await db.execute(
+                        select(StorageBlob.sha256).where(StorageBlob.sha256 == sha256)
+                    )
+                    if referenced.scalar_one_or_none() is None:
+                        try:
+                            await aiofiles.os.remove(self.full_path(sha256))
+                            deleted += 1
+                            logger.info(f"Файл {sha256[:12]} удалён из хранилища (ссылок не осталось)")
+                        except FileNotFoundError:
+                            pass
+                    await db.commit()
+            except Exception as e:
+                # Файл останется до следующего sweep_orphans()
+                logger.error(f"Не удалось удалить файл {sha256[:12]} из хранилища: {e}")
+        return deleted
+
+    async def start(self) -> None:
+        """Запуск периодической очистки брошенных файлов (вызывается при старте приложения)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Остановка очистки и ожидание удалений после коммита"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.gather(*self._delete_tasks, return_exceptions=True)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sweep_orphans()
+            except Exception as e:
+                logger.error(f"Ошибка очистки хранилища: {e}")
+            await asyncio.sleep(SWEEP_INTERVAL)
+
+    def _find_old_files(self) -> List[Path]:
+        """Файлы blobs старше ORPHAN_GRACE_SECONDS (выполняется в потоке)"""
+        blobs_dir = Path(settings.STORAGE_PATH) / "documents" / "blobs"
+        old_before = time.time() - ORPHAN_GRACE_SECONDS
+        files = []
+        for root, _, names in os.walk(blobs_dir):
+            for name in names:
+                path = Path(root) / name
+                try:
+                    if path.stat().st_mtime < old_before:
+                        files.append(path)
+                except FileNotFoundError:
+                    continue
+        return files
+
+    async def sweep_orphans(self) -> int:
+        """
+        Удаление файлов хранилища, на которые нет строки storage_blobs
+
+        Такие файлы остаются после отката загрузки или сбоя между коммитом
+        удаления и удалением файла. Незавершённые временные копии (.part)
+        удаляются тоже. Возвращает число удалённых файлов.
+        """
+        files = await asyncio.to_thread(self._find_old_files)
+
+        deleted = 0
+        for path in [path for path in files if path.name.endswith(".part")]:
+            path.unlink(missing_ok=True)
+            deleted += 1
+
+        hashes = [path.name for path in files if not path.name.endswith(".part")]
+        for offset in range(0, len(hashes), SWEEP_BATCH_SIZE):
+            batch = hashes[offset:offset + SWEEP_BATCH_SIZE]
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(select(StorageBlob.sha256).where(StorageBlob.sha256.in_(batch)))
+                referenced = set(result.scalars().all())
+            unreferenced = [sha256 for sha256 in batch if sha256 not in referenced]
+            if unreferenced:
+                deleted += await self._delete_unreferenced(unreferenced)
+
+        self.orphans_deleted += deleted
+        if deleted:
+            logger.warning(f"Удалено файлов хранилища без ссылок: {deleted}")
+        return deleted
+
+    def get_stats(self) -> dict:
+        """Статистика дедупликации для /health"""
+        total = self.dedup_hits + self.dedup_misses
+        return {
+            "dedup_hits": self.dedup_hits,
+            "dedup_misses": self.dedup_misses,
+            "dedup_hit_ratio": round(self.dedup_hits / total, 3) if total else None,
+            "bytes_saved": self.bytes_saved,
+            "files_deleted": self.files_deleted,
+            "orphans_deleted": self.orphans_deleted
+        }
+
+
+@event.listens_for(Session, "after_commit")
+def _delete_released_blobs(session: Session) -> None:
+    hashes = session.info.pop(PENDING_DELETES_KEY, None)
+    if hashes:
+        blob_store._schedule_delete(hashes)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _keep_released_blobs(session: Session, previous_transaction) -> None:
+    if not previous_transaction.nested:
+        session.info.pop(PENDING_DELETES_KEY, None)
+
+
+# Глобальный экземпляр хранилища
+blob_store = BlobStore()
@@ -0,0 +1,85 @@
+"""
+Кеш аутентифицированных пользователей
+
+get_current_user проверяет JWT и затем читает пользователя из БД на
+каждом запросе. Кеш хранит снимок строки users (LRU, не больше
+USER_CACHE_SIZE записей, каждая живёт USER_CACHE_TTL секунд), поэтому
+повторные запросы того же пользователя обходятся без обращения к БД.
+
+Изменения пользователя (роль, активность, пароль) сбрасывают запись
+через invalidate(). TTL ограничивает устаревание, если пользователь
+изменён в обход API (например, из консоли БД).
+"""
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from sqlalchemy import inspect
+from app.config import settings
+from app.models.user import User
+
+
+class UserCache:
+    """LRU кеш снимков пользователей с ограниченным временем жизни"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, Tuple[float, dict]]" = OrderedDict()
+
+        # Статистика для /health
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id: int) -> Optional[User]:
+        """
+        Пользователь из кеша или None
+
+        Каждый раз создаётся новый объект User (не привязанный к сессии),
+        чтобы запросы не делили между собой изменяемое состояние
+        """
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return User(**entry[1])
+
+    def put(self, user: User) -> None:
+        """Сохранение снимка пользователя, загруженного из БД"""
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+
+        values = {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+        self._entries[user.id] = (time.monotonic() + self.ttl, values)
+        self._entries.move_to_end(user.id)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        """Сброс записи после изменения пользователя"""
+        if self._entries.pop(user_id, None) is not None:
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def get_stats(self) -> dict:
+        """Статистика кеша для /health"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else None,
+            "invalidations": self.invalidations
+        }
+
+
+# Глобальный экземпляр кеша
+user_cache = UserCache(max_size=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
@@ -0,0 +1,507 @@
+"""
+Импорт архива дел из старой системы (папки CASE/<ПРЕФИКС>_<ДАТА>_<Клиент>)
+
+Заменяет migrate_old_data.py. Папки сканируются пулом процессов (список
+файлов и SHA-256 каждого документа), результаты собираются в пачки по
+--batch-size папок. Каждая пачка записывается одной транзакцией: дела,
+персоны, связи case_persons, storage_blobs, документы и задания OCR для
+PDF вставляются многострочными INSERT (по одному на таблицу). Файлы
+копируются в контентно-адресуемое хранилище параллельно, до коммита пачки.
+
+Контрольная точка - сами импортированные дела: папка записывается в
+cases.metadata.original_folder в той же транзакции, поэтому после сбоя
+повторный запуск пропускает уже импортированные папки (не хеширует их
+заново) и продолжает с первой незаписанной пачки. Файлы, скопированные
+до сбоя, повторно не копируются.
+
+Настройки БД и хранилища берутся из .env приложения.
+
+Запуск из каталога backend:
+    python -m scripts.import_archive /mnt/archive/CASE --dry-run
+    python -m scripts.import_archive /mnt/archive/CASE --workers 8 --copy-workers 16
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from itertools import islice
+from pathlib import Path
+from typing import AsyncIterator, Dict, Iterable, List, NamedTuple, Optional, Set
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, insert, select  # noqa: E402
+from sqlalchemy.dialects.postgresql import insert as pg_insert  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.database import AsyncSessionLocal  # noqa: E402
+from app.models.case import Case  # noqa: E402
+from app.models.case_person import CasePerson  # noqa: E402
+from app.models.document import Document  # noqa: E402
+from app.models.ocr_job import OCRJob  # noqa: E402
+from app.models.person import Person  # noqa: E402
+from app.models.storage_blob import StorageBlob  # noqa: E402
+from app.utils.storage import BlobStore  # noqa: E402
+
+logger = logging.getLogger("import_archive")
+
+# Префикс папки -> тип дела
+PREFIX_TO_CASE_TYPE = {
+    "LS": "civil",           # Гражданское дело
+    "CR": "criminal",        # Уголовное дело
+    "AD": "administrative",  # Административное дело
+    "INT": "international",  # Международное дело
+    "ARB": "arbitration",    # Арбитраж
+    "GENERAL": "civil"       # По умолчанию
+}
+
+# Ключевое слово в имени файла -> тип документа
+FILENAME_TO_DOCUMENT_TYPE = {
+    "cerere": "lawsuit",           # Исковое заявление
+    "cererea": "lawsuit",
+    "hotarare": "court_decision",  # Решение суда
+    "decizie": "court_decision",   # Решение
+    "sentinta": "court_decision",  # Приговор
+    "procura": "power_of_attorney",  # Доверенность
+    "contract": "contract",        # Договор
+    "dovada": "evidence",          # Доказательство
+    "dovezi": "evidence",
+    "copia": "evidence",           # Копия (обычно доказательство)
+    "plangere": "complaint",       # Жалоба
+    "raspuns": "correspondence",   # Ответ
+    "adresa": "correspondence",    # Адрес/письмо
+    "scrisoare": "correspondence",  # Письмо
+    "cerinta": "motion",           # Ходатайство
+    "expertiza": "expert_opinion",  # Экспертное заключение
+}
+
+# PREFIX_YYYY-MM-DD_Name или YYYY-MM-DD_Name
+FOLDER_WITH_PREFIX_RE = re.compile(r'^([A-Z]+)_(\d{4}-\d{2}-\d{2})_(.+)$')
+FOLDER_NO_PREFIX_RE = re.compile(r'^(\d{4}-\d{2}-\d{2})_(.+)$')
+
+# Номер дела как в POST /api/cases: PREFIX-YYYYMMDD-NNN
+CASE_NUMBER_RE = re.compile(r'^(.+-\d{8})-(\d+)$')
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class ScannedFile(NamedTuple):
+    name: str
+    path: str
+    size: int
+    sha256: str
+
+
+class ScannedFolder(NamedTuple):
+    """Результат сканирования одной папки дела (возвращается из процесса пула)"""
+    folder_name: str
+    prefix: Optional[str]
+    open_date: Optional[date]
+    client_name: Optional[str]
+    files: List[ScannedFile]
+    errors: List[str]
+
+
+def parse_folder_name(folder_name: str) -> Optional[dict]:
+    """Префикс, дата открытия и имя клиента из имени папки"""
+    match = FOLDER_WITH_PREFIX_RE.match(folder_name)
+    if match:
+        prefix, date_str, client_name = match.groups()
+    else:
+        match = FOLDER_NO_PREFIX_RE.match(folder_name)
+        if not match:
+            return None
+        prefix = "GENERAL"
+        date_str, client_name = match.groups()
+
+    try:
+        open_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+    return {
+        "prefix": prefix,
+        "open_date": open_date,
+        "client_name": client_name.replace('_', ' ')
+    }
+
+
+def guess_document_type(filename: str) -> str:
+    """Тип документа по ключевым словам в имени файла"""
+    filename_lower = filename.lower()
+    for keyword, doc_type in FILENAME_TO_DOCUMENT_TYPE.items():
+        if keyword in filename_lower:
+            return doc_type
+    return "other"
+
+
+def file_sha256(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def scan_folder(folder_path: str, extensions: Iterable[str]) -> ScannedFolder:
+    """
+    Разбор имени папки и хеширование её документов
+
+    Выполняется в процессе пула: только файловая система, без БД
+    """
+    folder_name = os.path.basename(folder_path)
+    parsed = parse_folder_name(folder_name)
+    if not parsed:
+        return ScannedFolder(folder_name, None, None, None, [], ["не удалось распарсить имя папки"])
+
+    files = []
+    errors = []
+    for entry in sorted(os.scandir(folder_path), key=lambda e: e.name):
+        if not entry.is_file() or os.path.splitext(entry.name)[1].lower().lstrip('.') not in extensions:
+            continue
+        try:
+            files.append(ScannedFile(entry.name, entry.path, entry.stat().st_size, file_sha256(entry.path)))
+        except OSError as e:
+            errors.append(f"{entry.name}: {e}")
+
+    return ScannedFolder(folder_name, parsed["prefix"], parsed["open_date"], parsed["client_name"], files, errors)
+
+
+async def scan_folders(folders: List[Path], workers: int) -> AsyncIterator[ScannedFolder]:
+    """
+    Сканирование папок пулом процессов, результаты - по мере готовности
+
+    В работе одновременно не больше workers * 4 папок, чтобы результаты
+    не копились в памяти быстрее, чем их записывает БД
+    """
+    loop = asyncio.get_running_loop()
+    extensions = frozenset(settings.allowed_extensions_list)
+    folder_iter = iter(folders)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {
+            loop.run_in_executor(pool, scan_folder, str(folder), extensions)
+            for folder in islice(folder_iter, workers * 4)
+        }
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                next_folder = next(folder_iter, None)
+                if next_folder is not None:
+                    pending.add(loop.run_in_executor(pool, scan_folder, str(next_folder), extensions))
+                yield future.result()
+
+
+def copy_to_storage(source: str, sha256: str) -> bool:
+    """Копирование файла в хранилище blobs; False, если файл уже там"""
+    destination = BlobStore.full_path(sha256)
+    if destination.exists():
+        return False
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    # Временное имя уникально для потока: один и тот же файл может копироваться дважды
+    temp_destination = destination.with_name(f"{sha256}.{os.getpid()}.{time.monotonic_ns()}.part")
+    # Без копирования mtime: старый файл архива иначе выглядит для очистки
+    # сирот в работающем приложении (BlobStore.sweep_orphans) давно брошенным
+    shutil.copyfile(source, temp_destination)
+    os.replace(temp_destination, destination)
+    return True
+
+
+class ArchiveImporter:
+    """Запись просканированных папок в БД пачками"""
+
+    def __init__(self, copy_workers: int, enqueue_ocr: bool, dry_run: bool):
+        self.copy_pool = ThreadPoolExecutor(max_workers=copy_workers)
+        self.enqueue_ocr = enqueue_ocr
+        self.dry_run = dry_run
+        # Последний порядковый номер дела для PREFIX-YYYYMMDD
+        self.case_seq: Dict[str, int] = {}
+        self.stats = {
+            "cases": 0,
+            "cases_failed": 0,
+            "persons_created": 0,
+            "documents": 0,
+            "documents_failed": 0,
+            "files_copied": 0,
+            "files_deduplicated": 0,
+            "bytes": 0,
+            "ocr_jobs": 0,
+        }
+        self.errors: List[str] = []
+
+    async def load_state(self) -> Set[str]:
+        """
+        Контрольная точка: папки, уже импортированные в прошлых запусках,
+        и занятые номера дел
+        """
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Case.extra_metadata["original_folder"].as_string())
+                .where(Case.extra_metadata["original_folder"].as_string().isnot(None))
+            )
+            imported = {folder for (folder,) in result.all()}
+
+            result = await db.execute(select(Case.case_number))
+            for (case_number,) in result.all():
+                match = CASE_NUMBER_RE.match(case_number)
+                if match:
+                    base, seq = match.group(1), int(match.group(2))
+                    self.case_seq[base] = max(self.case_seq.get(base, 0), seq)
+
+        return imported
+
+    def next_case_number(self, prefix: str, open_date: date) -> str:
+        base = f"{prefix}-{open_date:%Y%m%d}"
+        seq = self.case_seq.get(base, 0) + 1
+        self.case_seq[base] = seq
+        return f"{base}-{seq:03d}"
+
+    async def copy_files(self, files: List[ScannedFile], count: bool = True) -> None:
+        """Параллельное копирование уникальных файлов пачки (count=False - без учёта в статистике)"""
+        loop = asyncio.get_running_loop()
+        unique = {file.sha256: file for file in files}
+        results = await asyncio.gather(*(
+            loop.run_in_executor(self.copy_pool, copy_to_storage, file.path, sha256)
+            for sha256, file in unique.items()
+        ))
+        if not count:
+            return
+        copied = sum(results)
+        self.stats["files_copied"] += copied
+        self.stats["files_deduplicated"] += len(files) - copied
+
+    async def import_batch(self, batch: List[ScannedFolder]) -> None:
+        """Одна пачка папок - одна транзакция"""
+        for folder in batch:
+            self.errors.extend(f"{folder.folder_name}: {error}" for error in folder.errors)
+
+        folders = [folder for folder in batch if folder.prefix]
+        self.stats["cases_failed"] += len(batch) - len(folders)
+        self.stats["documents_failed"] += sum(len(folder.errors) for folder in folders)
+        if not folders:
+            return
+
+        files = [file for folder in folders for file in folder.files]
+        if self.dry_run:
+            self.stats["cases"] += len(folders)
+            self.stats["documents"] += len(files)
+            self.stats["bytes"] += sum(file.size for file in files)
+            return
+
+        # Файлы - до коммита: после сбоя дело не ссылается на отсутствующий файл
+        await self.copy_files(files)
+
+        now = datetime.now(timezone.utc)
+        async with AsyncSessionLocal() as db:
+            person_ids = await self._get_or_create_persons(db, {folder.client_name for folder in folders})
+
+            case_rows = []
+            for folder in folders:
+                case_rows.append({
+                    "case_number": self.next_case_number(folder.prefix, folder.open_date),
+                    "case_prefix": folder.prefix,
+                    "case_type": PREFIX_TO_CASE_TYPE.get(folder.prefix, "civil"),
+                    "title": f"Дело {folder.client_name}",
+                    "description": f"Импортировано из старой системы. Клиент: {folder.client_name}",
+                    "plaintiff": folder.client_name,
+                    "case_status": "archived",
+                    "open_date": folder.open_date,
+                    "tags": ["импорт", "старая_система"],
+                    "extra_metadata": {
+                        "imported_at": now.isoformat(),
+                        "original_folder": folder.folder_name
+                    }
+                })
+            result = await db.execute(
+                insert(Case).returning(Case.id, Case.case_number),
+                case_rows
+            )
+            case_ids = dict((number, case_id) for case_id, number in result.all())
+
+            case_person_rows = []
+            blob_counts: Dict[str, List[int]] = {}
+            document_rows = []
+            for folder, case_row in zip(folders, case_rows):
+                case_id = case_ids[case_row["case_number"]]
+                case_person_rows.append({
+                    "case_id": case_id,
+                    "person_id": person_ids[folder.client_name],
+                    "role_in_case": "plaintiff",
+                    "notes": "Клиент (истец)"
+                })
+                for file in folder.files:
+                    blob = blob_counts.setdefault(file.sha256, [file.size, 0])
+                    blob[1] += 1
+                    document_rows.append({
+                        "case_id": case_id,
+                        "document_type": guess_document_type(file.name),
+                        "file_name": f"{now:%Y%m%d_%H%M%S}_{file.name}",
+                        "original_file_name": file.name,
+                        "file_path": BlobStore.relative_path(file.sha256),
+                        "file_size": file.size,
+                        "file_format": os.path.splitext(file.name)[1].lstrip('.').upper(),
+                        "content_hash": file.sha256,
+                        "upload_date": now,
+                        "description": "Импортировано из старой системы",
+                        "tags": ["импорт"],
+                        "version": 1,
+                        "is_template": False
+                    })
+
+            await db.execute(insert(CasePerson), case_person_rows)
+
+            if blob_counts:
+                # Файл, удалённый приложением между копированием и этой
+                # транзакцией (освобождена последняя ссылка), копируется заново
+                await BlobStore.lock(db, blob_counts)
+                missing = [file for file in files if not BlobStore.full_path(file.sha256).exists()]
+                if missing:
+                    await self.copy_files(missing, count=False)
+
+                blob_insert = pg_insert(StorageBlob).values([
+                    {"sha256": sha256, "file_size": size, "ref_count": count}
+                    for sha256, (size, count) in blob_counts.items()
+                ])
+                await db.execute(blob_insert.on_conflict_do_update(
+                    index_elements=[StorageBlob.sha256],
+                    set_={"ref_count": StorageBlob.ref_count + blob_insert.excluded.ref_count}
+                ))
+
+            ocr_document_ids = []
+            if document_rows:
+                result = await db.execute(
+                    insert(Document).returning(Document.id, Document.file_format),
+                    document_rows
+                )
+                ocr_document_ids = [doc_id for doc_id, file_format in result.all() if file_format == "PDF"]
+
+            if self.enqueue_ocr and ocr_document_ids:
+                await db.execute(insert(OCRJob), [
+                    {"document_id": doc_id, "status": "pending", "attempts": 0, "run_after": now}
+                    for doc_id in ocr_document_ids
+                ])
+
+            await db.commit()
+
+        self.stats["cases"] += len(folders)
+        self.stats["documents"] += len(document_rows)
+        self.stats["bytes"] += sum(file.size for file in files)
+        if self.enqueue_ocr:
+            self.stats["ocr_jobs"] += len(ocr_document_ids)
+
+    async def _get_or_create_persons(self, db, names: Set[str]) -> Dict[str, int]:
+        """Персоны-клиенты по имени: существующие находятся, недостающие создаются одним INSERT"""
+        result = await db.execute(
+            select(Person.full_name, func.min(Person.id))
+            .where(Person.full_name.in_(names))
+            .group_by(Person.full_name)
+        )
+        person_ids = dict(result.all())
+
+        missing = sorted(names - person_ids.keys())
+        if missing:
+            notes = f"Импортировано из старой системы: {datetime.now():%Y-%m-%d %H:%M:%S}"
+            result = await db.execute(
+                insert(Person).returning(Person.full_name, Person.id),
+                [{"full_name": name, "person_type": "client", "notes": notes} for name in missing]
+            )
+            person_ids.update(dict(result.all()))
+            self.stats["persons_created"] += len(missing)
+
+        return person_ids
+
+
+async def run(args: argparse.Namespace) -> int:
+    source = Path(args.source)
+    if not source.is_dir():
+        logger.error(f"Путь не существует: {source}")
+        return 1
+
+    folders = sorted(f for f in source.iterdir() if f.is_dir() and not f.name.startswith('.'))
+    importer = ArchiveImporter(
+        copy_workers=args.copy_workers,
+        enqueue_ocr=settings.OLLAMA_ENABLED and not args.no_ocr,
+        dry_run=args.dry_run
+    )
+
+    imported = await importer.load_state()
+    remaining = [folder for folder in folders if folder.name not in imported]
+    logger.info(
+        f"Папок: {len(folders)}, уже импортировано: {len(folders) - len(remaining)}, "
+        f"к импорту: {len(remaining)}{' (DRY-RUN)' if args.dry_run else ''}"
+    )
+    if not remaining:
+        return 0
+
+    if not args.dry_run and not args.yes:
+        response = input(f"Импортировать {len(remaining)} дел в {settings.STORAGE_PATH}? (yes/no): ").strip().lower()
+        if response not in ['yes', 'y', 'да']:
+            logger.info("Импорт отменён")
+            return 0
+
+    started = time.monotonic()
+    batch: List[ScannedFolder] = []
+    processed = 0
+
+    async def flush() -> None:
+        nonlocal processed
+        await importer.import_batch(batch)
+        processed += len(batch)
+        batch.clear()
+        elapsed = time.monotonic() - started
+        logger.info(
+            f"{processed}/{len(remaining)} папок, документов: {importer.stats['documents']}, "
+            f"{importer.stats['bytes'] / 1024 / 1024:.0f} МБ, {processed / elapsed:.1f} папок/с"
+        )
+
+    try:
+        async for scanned in scan_folders(remaining, args.workers):
+            batch.append(scanned)
+            if len(batch) >= args.batch_size:
+                await flush()
+        if batch:
+            await flush()
+    finally:
+        importer.copy_pool.shutdown()
+
+    elapsed = time.monotonic() - started
+    logger.info(f"Импорт завершён за {elapsed:.1f} с: {importer.stats}")
+    for error in importer.errors[:20]:
+        logger.warning(f"Ошибка: {error}")
+    if len(importer.errors) > 20:
+        logger.warning(f"... и ещё {len(importer.errors) - 20} ошибок")
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Импорт архива дел из старой системы")
+    parser.add_argument("source", help="Каталог с папками дел (CASE)")
+    parser.add_argument("--dry-run", action="store_true", help="Только сканирование, без записи в БД и хранилище")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="Процессов сканирования и хеширования")
+    parser.add_argument("--copy-workers", type=int, default=8, help="Потоков копирования файлов")
+    parser.add_argument("--batch-size", type=int, default=100, help="Папок в одной транзакции")
+    parser.add_argument("--no-ocr", action="store_true", help="Не ставить импортированные PDF в очередь OCR")
+    parser.add_argument("--yes", action="store_true", help="Не спрашивать подтверждение")
+    parser.add_argument("--log-file", help="Дополнительно писать лог в файл")
+    args = parser.parse_args()
+
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if args.log_file:
+        handlers.append(logging.FileHandler(args.log_file, encoding='utf-8'))
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', handlers=handlers)
+
+    try:
+        sys.exit(asyncio.run(run(args)))
+    except KeyboardInterrupt:
+        logger.warning("Импорт прерван; повторный запуск продолжит с последней записанной пачки")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -48,6 +48,11 @@ export default {
     return response.data
   },
 
+  async getBackupStatus() {
+    const response = await apiClient.get('/api/admin/backup/status')
+    return response.data
+  },
+
   // Системная информация
   async getSystemInfo() {
     const response = await apiClient.get('/api/admin/system-info')
@@ -45,9 +45,15 @@ export default {
     return `${apiClient.defaults.baseURL}/api/documents/${id}/preview`
   },
 
-  // Запустить OCR
+  // Поставить документ в очередь OCR
   async runOcr(id) {
     const response = await apiClient.post(`/api/documents/${id}/ocr`)
     return response.data
+  },
+
+  // Состояние задания OCR
+  async getOcrStatus(id) {
+    const response = await apiClient.get(`/api/documents/${id}/ocr/status`)
+    return response.data
   }
 }
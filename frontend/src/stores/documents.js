@@ -119,14 +119,24 @@ export const useDocumentsStore = defineStore('documents', () => {
     loading.value = true
     error.value = null
     try {
-      const response = await api.documents.runOcr(id)
+      // OCR выполняется в фоновой очереди - ждём завершения задания
+      let job = await api.documents.runOcr(id)
+      while (job.status === 'pending' || job.status === 'running') {
+        await new Promise(resolve => setTimeout(resolve, 2000))
+        job = await api.documents.getOcrStatus(id)
+      }
+
+      if (job.status === 'failed') {
+        throw new Error(job.last_error || 'Ошибка OCR')
+      }
 
       // Обновляем документ с OCR текстом
       if (currentDocument.value?.id === id) {
-        currentDocument.value.ocr_text = response.ocr_text
+        const document = await api.documents.getById(id)
+        currentDocument.value.ocr_text = document.ocr_text
       }
 
-      return response
+      return job
     } catch (err) {
       error.value = err.response?.data?.detail || 'Ошибка OCR'
       throw err